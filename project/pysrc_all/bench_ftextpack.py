@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+benchmark for fp02 content in zlib blocks (pack_block),
+compare pack size, cold lookup and lookup throughput with uncompressed
+    python project/pysrc_all/bench_ftextpack.py -n 100000
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "../../src"))
+from libutil import ftext_t
+import ftextpack
+
+def make_sample(n, seed=0):
+    random.seed(seed)
+    words = ["光", "季節", "煌びやかな", "物語", "世界", "約束", "明日", "少女", "魔法", "旅", "、", "。"]
+    data, ftexts1, ftexts2 = bytearray(), [], []
+    for i in range(n):
+        org = f"text{i:06d}_" + "".join(random.choices(words, k=random.randint(4, 24)))
+        now = "".join(random.choices(words, k=random.randint(4, 32)))
+        orgbytes = org.encode("sjis")
+        ftexts1.append(ftext_t(len(data), len(orgbytes), org))
+        ftexts2.append(ftext_t(len(data), len(orgbytes), now))
+        data += orgbytes + b"\x00"
+    return bytes(data), ftexts1, ftexts2
+
+def bench(path, keys, ncold):
+    start = time.perf_counter()
+    for k in keys[:ncold]: # open the pack each time
+        with ftextpack.FpackReader(path) as reader: reader.lookup(k)
+    cold = (time.perf_counter() - start) / ncold
+    with ftextpack.FpackReader(path) as reader:
+        start = time.perf_counter()
+        for k in keys: reader.lookup(k)
+        elapsed = time.perf_counter() - start
+    return cold, len(keys) / elapsed
+
+def cli(cmdstr=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", type=int, default=100000, help="text count")
+    parser.add_argument("--lookup", type=int, default=100000, help="lookup count")
+    parser.add_argument("--cold", type=int, default=200, help="cold lookup count")
+    parser.add_argument("--blocks", default="0,0x4000,0x10000", help="block sizes, 0 for uncompressed")
+    args = parser.parse_args(cmdstr.split(' ') if cmdstr else None)
+
+    data, ftexts1, ftexts2 = make_sample(args.n)
+    keys = [data[t.addr: t.addr + t.size] for t in random.choices(ftexts1, k=args.lookup)]
+    print(f"| blocksize | size | cold lookup | throughput |")
+    print(f"| --- | --- | --- | --- |")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for blocksize in map(lambda x: int(x, 0), args.blocks.split(",")):
+            path = os.path.join(tmpdir, f"bench_{blocksize:x}.fp02")
+            ftextpack.pack_ftexts([data], [(ftexts1, ftexts2)], path, encoding="sjis",
+                pack_format="fp02", pack_block=blocksize)
+            cold, speed = bench(path, keys, args.cold)
+            print(f"| 0x{blocksize:x} | 0x{os.path.getsize(path):x} | {cold*1e6:.1f}us | {speed/1e3:.1f}k/s |")
+
+if __name__ == "__main__":
+    cli()
@@ -9,6 +9,8 @@ test_libtext()
     python src/libtext.py extract project/pysrc_all//build/COM001_rebuild.bin -o project/pysrc_all/build/COM001_rebuild.txt --log_level info -e sjis --has_cjk --min_len 4 --skip 0x16 --size 1024
     python src/libtext.py extract project/pysrc_all//build/COM001_rebuild.bin -o "project/pysrc_all/build/COM001.zip>COM001/COM001_rebuild.txt" --log_level info -e sjis --has_cjk --min_len 4 --skip 0x16 --size 1024
     python src/libtext.py extract --batch "project/pysrc_all//build;COM001_rebuild.bin" -o "project/pysrc_all//build;COM001_rebuild.txt" --log_level info -e sjis --has_cjk --min_len 4
+    python src/libtext.py extract --batch "project/pysrc_all//build;COM001_rebuild.bin;COM001_rebuild.bin" -o "project/pysrc_all//build;COM001.zip>COM001/COM001_jobs1.txt;COM001.zip>COM001/COM001_jobs2.txt" --log_level info -e sjis --has_cjk --min_len 4 --jobs 2
+    python src/libtext.py extract project/pysrc_all//build/COM001_rebuild.bin -o project/pysrc_all/build/COM001_rebuild_numba.txt --log_level info -e sjis --has_cjk --min_len 4 --backend numba
 
     echo "## test libtext check"
     python src/libtext.py check project/pysrc_all//build/COM001_rebuild.txt --refer project/pysrc_all//build/COM001_rebuild.bin -o "project/pysrc_all//build/COM001_rebuild_check.txt" --log_level info -e sjis
@@ -29,6 +31,7 @@ test_libfont()
     echo "## test_libfont font"
     mkdir -p "project/pysrc_all/build/it"
     python src/libfont.py font_extract --format tile "test/sample/it.bin" -o "project/pysrc_all/build/it" --split_glphy --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff"
+    python src/libfont.py font_extract --format tile "test/sample/it.bin" -o "project/pysrc_all/build/it.zip" --split_glphy --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff"
     python src/libfont.py font_extract --format tile "test/sample/it.bin" -o "project/pysrc_all/build/it.jpg" --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff"
 }
 
@@ -37,6 +40,10 @@ test_libimage()
     echo "## test_libimage"
     python src/libimage.py decode --format tile "test/sample/it.bin" -o "project/pysrc_all/build/it_decode.png" --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff"
     python src/libimage.py encode --format tile "project/pysrc_all/build/it_decode.png" -o "project/pysrc_all/build/it_encode1.bin" --tilebpp 2 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff"
+    python src/libimage.py decode --format tile "test/sample/it.bin" -o "project/pysrc_all/build/it_morton.png" --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --swizzle morton
+    python src/libimage.py encode --format tile "project/pysrc_all/build/it_morton.png" -o "project/pysrc_all/build/it_morton.bin" --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --swizzle morton
+    python src/libimage.py decode --format tile "test/sample/it.bin" -o "project/pysrc_all/build/it_stream.png" --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff" --nstrip 4
+    python src/libimage.py encode --format tile "project/pysrc_all/build/it_stream.png" -o "project/pysrc_all/build/it_stream.bin" --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff" --nstrip 4
     python src/libimage.py decode --batch --format tile "test/sample;it.bin" -o "project/pysrc_all;build/it_decode.png" --tilew 20 --tileh 18 --tilebpp 2 --tilesize 92 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff"
     python src/libimage.py encode --batch --format tile "project/pysrc_all/build;it_decode.png" -o "project;pysrc_all/build/it_encode1.bin" --tilebpp 2 --palette "ff ff ff 00 ff ff ff 3f ff ff ff 8f ff ff ff ff"
 }
@@ -58,6 +65,7 @@ test_ftextpack()
     python src/ftextpack.py test/sample/COM001 test/sample/COM001.txt -o project/pysrc_all//build/COM001.fp01 -t test/sample/COM001.tbl --pack_org
     python src/ftextpack.py test/sample/COM001 test/sample/COM001.txt -o "project/pysrc_all//build/COM001.zip>COM001/COM001测试.fp01" -t test/sample/COM001.tbl --pack_compact
     python src/ftextpack.py --batch "test/sample;COM001" "test/sample;COM001.txt" -o "project/pysrc_all/build;COM001.zip>COM001/COM001.fp02" -t test/sample/COM001.tbl --pack_compact
+    python src/ftextpack.py test/sample/COM001 test/sample/COM001.txt -o project/pysrc_all//build/COM001_xxh64.fp02 -t test/sample/COM001.tbl --pack_format fp02 --pack_hash xxh64 --pack_block 0x10000
 }
 
 test_ftextcvt()
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-__version__ = "0.3.2"
+__version__ = "0.3.3"
 __description__ = f"""
 A convert tool to change or adjust ftext
     v{__version__}, developed by devseed
@@ -7,12 +7,15 @@ A convert tool to change or adjust ftext
 
 import os
 import codecs
+import shutil
 import argparse
 import json
-from io import StringIO
+import tempfile
+from io import StringIO, TextIOWrapper
 from glob import glob
+from itertools import islice, chain
 from csv import DictWriter, DictReader
-from typing import Union, List, Dict
+from typing import Callable, Iterable, Union, List, Dict, TextIO
 
 try:
     from docx import Document # pip install python-docx
@@ -22,14 +25,61 @@ except Exception:
     pass
 
 try:
-    from libutil import writelines, writebytes, filter_loadfiles, ftext_t, load_ftext, save_ftext
+    from libutil import writelines, writebytes, writestream, filter_loadfiles, ftext_t, load_ftext, save_ftext, load_ftext_iter, save_ftext_iter
 except ImportError:
-    exec("from libutil_v0_6 import writelines, writebytes, filter_loadfiles, ftext_t, load_ftext, save_ftext")
+    exec("from libutil_v0_6_9 import writelines, writebytes, writestream, filter_loadfiles, ftext_t, load_ftext, save_ftext, load_ftext_iter, save_ftext_iter")
 
 PARATRANZ_CONFIG = {
     "trans" :   None
 }
 
+def _write_text(outpath, f: Callable[[TextIO], int], bom=b"", return_lines=True) -> Union[List[str], int]:
+    """
+    write text by f(fp) -> count to lines, then to outpath if outpath, 
+    or incrementally to outpath without lines if not return_lines,
+    the path is replaced only if f successed (zip entry by a temp file)
+    :return: lines, or the count from f if not return_lines
+    """
+
+    if not outpath or return_lines:
+        sbufio = StringIO()
+        f(sbufio)
+        lines = sbufio.getvalue().splitlines(True)
+        sbufio.close()
+        if outpath: writebytes(outpath, bom + writelines(lines, "utf-8"))
+        return lines
+    if type(outpath) == str and ".zip>" in outpath: # not leave a broken entry
+        with tempfile.TemporaryFile() as fp:
+            n = _write_text(fp, f, bom, False)
+            fp.seek(0)
+            with writestream(outpath) as fp2: shutil.copyfileobj(fp, fp2)
+        return n
+    with writestream(outpath) as fp:
+        fp.write(bom)
+        wrapper = TextIOWrapper(fp, "utf-8", newline="")
+        try: n = f(wrapper); wrapper.flush()
+        finally: wrapper.detach()
+    return n
+
+def _write_jsonarray(fp: TextIO, objs: Iterable[dict]) -> int:
+    """
+    write objs incrementally as json.dumps(objs, ensure_ascii=False, indent=2)
+    :return: count of objs
+    """
+
+    n = 0
+    for n, obj in enumerate(objs, 1):
+        fp.write("[\n" if n==1 else ",\n")
+        jstr = json.dumps(obj, ensure_ascii=False, indent=2)
+        fp.write("\n".join("  " + line for line in jstr.split("\n")))
+    fp.write("\n]" if n else "[]")
+    return n
+
+def _iter_pairs(ftextobj: Union[str, List[str]]):
+    for i, (t1, t2) in enumerate(load_ftext_iter(ftextobj)):
+        if t1 is None or t2 is None: raise ValueError(f"○● count not match [i={i}]")
+        yield t1, t2
+
 @filter_loadfiles((0, 'utf-8'))
 def ftext2pretty(linesobj: Union[str, List[str]], outpath=None) -> List[str]:
     """
@@ -50,49 +100,44 @@ def ftext2pretty(linesobj: Union[str, List[str]], outpath=None) -> List[str]:
         lines[i] = line
     return save_ftext(*load_ftext(lines), outpath)
 
-def ftext2csv(linesobj: Union[str, List[str]], outpath=None) -> List[str]:
+def ftext2csv(linesobj: Union[str, bytes, List[str]], outpath=None, *, return_lines=True) -> Union[List[str], int]:
     """
     convert ftext2 files to csv format
     tag(org ○, now ●),addr,size,text
-
+    :param return_lines: if False with outpath, stream to outpath and return the count
+    :return: lines, or the count of ftexts written to outpath
     """
     
-    ftexts1, ftexts2 = load_ftext(linesobj)
-    assert(len(ftexts1) == len(ftexts2))
-    sbufio = StringIO()
-    wr = DictWriter(sbufio, ["tag", "addr", "size", "text"])
-    wr.writeheader() # will automaticaly detect comma, use excel to write csv can not encode as utf8
-    for i, (t1, t2) in enumerate(zip(ftexts1, ftexts2)): 
-        wr.writerow({"tag": "org", "addr": hex(t1.addr), "size": hex(t1.size), "text": t1.text})
-        wr.writerow({"tag": "now", "addr": hex(t2.addr), "size": hex(t2.size), "text": t2.text})
-    lines = sbufio.getvalue().splitlines(True)
-    sbufio.close()
-    if outpath: writebytes(outpath, codecs.BOM_UTF8 + writelines(lines, "utf-8"))
-    return lines
+    def _write(fp) -> int:
+        n = 0
+        wr = DictWriter(fp, ["tag", "addr", "size", "text"])
+        wr.writeheader() # will automaticaly detect comma, use excel to write csv can not encode as utf8
+        for n, (t1, t2) in enumerate(_iter_pairs(linesobj), 1): 
+            wr.writerow({"tag": "org", "addr": hex(t1.addr), "size": hex(t1.size), "text": t1.text})
+            wr.writerow({"tag": "now", "addr": hex(t2.addr), "size": hex(t2.size), "text": t2.text})
+        return n
+    
+    return _write_text(outpath, _write, codecs.BOM_UTF8, return_lines)
 
-def ftext2json(ftextobj: Union[str, List[str]], outpath=None) -> List[str]:
+def ftext2json(ftextobj: Union[str, bytes, List[str]], outpath=None, *, return_lines=True) -> Union[List[str], int]:
     """
     convert ftext2 to json format
     { 
         "org": {"addr": 0, "size": 0, "text": ""}
         "now" : {"addr": 0, "size": 0, "text": ""}
     }
+    :param return_lines: if False with outpath, stream to outpath and return the count
+    :return: lines, or the count of ftexts written to outpath
     """
     
-    ftexts1, ftexts2 = load_ftext(ftextobj)
-    assert(len(ftexts1) == len(ftexts2))
-    jarr: List[Dict[str: str]] = []
-    for i, (t1, t2) in enumerate(zip(ftexts1, ftexts2)):
-        jarr.append({
-            "org": {"addr": hex(t1.addr), "size": hex(t1.size), "text": t1.text}, 
-            "now" : {"addr": hex(t2.addr), "size": hex(t2.size), "text": t2.text}
-        })
-    
-    jstr = json.dumps(jarr, ensure_ascii=False, indent=2)
-    if outpath: writebytes(outpath, jstr.encode("utf-8"))
-    return jstr.splitlines(True)
+    jarr = ({
+        "org": {"addr": hex(t1.addr), "size": hex(t1.size), "text": t1.text}, 
+        "now" : {"addr": hex(t2.addr), "size": hex(t2.size), "text": t2.text}
+    } for t1, t2 in _iter_pairs(ftextobj))
+    return _write_text(outpath, lambda fp: _write_jsonarray(fp, jarr), return_lines=return_lines)
 
-def ftext2paratranz(ftextobj: Union[str, List[str]], outpath=None, width_index = (5, 6, 3)) -> List[str]:
+def ftext2paratranz(ftextobj: Union[str, bytes, List[str]], outpath=None, 
+        width_index = (5, 6, 3), *, return_lines=True) -> Union[List[str], int]:
     """
     convert ftext2 to paratranz json format
     [
@@ -102,17 +147,11 @@ def ftext2paratranz(ftextobj: Union[str, List[str]], outpath=None, width_index =
             "translation": "translation text 译文 2"
         }
     ]
+    :param return_lines: if False with outpath, stream to outpath and return the count
+    :return: lines, or the count of ftexts written to outpath
     """
     
-    ftexts1, ftexts2 = load_ftext(ftextobj)
-    assert(len(ftexts1) == len(ftexts2))
-    
-    width_num, width_addr, width_size = width_index
-    keypattern = "{num:0%dd}|{addr:0%dX}|{size:0%dX}" % (width_num, width_addr, width_size)
-    trans_method = PARATRANZ_CONFIG["trans"]
-    
-    jarr: List[Dict[str: str]] = []
-    for i, (t1, t2) in enumerate(zip(ftexts1, ftexts2)):
+    def _make_item(i: int, t1: ftext_t, t2: ftext_t) -> dict:
         text1, text2 = t1.text, t2.text
         stage = 0
         if trans_method == "none":
@@ -124,16 +163,18 @@ def ftext2paratranz(ftextobj: Union[str, List[str]], outpath=None, width_index =
         elif trans_method == "all":
             if text2 != "": stage = 1
 
-        jarr.append({
+        return {
             "key":  keypattern.format(num=i, addr=t1.addr, size=t1.size), 
             "original" : text1, 
             "translation" : text2,
             "stage" : stage
-        })
-    
-    jstr = json.dumps(jarr, ensure_ascii=False, indent=2)
-    if outpath: writebytes(outpath, jstr.encode("utf-8"))
-    return jstr.splitlines(True)
+        }
+
+    width_num, width_addr, width_size = width_index
+    keypattern = "{num:0%dd}|{addr:0%dX}|{size:0%dX}" % (width_num, width_addr, width_size)
+    trans_method = PARATRANZ_CONFIG["trans"]
+    jarr = (_make_item(i, t1, t2) for i, (t1, t2) in enumerate(_iter_pairs(ftextobj)))
+    return _write_text(outpath, lambda fp: _write_jsonarray(fp, jarr), return_lines=return_lines)
 
 @filter_loadfiles([(0, "utf-8")])
 def ftext2docx(linesobj: Union[str, List[str]], outpath=None) -> Document:
@@ -222,9 +263,9 @@ def cli(cmdstr=None):
         if inpath_ext== '.txt': #  ftext to others
             if outpath_ext == '.txt': ftext2pretty(inpath, outpath)
             elif outpath_ext == '.docx': ftext2docx(inpath, outpath)
-            elif outpath_ext == '.csv': ftext2csv(inpath, outpath)
-            elif outpath_ext == ".json": ftext2json(inpath, outpath)
-            elif outpath_ext == ".paratranz": ftext2paratranz(inpath, outpath)
+            elif outpath_ext == '.csv': ftext2csv(inpath, outpath, return_lines=False)
+            elif outpath_ext == ".json": ftext2json(inpath, outpath, return_lines=False)
+            elif outpath_ext == ".paratranz": ftext2paratranz(inpath, outpath, return_lines=False)
             else: flag = True
         elif outpath_ext == '.txt': # others to ftext
             if inpath_ext == '.docx': docx2ftext(inpath, outpath)
@@ -237,27 +278,23 @@ def cli(cmdstr=None):
         if not flag: return
         raise NotImplementedError(f"convert not support {inpath_ext}->{outpath_ext}")
     
-    def cmd_split():
+    def cmd_split(): # stream by 2 pass, count and then split
         outbase = os.path.splitext(args.outpath)[0]
-        ftexts1, ftexts2 = load_ftext(args.inpath)
         nfile = args.split
         if nfile ==0: raise ValueError("nfile can not be 0")
-        nftextall = len(ftexts1)
+        nftextall = sum(1 for _ in load_ftext_iter(args.inpath))
         nftexteach = (nftextall + nfile - 1) // nfile
+        pairs = load_ftext_iter(args.inpath)
         for i in range(nfile):
             outpath = outbase + f"_{i}.txt"
-            s = slice(i*nftexteach, min((i+1)*nftexteach, nftextall))
-            save_ftext(ftexts1[s], ftexts2[s], outpath)
+            save_ftext_iter(islice(pairs, nftexteach), outpath)
+        pairs.close()
     
     def cmd_merge():
         nfile = args.merge
         if nfile == 0:  inpaths = glob(args.inpath)
         else:  inpaths = [os.path.splitext(args.inpath)[0] + f"_{i}.txt" for i in range(nfile)]
-        ftexts1, ftexts2 = [], []
-        for inpath in inpaths:
-            _f1, _f2 = load_ftext(inpath)
-            ftexts1.extend(_f1); ftexts2.extend(_f2)
-        save_ftext(ftexts1, ftexts2, args.outpath)
+        save_ftext_iter(chain.from_iterable(map(load_ftext_iter, inpaths)), args.outpath)
 
     parser = argparse.ArgumentParser(description=__description__)
     parser.add_argument("inpath")
@@ -290,4 +327,5 @@ v0.2, add support for csv and json, compatiable with paratranz.cn
 v0.3, remake according to libtext v0.6
 v0.3.1, add split merge ftext
 v0.3.2, add paratranz json format
+v0.3.3, stream ftext2csv, ftext2json, ftext2paratranz, split and merge by load_ftext_iter
 """
\ No newline at end of file
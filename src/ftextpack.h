@@ -1,9 +1,9 @@
 /**
  * A flexible format and low memory use implementation 
  * for general dynamic localization
- *   v0.1.1, developed by devseed
+ *   v0.2.1, developed by devseed
  *    
- *  use ftextpack_index_t.py to generate data.fp01
+ *  use ftextpack.py to generate data.fp01 (or fp02 with --pack_format fp02)
  *  you can pack all the ftexts files in a folder to single data file
 */
 
@@ -11,8 +11,12 @@
 #define _FTEXTPACK_H
 #include <stdint.h>
 #include <stdio.h>
+#include <string.h>
+#ifdef FTEXTPACK_ZLIB
+#include <zlib.h>
+#endif
 
-#define FTEXTPACK_VERSION "0.1.1"
+#define FTEXTPACK_VERSION "0.2.1"
 
 typedef struct _ftextpack_textinfo_t {
     union 
@@ -78,6 +82,27 @@ typedef struct _ftextpack_index_t {
     };
 }ftextpack_index_t;
 
+/**
+ * fp02 layout: index2, info[count] (or compact 4 uint32), 
+ * hash2[count], bucket[nbucket+1] (if nbucket), content at offset, 
+ * content is block_offset[nblock+1] (to offset) and zlib blocks if FTEXTPACK_FLAG_BLOCK
+*/
+#define FTEXTPACK_HASH_CRC32 0 // hash is crc32, hash2 is size
+#define FTEXTPACK_HASH_XXH64 1 // hash is high 32 bits, hash2 is low 32 bits
+#define FTEXTPACK_FLAG_COMPACT 1 // info with org.hash, now.offset, org.addr, now.size
+#define FTEXTPACK_FLAG_BLOCK 2 // content in zlib blocks, define FTEXTPACK_ZLIB to load
+
+typedef struct _ftextpack_index2_t {
+    char magic[4]; // fp02
+    uint32_t count; // text info count
+    uint32_t offset; // text offset
+    uint32_t reserved; // config crc32
+    uint32_t hashtype; // FTEXTPACK_HASH_XXX
+    uint32_t nbucket; // bucket of hash is hash*nbucket>>32, 0 for no bucket
+    uint32_t flag; // FTEXTPACK_FLAG_XXX
+    uint32_t blocksize; // uncompressed size of each block
+}ftextpack_index2_t;
+
 
 /**
  * general crc32 method
@@ -111,6 +136,37 @@ int ftextpack_searchbyhash(ftextpack_index_t *index, uint32_t hash, int start);
 */
 int ftextpack_searchbyaddr(ftextpack_index_t *index, uint32_t addr, int start);
 
+/**
+ * xxhash 64-bit method
+*/
+uint64_t ftextpack_xxh64(const void *buf, size_t n, uint64_t seed);
+
+/**
+ * hash the org text by index2 hashtype
+*/
+void ftextpack_hash2(const ftextpack_index2_t *index2, const void *buf, size_t n, uint32_t *hash, uint32_t *hash2);
+
+/**
+ * search the index2 (whole fp02 in memory) by hash and hash2, 
+ * in the bucket if nbucket, else binary search (must be sorted by hash)
+ * @return index of info, not find with -1
+*/
+int ftextpack_searchbyhash2(const ftextpack_index2_t *index2, uint32_t hash, uint32_t hash2);
+
+/**
+ * get the now text of info i in the whole fp02 in memory
+ * @return pointer to text end with \0, NULL if in blocks
+*/
+const char* ftextpack_gettext2(const ftextpack_index2_t *index2, int i);
+
+/**
+ * copy the now text of info i to outbuf end with \0, 
+ * only decompress the blocks with the text (need FTEXTPACK_ZLIB)
+ * @param blockbuf temp buffer with blocksize, can be NULL if not in blocks
+ * @return outtext size, error with 0
+*/
+int ftextpack_loadtext2(const ftextpack_index2_t *index2, int i, void *outbuf, int bufsize, void *blockbuf);
+
 #ifdef FTEXTPACK_IMPLEMENT
 uint32_t ftextpack_crc32(const void *buf, int n)
 {
@@ -221,6 +277,170 @@ int ftextpack_loadtext(FILE *fp, ftextpack_info_t *info, void *outbuf, int bufsi
     return pos;
 }
 
+#define FTEXTPACK_XXH_P1 0x9E3779B185EBCA87ULL
+#define FTEXTPACK_XXH_P2 0xC2B2AE3D27D4EB4FULL
+#define FTEXTPACK_XXH_P3 0x165667B19E3779F9ULL
+#define FTEXTPACK_XXH_P4 0x85EBCA77C2B2AE63ULL
+#define FTEXTPACK_XXH_P5 0x27D4EB2F165667C5ULL
+#define FTEXTPACK_ROTL64(x, r) (((x) << (r)) | ((x) >> (64 - (r))))
+
+static uint64_t ftextpack_read64(const uint8_t *p)
+{
+    uint64_t v = 0;
+    for(int i=7; i>=0; i--) v = (v << 8) | p[i];
+    return v;
+}
+
+static uint64_t ftextpack_xxh64_round(uint64_t acc, uint64_t input)
+{
+    acc += input * FTEXTPACK_XXH_P2;
+    acc = FTEXTPACK_ROTL64(acc, 31);
+    return acc * FTEXTPACK_XXH_P1;
+}
+
+uint64_t ftextpack_xxh64(const void *buf, size_t n, uint64_t seed)
+{
+    const uint8_t *p = (const uint8_t*)buf;
+    const uint8_t *end = p + n;
+    uint64_t h;
+    if(n >= 32)
+    {
+        uint64_t v[4] = {seed + FTEXTPACK_XXH_P1 + FTEXTPACK_XXH_P2, 
+            seed + FTEXTPACK_XXH_P2, seed, seed - FTEXTPACK_XXH_P1};
+        for(; p + 32 <= end; p += 32)
+        {
+            for(int i=0; i<4; i++) v[i] = ftextpack_xxh64_round(v[i], ftextpack_read64(p + 8*i));
+        }
+        h = FTEXTPACK_ROTL64(v[0], 1) + FTEXTPACK_ROTL64(v[1], 7) 
+            + FTEXTPACK_ROTL64(v[2], 12) + FTEXTPACK_ROTL64(v[3], 18);
+        for(int i=0; i<4; i++)
+        {
+            h ^= ftextpack_xxh64_round(0, v[i]);
+            h = h * FTEXTPACK_XXH_P1 + FTEXTPACK_XXH_P4;
+        }
+    }
+    else h = seed + FTEXTPACK_XXH_P5;
+    h += (uint64_t)n;
+
+    for(; p + 8 <= end; p += 8)
+    {
+        h ^= ftextpack_xxh64_round(0, ftextpack_read64(p));
+        h = FTEXTPACK_ROTL64(h, 27) * FTEXTPACK_XXH_P1 + FTEXTPACK_XXH_P4;
+    }
+    if(p + 4 <= end)
+    {
+        uint64_t k = (uint64_t)p[0] | (uint64_t)p[1]<<8 | (uint64_t)p[2]<<16 | (uint64_t)p[3]<<24;
+        h ^= k * FTEXTPACK_XXH_P1;
+        h = FTEXTPACK_ROTL64(h, 23) * FTEXTPACK_XXH_P2 + FTEXTPACK_XXH_P3;
+        p += 4;
+    }
+    for(; p < end; p++)
+    {
+        h ^= (*p) * FTEXTPACK_XXH_P5;
+        h = FTEXTPACK_ROTL64(h, 11) * FTEXTPACK_XXH_P1;
+    }
+    h ^= h >> 33; h *= FTEXTPACK_XXH_P2;
+    h ^= h >> 29; h *= FTEXTPACK_XXH_P3;
+    h ^= h >> 32;
+    return h;
+}
+
+void ftextpack_hash2(const ftextpack_index2_t *index2, const void *buf, size_t n, uint32_t *hash, uint32_t *hash2)
+{
+    if(index2->hashtype == FTEXTPACK_HASH_XXH64)
+    {
+        uint64_t h = ftextpack_xxh64(buf, n, 0);
+        *hash = (uint32_t)(h >> 32);
+        *hash2 = (uint32_t)h;
+    }
+    else
+    {
+        *hash = ftextpack_crc32(buf, (int)n);
+        *hash2 = (uint32_t)n;
+    }
+}
+
+int ftextpack_searchbyhash2(const ftextpack_index2_t *index2, uint32_t hash, uint32_t hash2)
+{
+    if(!index2) return -1;
+
+    int n = (int)index2->count;
+    int stride = index2->flag & FTEXTPACK_FLAG_COMPACT ? 4 : 8; // uint32 in info
+    const uint32_t *info = (const uint32_t*)(index2 + 1);
+    const uint32_t *hash2s = info + stride * n;
+    const uint32_t *bucket = hash2s + n;
+    int start = 0, end = n;
+    if(index2->nbucket)
+    {
+        uint32_t b = (uint32_t)(((uint64_t)hash * index2->nbucket) >> 32);
+        start = bucket[b];
+        end = bucket[b + 1];
+    }
+    else
+    {
+        int left = 0, right = n; // lower bound
+        while(left < right)
+        {
+            int mid = (left + right) / 2;
+            if(info[stride * mid] < hash) left = mid + 1;
+            else right = mid;
+        }
+        start = left;
+    }
+    for(int i=start; i<end && info[stride * i] <= hash; i++)
+    {
+        if(info[stride * i] == hash && hash2s[i] == hash2) return i;
+    }
+    return -1;
+}
+
+const char* ftextpack_gettext2(const ftextpack_index2_t *index2, int i)
+{
+    if(!index2 || i < 0 || i >= (int)index2->count) return NULL;
+    if(index2->flag & FTEXTPACK_FLAG_BLOCK) return NULL;
+    int stride = index2->flag & FTEXTPACK_FLAG_COMPACT ? 4 : 8;
+    const uint32_t *info = (const uint32_t*)(index2 + 1) + stride * i;
+    uint32_t offset = stride == 4 ? info[1] : info[5]; // now.offset
+    return (const char*)index2 + index2->offset + offset;
+}
+
+int ftextpack_loadtext2(const ftextpack_index2_t *index2, int i, void *outbuf, int bufsize, void *blockbuf)
+{
+    if(!index2 || i < 0 || i >= (int)index2->count || bufsize <= 0) return 0;
+    int stride = index2->flag & FTEXTPACK_FLAG_COMPACT ? 4 : 8;
+    const uint32_t *info = (const uint32_t*)(index2 + 1) + stride * i;
+    uint32_t offset = stride == 4 ? info[1] : info[5]; // now.offset
+    uint32_t size = stride == 4 ? info[3] : info[7]; // now.size
+    if(size > (uint32_t)bufsize - 1) size = bufsize - 1;
+    uint8_t *out = (uint8_t*)outbuf;
+    const uint8_t *content = (const uint8_t*)index2 + index2->offset;
+
+    if(!(index2->flag & FTEXTPACK_FLAG_BLOCK)) memcpy(out, content + offset, size);
+    else
+    {
+#ifdef FTEXTPACK_ZLIB
+        const uint32_t *blocks = (const uint32_t*)content;
+        uint32_t bs = index2->blocksize;
+        uint32_t pos = 0;
+        if(!blockbuf) return 0;
+        while(pos < size)
+        {
+            uint32_t b = (offset + pos) / bs;
+            uLongf blocklen = bs;
+            if(uncompress((Bytef*)blockbuf, &blocklen, content + blocks[b], blocks[b+1] - blocks[b]) != Z_OK) return 0;
+            uint32_t start = offset + pos - b * bs;
+            uint32_t n = (uint32_t)blocklen - start < size - pos ? (uint32_t)blocklen - start : size - pos;
+            memcpy(out + pos, (uint8_t*)blockbuf + start, n);
+            pos += n;
+        }
+#else
+        return 0;
+#endif
+    }
+    out[size] = 0;
+    return (int)size + 1;
+}
+
 #endif
 #endif
 
@@ -228,4 +448,6 @@ int ftextpack_loadtext(FILE *fp, ftextpack_info_t *info, void *outbuf, int bufsi
  * history:
  * v0.1, initial version with data.fp01
  * v0.1.1, add ftextpack_loadindexmap for smaller memory use
+ * v0.2, add fp02 index2 with xxh64 and hash buckets
+ * v0.2.1, add ftextpack_loadtext2 for fp02 content in zlib blocks
 */
\ No newline at end of file
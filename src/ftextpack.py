@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-__version__ = "0.2.1"
+__version__ = "0.2.8"
 __description__ = f"""
 A flexble format with low memory implementation
     v{__version__}, developed by devseed
@@ -12,18 +12,31 @@ import struct
 import argparse
 import logging
 import zlib
+import mmap
+import multiprocessing
+from bisect import bisect_left
 from ctypes import *
 from io import BytesIO
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from glob import glob
 from dataclasses import dataclass, field
-from typing import Callable, List
+from typing import Callable, Iterable, List, Union, Tuple, Dict
 
 try:
-    from libutil import writebytes, filter_loadfiles, ftext_t, load_batch, load_ftext, load_tbl
+    from libutil import readbytes, writebytes, filter_loadfiles, ftext_t, load_batch, load_ftext, load_tbl
     from libtext import encode_extend
 except ImportError:
-    exec("from libutil_v0_6 import writebytes, filter_loadfiles, ftext_t, load_batch, load_ftext, load_tbl")
-    exec("from libtext_v0_6_3 import encode_extend")
+    exec("from libutil_v0_6_9 import readbytes, writebytes, filter_loadfiles, ftext_t, load_batch, load_ftext, load_tbl")
+    exec("from libtext_v0_6_16 import encode_extend")
+
+try: # optional for bulk lookup
+    import numpy as np
+except ImportError: np = None
+
+try: # optional for faster xxh64
+    import xxhash
+except ImportError: xxhash = None
 
 # ftextpack functions
 class ftextpack_textinfo_t(Structure):
@@ -56,84 +69,260 @@ class ftextpack_index_t(Structure):
     def dummy(self):
         self.magic, self.count, self.offset, self.reserved, self.info = 5*[0]
 
+class ftextpack_index2_t(Structure):
+    _fields_ = [
+        ('magic', c_char * 4), 
+        ('count', c_uint32), 
+        ('offset', c_uint32),
+        ('reserved', c_uint32),
+        ('hashtype', c_uint32), # index of FPACK_HASHS
+        ('nbucket', c_uint32), # 0 for no bucket
+        ('flag', c_uint32), # FPACK_FLAG_XXX
+        ('blocksize', c_uint32) # uncompressed size of each block if FPACK_FLAG_BLOCK
+    ]
+    def dummy(self):
+        self.magic, self.count, self.offset, self.reserved = 4*[0]
+        self.hashtype, self.nbucket, self.flag, self.blocksize = 4*[0]
+
+FPACK_HASHS = ("crc32", "xxh64")
+FPACK_FLAG_COMPACT = 1
+FPACK_FLAG_BLOCK = 2 # content as block offsets (to index.offset) and zlib blocks
+
 @dataclass
 class Fpack:
-    index: ftextpack_index_t= ftextpack_index_t()
+    index: Union[ftextpack_index_t, ftextpack_index2_t] = ftextpack_index_t()
     infos: List[ftextpack_info_t]= field(default_factory=list)
     content: bytes = b""
+    hash2s: List[int] = None # fp02 only
+    buckets: List[int] = None # fp02 only, start of each bucket and count in the end
+    blocks: List[bytes] = None # fp02 only, compressed content blocks
+
+def xxh64(data: bytes, seed=0) -> int:
+    """
+    xxhash 64-bit, use xxhash module if installed
+    """
+
+    if xxhash: return xxhash.xxh64_intdigest(data, seed)
+    p1, p2, p3 = 0x9E3779B185EBCA87, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9
+    p4, p5, mask = 0x85EBCA77C2B2AE63, 0x27D4EB2F165667C5, 0xffffffffffffffff
+    rotl = lambda x, r: ((x << r) | (x >> (64 - r))) & mask
+    _round = lambda acc, x: rotl((acc + x*p2) & mask, 31) * p1 & mask
+    
+    n, i = len(data), 0
+    if n >= 32:
+        v = [(seed + p1 + p2) & mask, (seed + p2) & mask, seed, (seed - p1) & mask]
+        for i in range(0, n - 31, 32):
+            lanes = struct.unpack_from("<4Q", data, i)
+            v = [_round(v[j], lanes[j]) for j in range(4)]
+        i += 32
+        h = (rotl(v[0], 1) + rotl(v[1], 7) + rotl(v[2], 12) + rotl(v[3], 18)) & mask
+        for x in v: h = ((h ^ _round(0, x)) * p1 + p4) & mask
+    else: h = (seed + p5) & mask
+    h = (h + n) & mask
+    while i + 8 <= n:
+        h ^= _round(0, struct.unpack_from("<Q", data, i)[0])
+        h = (rotl(h, 27) * p1 + p4) & mask
+        i += 8
+    if i + 4 <= n:
+        h ^= struct.unpack_from("<I", data, i)[0] * p1 & mask
+        h = (rotl(h, 23) * p2 + p3) & mask
+        i += 4
+    for c in data[i:]:
+        h ^= c * p5 & mask
+        h = rotl(h, 11) * p1 & mask
+    h = (h ^ (h >> 33)) * p2 & mask
+    h = (h ^ (h >> 29)) * p3 & mask
+    return h ^ (h >> 32)
+
+def hash_fpack(data: bytes, hashtype="crc32") -> Tuple[int, int]:
+    """
+    :param hashtype: crc32 (size as hash2), xxh64 (high 32 bits as hash, low as hash2)
+    :return: hash, hash2 to identify the org text 
+    """
+
+    if hashtype == "crc32": return zlib.crc32(data), len(data)
+    elif hashtype == "xxh64": 
+        h = xxh64(data)
+        return h >> 32, h & 0xffffffff
+    else: raise ValueError(f"unknow hashtype {hashtype}")
+
+_encode_kw = dict() # encoding config in each process
+
+def _encode_init(kw: dict):
+    _encode_kw.update(kw)
+
+@filter_loadfiles([1])
+def _encode_pair(ftextobj, binobj, *, enc, enc_error, text_noeval=False, 
+        text_replace=None, pack_org=False, pack_hash="crc32", reuses=None, 
+        f_before=None, f_after=None) -> List[tuple]:
+    """
+    parse and encode the ftexts of one file, the first stage of pack_ftexts
+    :param reuses: {(org.hash, org.addr, org.size, now.hash, now.addr)} not to encode
+    :return: [(org.hash, hash2, addr, size, orgbytes, orgtext, now.hash, addr, encbytes)], 
+        encbytes is None if reused
+    """
+
+    ftexts1, ftexts2 = load_ftext(ftextobj, as_table=True)
+    assert(len(ftexts1) == len(ftexts2))
+    srcdata = memoryview(binobj)
+    records = []
+    for t1, t2 in zip(ftexts1, ftexts2):
+        textbytes = srcdata[t1.addr: t1.addr + t1.size]
+        orghash, orghash2 = hash_fpack(textbytes, pack_hash)
+        nowhash = zlib.crc32(t2.text.encode("utf-8", "surrogatepass"))
+        encbytes = None
+        if not reuses or (orghash, t1.addr, t1.size, nowhash, t2.addr) not in reuses:
+            text = f_before(srcdata, t2) if f_before else t2.text
+            for k, v in text_replace.items(): text = text.replace(k, v)
+            encbytes = encode_extend(text, enc, enc_error, text_noeval)
+            if f_after: encbytes = f_after(srcdata, None, encbytes, t2)
+        records.append((orghash, orghash2, t1.addr, t1.size, bytes(textbytes), t1.text, nowhash, t2.addr, encbytes))
+    return records
+
+def _encode_worker(ftextobj, binobj) -> List[tuple]:
+    return _encode_pair(ftextobj, binobj, **_encode_kw)
 
 def pack_ftexts(binobjs, ftextobjs,
         outobj, encoding="utf8", tblobj=None, *, text_noeval=False, 
         text_replace=None, bytes_fallback=None, pack_sort="hash", 
-        pack_org=False, pack_nodup=False, pack_compact=False, 
+        pack_org=False, pack_nodup=False, pack_compact=False, pack_base=None, jobs=1,
+        pack_format="fp01", pack_hash="crc32", pack_merge="none", pack_block=0,
         f_before: Callable[[bytes, ftext_t], str] = None, 
         f_after: Callable[[bytes, memoryview, bytes, ftext_t], bytes] = None) -> Fpack:
+    """
+    :param pack_base: the old full pack for incremental, reuse the content of 
+        unchanged texts (same org hash, addr, size and now.hash text crc32), 
+        and append the changed ones, the content is compacted if half garbage
+    :param jobs: encode files in processes and write in order (same output), 0 for cpu count
+    :param pack_format: fp01, or fp02 with hash2 column and buckets for lookup (only hash sorted)
+    :param pack_hash: crc32 (size as hash2), xxh64 (only fp02)
+    :param pack_merge: none, same (share the same text bytes in content), 
+        tail (also share the suffix of longer text, like string table optimizer)
+    :param pack_block: compress content in zlib blocks of this size (only fp02), 0 for not
+    """
 
-    def _load_org(t: ftext_t, srcdata: bytes, crcmap) -> ftextpack_textinfo_t:
-        start = 0
-        textbytes = srcdata[t.addr: t.addr+t.size]
-        tcrc = zlib.crc32(textbytes)
-        if tcrc in crcmap and pack_nodup:
-            logging.info(f"dropdup [crc=0x{tcrc:x} addr=0x{t.ddr:x} size=0x{t.size:x} text='{t.text}]'") 
-            return None
-        if pack_org: start = bufio.tell(); bufio.write(textbytes); bufio.write(b'\x00')
-        tmp = struct.pack("4I", tcrc, start, t.addr, t.size)
-        textinfo = ftextpack_textinfo_t.from_buffer_copy(tmp)
-        crcmap.update({tcrc: t})
-        return textinfo
-
-    def _load_now(t: ftext_t, srcdata: bytes) -> ftextpack_textinfo_t:
-        text = t.text
-        start = bufio.tell()
-        text = f_before(srcdata, t) if f_before else t.text
-        for k, v in text_replace.items(): text = text.replace(k, v)
-        encbytes = encode_extend(text, enc, enc_error, text_noeval)
-        if f_after: encbytes = f_after(srcdata, None, encbytes, t)
-        tmp = struct.pack("4I", 0, start, t.addr, len(encbytes))
-        textinfo = ftextpack_textinfo_t.from_buffer_copy(tmp)
-        bufio.write(encbytes)
-        bufio.write(b'\x00')
-        return textinfo
-    
-    @filter_loadfiles([1])
-    def _load_pair(ftextobj, binobj) -> List[ftextpack_info_t]:
-        ftexts1, ftexts2 = load_ftext(ftextobj)
-        logging.info(f"load {repr(ftextobj)} with {len(ftexts1)} texts")
-        assert(len(ftexts1) == len(ftexts2))
-
-        srcdata = memoryview(binobj)
-        for j, (t1, t2) in enumerate(zip(ftexts1, ftexts2)):
-            org = _load_org(t1, srcdata, crcmap)
-            if not org: continue
-            now = _load_now(t2, srcdata)
+    def _write_pair(ftextobj, records: List[tuple]):
+        logging.info(f"load {repr(ftextobj)} with {len(records)} texts")
+        for orghash, orghash2, addr, size, orgbytes, orgtext, nowhash, nowaddr, encbytes in records:
+            key = (orghash, orghash2) if pack_format != "fp01" else orghash # fp01 finds by crc only
+            if key not in keymap: keymap[key] = orgbytes
+            elif keymap[key] != orgbytes:
+                logging.warning(f"hash collision [hash=0x{orghash:x} hash2=0x{orghash2:x} addr=0x{addr:x} text='{orgtext}']")
+            elif pack_nodup:
+                logging.info(f"dropdup [hash=0x{orghash:x} addr=0x{addr:x} size=0x{size:x} text='{orgtext}]'") 
+                continue
+            start = 0
+            base = basemap.get((orghash, addr, size))
+            if pack_org and base: start = base.org.offset
+            elif pack_org: start = bufio.tell(); bufio.write(orgbytes); bufio.write(b'\x00')
+            org = ftextpack_textinfo_t(orghash, start, addr, size)
+            if encbytes is None: # unchanged, reused from base
+                stat["reused"] += 1
+                now = ftextpack_textinfo_t.from_buffer_copy(base.now)
+            else:
+                stat["encoded"] += 1
+                now = ftextpack_textinfo_t(nowhash, bufio.tell(), nowaddr, len(encbytes))
+                bufio.write(encbytes)
+                bufio.write(b'\x00')
             info = ftextpack_info_t()
             info.org, info.now = org, now
             infos.append(info)
+            hash2s.append(orghash2)
+
+    def _load_base(inobj) -> Dict[Tuple[int, int, int], ftextpack_info_t]:
+        if inobj is None or f_before or f_after: return dict()
+        if type(inobj) == str and not os.path.exists(inobj): 
+            logging.warning(f"pack_base not exist, pack all [pack_base={inobj}]")
+            return dict()
+        with FpackReader(inobj) as reader:
+            if reader.compact or reader.reserved != config or reader.version != pack_format:
+                logging.warning(f"pack_base with difference config or compact, pack all [pack_base={inobj}]")
+                return dict()
+            size_info = sizeof(ftextpack_info_t)
+            bufio.write(reader.content())
+            basemap = dict()
+            for i in range(len(reader) - 1, -1, -1): # the first one for same key
+                info = ftextpack_info_t.from_buffer_copy(reader.infos, i*size_info)
+                basemap[(info.org.hash, info.org.addr, info.org.size)] = info
+        logging.info(f"load pack_base {repr(inobj)} with {len(basemap)} texts")
+        return basemap
+
+    def _compact_content(infos: List[ftextpack_info_t], content: bytes) -> bytes:
+        fp = BytesIO()
+        offsetmap = dict() # {old: new}
+        for info in infos:
+            texts = [info.now, info.org] if pack_org else [info.now]
+            for t, size in zip(texts, [info.now.size, info.org.size]):
+                if t.offset not in offsetmap:
+                    offsetmap[t.offset] = fp.tell()
+                    fp.write(content[t.offset: t.offset + size + 1]) # with \0
+                t.offset = offsetmap[t.offset]
+        return fp.getvalue()
+
+    def _merge_content(infos: List[ftextpack_info_t], content: bytes, tail=False) -> bytes:
+        textmap: Dict[bytes, List[ftextpack_textinfo_t]] = dict() # {textbytes: [textinfo]}
+        for info in infos:
+            for t in ([info.now, info.org] if pack_org else [info.now]):
+                textmap.setdefault(bytes(content[t.offset: t.offset + t.size]), []).append(t)
+        
+        # sort by reversed bytes, the suffix is just after the longer one with it
+        keys = sorted(textmap, key=lambda x: x[::-1], reverse=True) if tail else textmap.keys()
+        fp = BytesIO()
+        last, end = None, 0
+        for k in keys:
+            if tail and last is not None and last.endswith(k): start = end - len(k)
+            else: 
+                start = fp.tell()
+                fp.write(k); fp.write(b'\x00')
+                last, end = k, start + len(k)
+            for t in textmap[k]: t.offset = start
+        return fp.getvalue()
 
     def save_fpack(fpack: Fpack, outobj, pack_compact=False) -> None:
         fp = outobj if type(outobj)!=str else BytesIO() 
         start = fp.tell()
         index, infos, content =fpack.index, fpack.infos, fpack.content
         fp.write(index)
-        fp.seek(-sizeof(ftextpack_info_t), 1)
+        if index.magic == b"fp01": fp.seek(-sizeof(ftextpack_info_t), 1)
         for info in infos:
             if pack_compact: 
                 tmp = info.org.hash, info.now.offset, info.org.addr, info.now.size
                 fp.write(struct.pack("<4I", *tmp))
             else: fp.write(info)
-        fp.write(content)
+        if index.magic == b"fp02":
+            fp.write(array('I', fpack.hash2s).tobytes())
+            if fpack.buckets: fp.write(array('I', fpack.buckets).tobytes())
+        if fpack.blocks is not None:
+            offsets = [0]
+            for block in fpack.blocks: offsets.append(offsets[-1] + len(block))
+            fp.write(array('I', [x + 4*len(offsets) for x in offsets]).tobytes())
+            for block in fpack.blocks: fp.write(block)
+        else: fp.write(content)
         end = fp.tell()
         if type(outobj) == str: writebytes(outobj, fp.getvalue()); fp.close()
         logging.info(f"save 0x{end-start:x} bytes to {repr(outobj)}")
 
     # prepare enviroment
     bufio = BytesIO()
-    crcmap = dict() # {crc: ftext}
+    keymap = dict() # {(hash, hash2): orgbytes}, {hash: orgbytes} in fp01
     infos: List[ftextpack_info_t] = []
+    hash2s: List[int] = []
+    if pack_format not in {"fp01", "fp02"}: raise ValueError(f"unknow pack_format {pack_format}")
+    if pack_merge not in {"none", "same", "tail"}: raise ValueError(f"unknow pack_merge {pack_merge}")
+    if pack_block and pack_format == "fp01": raise ValueError(f"pack_block only in fp02")
+    if pack_format == "fp02" and pack_sort != "hash": # runtime searchs by hash
+        raise ValueError(f"fp02 must be sorted by hash [pack_sort={pack_sort}]")
+    if pack_hash not in FPACK_HASHS or (pack_format == "fp01" and pack_hash != "crc32"):
+        raise ValueError(f"unsupport pack_hash {pack_hash} in {pack_format}")
     tbl = load_tbl(tblobj)
     enc = tbl if tbl else encoding
     enc_error = bytes_fallback if tbl else ("ignore" if bytes_fallback else "strict")
     text_replace = text_replace if text_replace else dict()
+    config = zlib.crc32(repr((encoding if not tbl else [(t.tcode, t.tchar) for t in tbl], 
+        enc_error, text_noeval, sorted(text_replace.items()), pack_org) + 
+        ((pack_format, pack_hash) if pack_format != "fp01" else ())).encode()) # encoding config
+    stat = {"reused": 0, "encoded": 0}
+    basemap = _load_base(pack_base)
     
     # load files
     if type(ftextobjs) == str:
@@ -142,29 +331,247 @@ def pack_ftexts(binobjs, ftextobjs,
     if type(binobjs) == str:
         _fbfunc = lambda x: os.path.join(binobjs, os.path.splitext(os.path.basename(x))[0])
         binobjs = [binobjs] if os.path.isfile(binobjs) else list(map(_fbfunc, ftextobjs))
-    for (f1, f2) in zip(ftextobjs, binobjs): _load_pair(f1, f2)
+    pairs = list(zip(ftextobjs, binobjs))
+    jobs = min(jobs if jobs > 0 else os.cpu_count(), len(pairs))
+    reuses = set((*k, info.now.hash, info.now.addr) for k, info in basemap.items())
+    kw = dict(enc=enc, enc_error=enc_error, text_noeval=text_noeval, 
+        text_replace=text_replace, pack_org=pack_org, pack_hash=pack_hash, reuses=reuses)
+    if jobs > 1 and (f_before or f_after):
+        logging.warning("f_before or f_after can not be used in processes, use jobs=1")
+        jobs = 1
+    if jobs <= 1:
+        for f1, f2 in pairs: 
+            _write_pair(f1, _encode_pair(f1, f2, f_before=f_before, f_after=f_after, **kw))
+    else: # encode in processes, write in order for the same output
+        logging.info(f"encode {len(pairs)} files in processes [jobs={jobs}]")
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("spawn"), 
+                initializer=_encode_init, initargs=(kw, )) as executor: # not fork after threads
+            for (f1, _), records in zip(pairs, executor.map(_encode_worker, *zip(*pairs))):
+                _write_pair(f1, records)
+    content = bufio.getbuffer()[:bufio.tell()]
+    if basemap: 
+        used = sum(info.now.size + 1 + (info.org.size + 1 if pack_org else 0) for info in infos)
+        logging.info(f"incremental [reused={stat['reused']} encoded={stat['encoded']} "
+            f"garbage=0x{len(content) - used:x}]")
+        if pack_merge == "none" and used < len(content) - used: content = _compact_content(infos, content)
+    if pack_merge != "none":
+        size = len(content)
+        content = _merge_content(infos, content, pack_merge == "tail")
+        logging.info(f"merge content [mode={pack_merge} size=0x{size:x}->0x{len(content):x}]")
 
     # sort info
-    if pack_sort=="hash": infos.sort(key = lambda x: x.org.hash)
-    elif pack_sort == "addr": infos.sort(key = lambda x: (x.org.addr<<32) + x.org.size)
+    n = len(infos)
+    if pack_sort=="hash": order = sorted(range(n), key = lambda i: (infos[i].org.hash, hash2s[i]))
+    elif pack_sort == "addr": order = sorted(range(n), key = lambda i: (infos[i].org.addr<<32) + infos[i].org.size)
     else: raise ValueError(f"unknow sorby type {pack_sort}")
+    infos = [infos[i] for i in order]
+    hash2s = [hash2s[i] for i in order]
     
     # make header
-    n = len(infos)
-    index = ftextpack_index_t()
-    index.magic = b'fp01'
-    index.count = n
-    index.reserved = 0
-    size_index = sizeof(ftextpack_index_t)
     size_info = sizeof(ftextpack_info_t)
     size_textinfo = sizeof(ftextpack_textinfo_t)
-    if not pack_compact: index.offset = size_index + (n-1)*size_info
-    else: index.offset = size_index - size_info + n*size_textinfo
+    size_infos = n*size_textinfo if pack_compact else n*size_info
+    buckets = None
+    if pack_format == "fp01":
+        index = ftextpack_index_t()
+        index.offset = sizeof(ftextpack_index_t) - size_info + size_infos
+    else:
+        index = ftextpack_index2_t()
+        index.hashtype = FPACK_HASHS.index(pack_hash)
+        index.flag = FPACK_FLAG_COMPACT if pack_compact else 0
+        if pack_sort == "hash": # bucket by high bits of hash, in sorted order
+            index.nbucket = max(n, 1)
+            buckets = [0] * (index.nbucket + 1)
+            for info in infos: buckets[(info.org.hash * index.nbucket >> 32) + 1] += 1
+            for i in range(index.nbucket): buckets[i + 1] += buckets[i]
+        index.offset = sizeof(ftextpack_index2_t) + size_infos + 4*n + (4*len(buckets) if buckets else 0)
+        if pack_block:
+            index.flag |= FPACK_FLAG_BLOCK
+            index.blocksize = pack_block
+            blocks = [zlib.compress(content[i: i + pack_block], 9) for i in range(0, len(content), pack_block)]
+            logging.info(f"compress content [blocksize=0x{pack_block:x} nblock={len(blocks)} "
+                f"size=0x{len(content):x}->0x{sum(map(len, blocks)):x}]")
+    index.magic = pack_format.encode()
+    index.count = n
+    index.reserved = config
 
-    fpack = Fpack(index, infos, bufio.getbuffer()[:bufio.tell()])
+    fpack = Fpack(index, infos, content, hash2s if pack_format != "fp01" else None, buckets, 
+        blocks if pack_block else None)
     if outobj: save_fpack(fpack, outobj, pack_compact)
     return fpack
 
+class FpackReader:
+    """
+    read the fp01, fp02 pack (full or compact) by mmap, find by org hash or addr 
+    with binary search (or buckets), and get the now text as zero-copy memoryview
+    """
+
+    def __init__(self, inobj: Union[str, bytes, BytesIO], cache_block=16):
+        """
+        :param inobj: path (mmap), io or buffer
+        :param cache_block: max decompressed blocks in cache
+        """
+
+        self.data = readbytes(inobj, use_mmap=True) if type(inobj) == str or hasattr(inobj, "read") else inobj
+        self.buf = memoryview(self.data)
+        magic, self.count, self.offset, self.reserved = struct.unpack_from("<4s3I", self.buf)
+        n = self.count
+        self.hash2s, self.buckets, self.blocks = None, None, None # fp02 only
+        self.blocksize = 0
+        if magic == b"fp01":
+            self.hashtype = "crc32"
+            size_head = sizeof(ftextpack_index_t) - sizeof(ftextpack_info_t)
+            self.stride = (self.offset - size_head) // (4*n) if n else 8 # uint32 in each info
+            if self.stride not in {4, 8}: raise ValueError(f"unknow fp01 layout [count={n} offset=0x{self.offset:x}]")
+        elif magic == b"fp02":
+            hashtype, nbucket, flag, blocksize = struct.unpack_from("<4I", self.buf, 16)
+            if hashtype >= len(FPACK_HASHS): raise ValueError(f"unknow fp02 hashtype {hashtype}")
+            self.hashtype = FPACK_HASHS[hashtype]
+            size_head = sizeof(ftextpack_index2_t)
+            self.stride = 4 if flag & FPACK_FLAG_COMPACT else 8
+            start = size_head + 4*self.stride*n
+            self.hash2s = self.buf[start: start + 4*n].cast('I')
+            if nbucket: self.buckets = self.buf[start + 4*n: start + 4*(n + nbucket + 1)].cast('I')
+            if flag & FPACK_FLAG_BLOCK:
+                self.blocksize = blocksize
+                nblock = struct.unpack_from("<I", self.buf, self.offset)[0] // 4 - 1
+                self.blocks = self.buf[self.offset: self.offset + 4*(nblock + 1)].cast('I')
+        else: raise ValueError(f"not fp01 or fp02 pack [magic={magic}]")
+        self.version = magic.decode()
+        self.compact = self.stride == 4
+        self.infos = self.buf[size_head: size_head + 4*self.stride*n].cast('I')
+        if self.compact: idx_hash, idx_addr, idx_offset, idx_size = 0, 2, 1, 3 
+        else: idx_hash, idx_addr, idx_offset, idx_size = 0, 2, 5, 7
+        self.hashs = self.infos[idx_hash::self.stride]
+        self.addrs = self.infos[idx_addr::self.stride]
+        self.offsets = self.infos[idx_offset::self.stride] # now text offset
+        self.sizes = self.infos[idx_size::self.stride] # now text size
+        self.indexs: Dict[str, Tuple[List[int], List[int]]] = dict() # for not sorted column
+        self.cache_block = cache_block
+        self.cached: Dict[int, bytes] = dict() # {block: data}, in lru order
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self) -> "FpackReader":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for k in ["hashs", "addrs", "offsets", "sizes", "hash2s", "buckets", "blocks", "infos", "buf"]:
+            if getattr(self, k) is not None: getattr(self, k).release()
+        if type(self.data) == mmap.mmap:
+            try: self.data.close()
+            except BufferError: pass # texts still used
+    
+    def text(self, i: int) -> memoryview:
+        if self.blocks is not None: return memoryview(self.read_content(self.offsets[i], self.sizes[i]))
+        start = self.offset + self.offsets[i]
+        return self.buf[start: start + self.sizes[i]]
+
+    def block(self, b: int) -> bytes:
+        """
+        decompress the block b, cached in lru
+        """
+
+        data = self.cached.pop(b, None)
+        if data is None:
+            data = zlib.decompress(self.buf[self.offset + self.blocks[b]: self.offset + self.blocks[b + 1]])
+            if len(self.cached) >= self.cache_block: self.cached.pop(next(iter(self.cached)))
+        self.cached[b] = data
+        return data
+
+    def read_content(self, start: int, size: int) -> bytes:
+        """
+        read the content (decompressed if blocks) in [start, start + size)
+        """
+
+        if self.blocks is None: return bytes(self.buf[self.offset + start: self.offset + start + size])
+        bs = self.blocksize
+        b0, b1 = start // bs, min((start + size) // bs, len(self.blocks) - 2)
+        data = self.block(b0) if b0 == b1 else b"".join(self.block(b) for b in range(b0, b1 + 1))
+        return data[start - b0*bs: start - b0*bs + size]
+
+    def content(self) -> bytes:
+        if self.blocks is None: return self.buf[self.offset:]
+        return b"".join(zlib.decompress(self.buf[self.offset + self.blocks[b]: self.offset + self.blocks[b + 1]]) 
+            for b in range(len(self.blocks) - 1))
+
+    def sorted_index(self, name="hashs") -> Tuple[List[int], List[int]]:
+        """
+        :param name: column "hashs" or "addrs", 
+        :return: sorted column, order (None if the pack is sorted by it)
+        """
+
+        if name not in self.indexs:
+            col = getattr(self, name)
+            if all(col[i] <= col[i + 1] for i in range(self.count - 1)): self.indexs[name] = (col, None)
+            else: 
+                order = sorted(range(self.count), key=col.__getitem__)
+                self.indexs[name] = ([col[i] for i in order], order)
+        return self.indexs[name]
+
+    def find(self, value: int, name="hashs") -> int:
+        """
+        :return: the first index of value in column, -1 if not found
+        """
+
+        col, order = self.sorted_index(name)
+        i = bisect_left(col, value)
+        if i >= self.count or col[i] != value: return -1
+        return order[i] if order else i
+
+    def find_hash(self, hash: int) -> int:
+        return self.find(hash, "hashs")
+
+    def find_addr(self, addr: int) -> int:
+        return self.find(addr, "addrs")
+    
+    def finds(self, values: Iterable[int], name="hashs") -> List[int]:
+        """
+        bulk find by searchsorted if numpy installed
+        """
+        
+        if np is None or self.count == 0: return [self.find(x, name) for x in values]
+        col, order = self.sorted_index(name)
+        col = np.asarray(col, dtype=np.uint32)
+        keys = np.asarray(values if hasattr(values, "__len__") else list(values), dtype=np.int64)
+        idxs = np.searchsorted(col, keys)
+        found = (idxs < self.count) & (col[np.minimum(idxs, self.count - 1)] == keys)
+        if order: idxs = np.asarray(order)[np.minimum(idxs, self.count - 1)]
+        return np.where(found, idxs, -1).tolist()
+
+    def find_key(self, hash: int, hash2: int) -> int:
+        """
+        find by hash and hash2 (fp02), in the bucket without binary search if exist
+        :return: the first index matched, -1 if not found
+        """
+
+        if self.hash2s is None: return self.find_hash(hash)
+        if self.buckets is not None:
+            b = hash * (len(self.buckets) - 1) >> 32
+            idxs = range(self.buckets[b], self.buckets[b + 1])
+        else:
+            col, order = self.sorted_index("hashs")
+            start = bisect_left(col, hash)
+            idxs = range(start, self.count)
+            if order: idxs = (order[j] for j in idxs)
+        for i in idxs:
+            if self.hashs[i] == hash:
+                if self.hash2s[i] == hash2: return i
+            elif self.buckets is None: break # in sorted hash order
+        return -1
+
+    def lookup(self, data: bytes) -> memoryview:
+        """
+        find the now text of org data by hash (crc32 in fp01), as the runtime hook
+        """
+
+        i = self.find_key(*hash_fpack(data, self.hashtype))
+        return self.text(i) if i >= 0 else None
+
 def cli(cmdstr=None):
     def filter_paths(args):
         if args.batch:
@@ -194,7 +601,9 @@ def cli(cmdstr=None):
                 encoding=args.encoding, tblobj=tbl, text_noeval=args.text_noeval, 
                 text_replace=text_replace, bytes_fallback=bytes_fallback, 
                 pack_sort=args.pack_sort, pack_org=args.pack_org, 
-                pack_nodup=args.pack_nodup, pack_compact=args.pack_compact)
+                pack_nodup=args.pack_nodup, pack_compact=args.pack_compact, pack_base=args.pack_base, 
+                pack_format=args.pack_format, pack_hash=args.pack_hash, 
+                pack_merge=args.pack_merge, pack_block=int(args.pack_block, 0), jobs=args.jobs)
 
     parser = argparse.ArgumentParser(description=__description__)
     parser.add_argument("binpath", help="bin file or dir")
@@ -211,10 +620,20 @@ def cli(cmdstr=None):
     parser.add_argument("--text_noeval", action="store_true",  help="disable eval like {{b'\x00'}}")
     parser.add_argument('--bytes_fallback', type=str, default=None, help="bytes after tbl failed")
     parser.add_argument("--pack_sort", default="hash", 
-        choices=("hash", "addr"), help="sorted text after packing")
+        choices=("hash", "addr"), help="sorted text after packing, fp02 only hash")
     parser.add_argument("--pack_org", action='store_true', help="pack origin data for reference")
     parser.add_argument('--pack_compact', action='store_true', help='use compact structure for packing')
     parser.add_argument('--pack_nodup', action='store_true', help="don't pack dup text on pack")
+    parser.add_argument('--pack_base', default=None, help="incremental pack from the old full pack (can be outpath)")
+    parser.add_argument("--pack_format", default="fp01", choices=("fp01", "fp02"), 
+        help="fp02 with hash2 and buckets for collision safe and faster lookup")
+    parser.add_argument("--pack_hash", default="crc32", choices=FPACK_HASHS, 
+        help="crc32 (with size), xxh64 (only fp02)")
+    parser.add_argument("--pack_merge", default="none", choices=("none", "same", "tail"), 
+        help="share the same text (and suffix for tail) in content")
+    parser.add_argument("--pack_block", default="0", 
+        help="compress content in zlib blocks of this size (only fp02), such as 0x10000")
+    parser.add_argument("--jobs", type=int, default=1, help="process number for encoding files, 0 for cpu count")
 
     args = parser.parse_args(cmdstr.split(' ') if cmdstr else None)
     loglevel = args.log_level if hasattr(args, "log_level") else "info"
@@ -231,4 +650,11 @@ v0.1, initial version with data.fp01
 v0.1.1, add allow_compat for smaller memory use
 v0.2, remake according to libtext v0.6
 v0.2.1, use batch operations to improve performance
+v0.2.2, load ftexts as ftexttable_t in pack_ftexts
+v0.2.3, add FpackReader to lookup fp01 by mmap and binary search
+v0.2.4, add pack_base for incremental pack, now.hash as text crc32, reserved as config crc32
+v0.2.5, add jobs to encode files in processes with the same output as serial
+v0.2.6, add fp02 with xxh64 or crc32 with size, hash buckets, and only drop the same bytes in nodup
+v0.2.7, add pack_merge to share the same text and suffix in content
+v0.2.8, add pack_block for fp02 content in zlib blocks, decompressed by block in FpackReader
 """
\ No newline at end of file
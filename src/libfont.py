@@ -1,5 +1,5 @@
  # -*- coding: utf-8 -*-
-__version__ = "0.3.1"
+__version__ = "0.3.2"
 __description__ = f"""
 A font tool (remake) for tbl and glphy operations
     v{__version__}, developed by devseed
@@ -18,9 +18,9 @@ import numpy as np
 from PIL import ImageFont, ImageDraw, Image
 
 try:
-    from libutil import tile_t, tbl_t, writebytes, writeimage, filter_loadfiles, filter_loadimages, valid_tile, load_tbl, save_tbl
+    from libutil import tile_t, tbl_t, writebytes, writeimage, filter_loadfiles, filter_loadimages, valid_tile, load_tbl, save_tbl, zippool_t
 except ImportError:
-    exec("from libutil_v0_6 import tile_t, tbl_t, writebytes, writeimage, filter_loadfiles, filter_loadimages, valid_tile, load_tbl, save_tbl")
+    exec("from libutil_v0_6_9 import tile_t, tbl_t, writebytes, writeimage, filter_loadfiles, filter_loadimages, valid_tile, load_tbl, save_tbl, zippool_t")
 
 # tbl generations
 def make_cp932_tbl(range_full=True, text_fallback="♯", out_failed: List[int]=None) -> List[tbl_t]: 
@@ -353,7 +353,7 @@ def make_tile_font(tblobj: Union[str, List[tbl_t]], ttfobj: Union[str, bytes],
 def extract_glphy(tileimg, outdir, i, tbl: List[tbl_t]=None) -> str:
     """
     extract a glphy to outdir, with tbl encoded
-    warning, better not write to zip file, very slow here
+    writing to zip file should be in zippool_t, or it reopens the zip every glphy
     """
 
     def join_path(path, name):
@@ -405,11 +405,12 @@ def extract_image_font(tblobj: Union[str, List[tbl_t]], inobj: Union[str, np.nda
     logging.info(f"extract {n} {tileinfo} glphys")
     
     names = n*[None]
-    for i in range(n):
-        x, y = i%ntilerow*tileinfo.h, i//ntilerow*tileinfo.w
-        tileimg = img[y: y+tileinfo.h, x: x+tileinfo.w, ...]
-        names.append(extract_glphy(tileimg, (outpath if split_glphy else None), i, tbl))
-    if outpath and split_glphy is False: save_glphy(outpath, img)
+    with zippool_t(): # append glphys to zip in one session
+        for i in range(n):
+            x, y = i%ntilerow*tileinfo.h, i//ntilerow*tileinfo.w
+            tileimg = img[y: y+tileinfo.h, x: x+tileinfo.w, ...]
+            names.append(extract_glphy(tileimg, (outpath if split_glphy else None), i, tbl))
+        if outpath and split_glphy is False: save_glphy(outpath, img)
     return names, img
 
 @filter_loadfiles(1)
@@ -433,13 +434,14 @@ def extract_tile_font(tblobj: Union[str, List[tbl_t]],
     names = n*[None]
     h, w = (n + ntilerow - 1)//ntilerow * tileinfo.h , ntilerow * tileinfo.w
     img = np.zeros((h, w, 4), dtype=np.uint8)
-    for i in range(n):
-        x, y = i%ntilerow * tileinfo.w, i//ntilerow * tileinfo.h
-        tileimg = img[y: y+tileinfo.h, x: x+tileinfo.w, ...]
-        f_decode(tiledata[i*tileinfo.size: (i+1)*tileinfo.size], 
-            tileinfo.size, tileinfo.w, tileinfo.h, tileinfo.bpp, palette, tileimg)
-        names.append(extract_glphy(tileimg, (outpath if split_glphy else None), i, tbl))
-    if outpath and split_glphy is False: save_glphy(outpath, img)
+    with zippool_t(): # append glphys to zip in one session
+        for i in range(n):
+            x, y = i%ntilerow * tileinfo.w, i//ntilerow * tileinfo.h
+            tileimg = img[y: y+tileinfo.h, x: x+tileinfo.w, ...]
+            f_decode(tiledata[i*tileinfo.size: (i+1)*tileinfo.size], 
+                tileinfo.size, tileinfo.w, tileinfo.h, tileinfo.bpp, palette, tileimg)
+            names.append(extract_glphy(tileimg, (outpath if split_glphy else None), i, tbl))
+        if outpath and split_glphy is False: save_glphy(outpath, img)
     return names, img
 
 def cli(cmdstr=None):
@@ -594,4 +596,5 @@ v0.2.4, add typing hint and rename some functions
 v0.2.5, add combine_tbls, update_tbls function for tbl pages
 v0.3, remake according to libtext v0.6, add cli support
 v0.3.1, fix bugs and make cache on decode_glphy, add split_glphy option
+v0.3.2, extract glphys to zip in one session by zippool_t
 """
\ No newline at end of file
@@ -1,5 +1,5 @@
 # -*- coding: utf-8 -*-
-__version__ = "0.3.1"
+__version__ = "0.3.7"
 __description__ = f"""
 A image tool (remake) for image encoding or decoding, 
 all the intermediate format is rgba, index in alpha channel
@@ -7,20 +7,24 @@ all the intermediate format is rgba, index in alpha channel
 """
 
 import math
+import time
+import zlib
+import struct
 import logging
 import argparse
+from io import BytesIO
 from queue import Queue
 from typing import Union
 
 import numba
 import numpy as np
-from numba import njit, prange, void, uint8, int32
+from numba import njit, prange, void, uint8, int32, float32, boolean
 readonly = lambda dtype, dim: numba.types.Array(dtype, dim, "C", True)
 
 try:
-    from libutil import tile_t, writebytes, writeimage, filter_loadfiles, filter_loadimages, load_batch, valid_tile
+    from libutil import tile_t, readstream, writestream, writebytes, writeimage, filter_loadfiles, filter_loadimages, load_batch, valid_tile
 except ImportError:
-    exec("from libutil_v0_6 import tile_t, writebytes, writeimage, filter_loadfiles, filter_loadimages, load_batch, valid_tile")
+    exec("from libutil_v0_6_9 import tile_t, readstream, writestream, writebytes, writeimage, filter_loadfiles, filter_loadimages, load_batch, valid_tile")
 
 # methods for generate patterns
 def make_swizzle_pattern(tileorder) -> np.ndarray:
@@ -76,6 +80,67 @@ def make_tile_pattern(tilew, tileh, ntiletotal=4, ntilerow=2) -> np.ndarray:
                 res[y, x] = tileidx * tilew * tileh + tiley * tilew + tilex
     return res
 
+def make_morton_pattern(w, h) -> np.ndarray:
+    """
+    make wxh morton (z-order) swizzle, x in the low bit,
+        the same as make_swizzle_pattern for the square side 2^n
+    """
+
+    y, x = np.mgrid[0:h, 0:w].astype(np.int64)
+    code = np.zeros_like(x)
+    for i in range(max(w, h).bit_length()):
+        code |= ((x >> i) & 1) << (2*i) | ((y >> i) & 1) << (2*i + 1)
+    res = np.empty(w*h, dtype=np.int32)
+    res[np.argsort(code.ravel(), kind="stable")] = np.arange(w*h, dtype=np.int32)
+    return res.reshape(h, w)
+
+def make_switch_pattern(w, h, bpp, blockheight=0) -> np.ndarray:
+    """
+    make wxh switch (tegra block linear) swizzle,
+        gob is 64 bytes x 8 lines, block is blockheight gobs
+    :param blockheight: gobs in a block, 0 for auto by h
+    """
+
+    bpb = bpp // 8 # bytes per pixel
+    if bpp % 8 or bpb not in {1, 2, 4, 8} or w*bpb % 64 or h % 8:
+        raise ValueError(f"switch swizzle not support [w={w} h={h} bpp={bpp}]")
+    if blockheight <= 0: blockheight = min(16, 1 << max(h // 8 - 1, 0).bit_length())
+    while h % (8*blockheight): blockheight //= 2
+    y, x = np.mgrid[0:h, 0:w*bpb:bpb]
+    addr = (y // (8*blockheight)) * (w*bpb // 64) * 512*blockheight \
+        + (x // 64) * 512*blockheight + (y % (8*blockheight) // 8) * 512 \
+        + (x % 64 // 32) * 256 + (y % 8 // 2) * 64 + (x % 32 // 16) * 32 + (y % 2) * 16 + x % 16
+    return (addr // bpb).astype(np.int32)
+
+def make_tile_map(tilew, tileh, tilebpp, ntiletotal, ntilerow, swizzle="none", start=0) -> np.ndarray:
+    """
+    make the gather (encode) or scatter (decode) map for tiles [start, start + ntiletotal),
+        the inverse of make_tile_pattern (with swizzle pattern in each tile),
+        only the pixel order in a tile is cached, call it by chunks for large image
+    :param swizzle: pixel order in a tile, none, morton, switch
+    :return: flat pixel index in image (ntilerow*tilew width) for each pixel in tile data order
+    """
+
+    key = (tilew, tileh, tilebpp, swizzle)
+    cache = make_tile_map.cache
+    npixel = tilew * tileh
+    inner = cache.get(key)
+    if inner is None:
+        if swizzle == "none": inner = np.arange(npixel, dtype=np.int32)
+        else:
+            if swizzle == "morton": pattern = make_morton_pattern(tilew, tileh)
+            elif swizzle == "switch": pattern = make_switch_pattern(tilew, tileh, tilebpp)
+            else: raise ValueError(f"unknow swizzle {swizzle}")
+            inner = np.empty(npixel, dtype=np.int32)
+            inner[pattern.ravel()] = np.arange(npixel, dtype=np.int32) # data index -> y*tilew + x
+        if len(cache) >= 16: cache.pop(next(iter(cache)))
+        cache[key] = inner
+    inner = inner // tilew * (ntilerow * tilew) + inner % tilew # to image offset in tile
+    tiles = np.arange(start, start + ntiletotal, dtype=np.int64)
+    tiles = tiles // ntilerow * (tileh * ntilerow * tilew) + tiles % ntilerow * tilew
+    return (tiles[:, None] + inner[None, :]).ravel()
+make_tile_map.cache = dict()
+
 def make_linear_palette(bpp):
     n = 2**bpp
     tmp = np.linspace(0, 0xff, n, dtype=np.uint8).transpose()
@@ -90,30 +155,135 @@ def find_palette(palette, pixel):
     """
     
     idx, dmin = uint8(0),  0x7FFFFFFF
-    tmp = np.zeros_like(pixel, dtype=np.int32)
     for i in range(palette.shape[0]):
         d = 0
-        for j in range(tmp.shape[0]): 
-            t = pixel[j] - palette[i][j]
+        for j in range(pixel.shape[0]): 
+            t = int32(pixel[j]) - int32(palette[i][j]) # not wrap in uint8
             d += np.abs(t) # numba not support np.dot on int
             if d > dmin: break
         if d==0: return i
         if d < dmin: idx, dmin = i, d
     return idx
 
-@njit([(uint8[:, :, :])(readonly(uint8, 3),readonly(uint8, 2))], parallel=True)
-def encode_alpha_palette(img: np.ndarray, palette: np.ndarray) -> np.ndarray:
+lut_t = numba.types.UniTuple(int32[:], 4) # hash keys, hash indexs, cell starts, cell items
+
+@njit([int32(readonly(uint8, 1))], cache=True)
+def _pack_pixel(pixel):
+    return int32(pixel[0] | (pixel[1] << 8) | (pixel[2] << 16) | (np.int64(pixel[3]) << 24))
+
+@njit([int32(int32, int32)], cache=True)
+def _hash_pixel(key, hsize):
+    return int32(((np.int64(key) & 0xffffffff) * 0x9E3779B1 >> 16) & (hsize - 1))
+
+@njit([numba.types.UniTuple(int32, 2)(readonly(uint8, 1), int32, int32)], cache=True)
+def _cell_distance(color, cell, bits):
     """
-    encode rgba to index with alpha channel
+    :return: min, max l1 distance from color to the cell
+    """
+
+    dmin, dmax = 0, 0
+    mask, shift = (1 << bits) - 1, 8 - bits
+    for j in range(4):
+        lo = ((cell >> (j*bits)) & mask) << shift
+        hi = lo + (1 << shift) - 1
+        t = int32(color[j])
+        if t < lo: dmin += lo - t
+        elif t > hi: dmin += t - hi
+        dmax += max(t - lo, hi - t)
+    return dmin, dmax
+
+@njit([lut_t(readonly(uint8, 2), int32)], parallel=True, cache=True)
+def make_palette_lut(palette, bits=3):
+    """
+    make the acceleration structure of palette for find_palette_lut,
+        exact rgba -> index hash, and the cells quantized by bits in each channel,
+        each cell with the candidates (in index order) which can be the nearest
+    :return: hash keys, hash indexs (-1 for empty), cell starts, cell items
+    """
+
+    if palette.shape[1] != 4: raise ValueError("palette should be rgba")
+    n = palette.shape[0]
+    hsize = 1
+    while hsize < 2*n: hsize <<= 1
+    hkeys = np.zeros(hsize, dtype=np.int32)
+    hidxs = -np.ones(hsize, dtype=np.int32)
+    for i in range(n):
+        key = _pack_pixel(palette[i])
+        j = _hash_pixel(key, hsize)
+        while hidxs[j] >= 0 and hkeys[j] != key: j = (j + 1) & (hsize - 1)
+        if hidxs[j] < 0: hkeys[j], hidxs[j] = key, i # the first one for same color
+
+    ncell = 1 << (4*bits)
+    bounds = np.zeros(ncell, dtype=np.int32) # the nearest one is within min of max distance
+    counts = np.zeros(ncell + 1, dtype=np.int32)
+    for cell in prange(ncell):
+        bound = 0x7FFFFFFF
+        for i in range(n): bound = min(bound, _cell_distance(palette[i], cell, bits)[1])
+        for i in range(n): counts[cell + 1] += _cell_distance(palette[i], cell, bits)[0] <= bound
+        bounds[cell] = bound
+    starts = np.cumsum(counts).astype(np.int32)
+    items = np.zeros(starts[-1], dtype=np.int32)
+    for cell in prange(ncell):
+        k = starts[cell]
+        for i in range(n):
+            if _cell_distance(palette[i], cell, bits)[0] <= bounds[cell]:
+                items[k] = i
+                k += 1
+    return hkeys, hidxs, starts, items
+
+@njit([int32(readonly(uint8, 2), lut_t, readonly(uint8, 1))], cache=True)
+def find_palette_lut(palette, lut, pixel):
+    """
+    find the most close palette index of pixel by lut, the same result as find_palette
+    :param lut: from make_palette_lut, bits=0 for hash then all (small palette)
+    :return: index in palette
+    """
+
+    hkeys, hidxs, starts, items = lut
+    key = _pack_pixel(pixel)
+    hsize = hkeys.shape[0]
+    j = _hash_pixel(key, hsize)
+    while hidxs[j] >= 0:
+        if hkeys[j] == key: return hidxs[j]
+        j = (j + 1) & (hsize - 1)
+
+    bits = 0
+    while (1 << (4*bits)) < starts.shape[0] - 1: bits += 1
+    cell = 0
+    for c in range(4): cell |= (int32(pixel[c]) >> (8 - bits)) << (c*bits)
+    idx, dmin = 0, 0x7FFFFFFF
+    for k in range(starts[cell], starts[cell + 1]):
+        i = items[k]
+        d = 0
+        for c in range(4):
+            d += abs(int32(pixel[c]) - int32(palette[i, c]))
+            if d > dmin: break
+        if d < dmin: idx, dmin = i, d
+    return idx
+
+@njit([(uint8[:, :, :])(readonly(uint8, 3), readonly(uint8, 2), lut_t)], parallel=True, cache=True)
+def encode_alpha_palette_lut(img: np.ndarray, palette: np.ndarray, lut) -> np.ndarray:
+    """
+    encode rgba to index with alpha channel by the lut made once for palette
     (h, w, 4) -> (h, w, 4)
     """
 
     img2 = np.zeros_like(img, dtype=img.dtype)
     for y in prange(img.shape[0]):
         for x in prange(img.shape[1]):
-            img2[y][x][3] = find_palette(palette, img[y][x])
+            img2[y][x][3] = find_palette_lut(palette, lut, img[y][x])
     return img2
 
+@njit([(uint8[:, :, :])(readonly(uint8, 3),readonly(uint8, 2))], cache=True)
+def encode_alpha_palette(img: np.ndarray, palette: np.ndarray) -> np.ndarray:
+    """
+    encode rgba to index with alpha channel
+    (h, w, 4) -> (h, w, 4)
+    """
+
+    lut = make_palette_lut(palette, 3 if palette.shape[0] > 16 else 0)
+    return encode_alpha_palette_lut(img, palette, lut)
+
 def decode_alpha_palette(img: np.ndarray, palette: np.ndarray) -> np.ndarray:
     """
     decode index with alpha channel to rbga
@@ -122,17 +292,145 @@ def decode_alpha_palette(img: np.ndarray, palette: np.ndarray) -> np.ndarray:
 
     return palette[img[:, :, 3]]
 
-def quantize_palette(img: np.ndarray, bpp) -> np.ndarray:
+@njit([void(readonly(float32, 2), readonly(float32, 2), int32[:])], parallel=True, cache=True)
+def _nearest_center(points, centers, labels):
+    for i in prange(points.shape[0]):
+        idx, dmin = 0, float32(np.inf)
+        for j in range(centers.shape[0]):
+            d = float32(0)
+            for k in range(points.shape[1]):
+                t = points[i, k] - centers[j, k]
+                d += t * t
+                if d >= dmin: break
+            if d < dmin: idx, dmin = j, d
+        labels[i] = idx
+
+def _unique_colors(pixels: np.ndarray):
+    """
+    :return: colors (m, c), counts (m, )
+    """
+
+    shifts = np.arange(pixels.shape[1], dtype=np.uint32) * 8
+    keys = np.bitwise_or.reduce(pixels.astype(np.uint32) << shifts, axis=1)
+    keys, counts = np.unique(keys, return_counts=True)
+    colors = ((keys[:, None] >> shifts) & 0xff).astype(np.uint8)
+    return colors, counts
+
+def _median_cut(colors: np.ndarray, counts: np.ndarray, n) -> np.ndarray:
     """
-    make palette from img
+    split the box with max weighted range at weighted median
+    :return: centers (n, c) float32
     """
-    from sklearn.cluster import KMeans
+
+    def make_box(box):
+        span = colors[box].max(axis=0).astype(np.int32) - colors[box].min(axis=0)
+        score = span.max() * counts[box].sum() if len(box) > 1 else -1
+        return box, int(np.argmax(span)), score
+
+    boxes = [make_box(np.arange(colors.shape[0]))]
+    while len(boxes) < n:
+        i = max(range(len(boxes)), key=lambda i: boxes[i][2])
+        if boxes[i][2] <= 0: break
+        box, axis, _ = boxes.pop(i)
+        box = box[np.argsort(colors[box, axis], kind="stable")]
+        acc = np.cumsum(counts[box])
+        mid = min(max(int(np.searchsorted(acc, acc[-1] / 2)), 1), len(box) - 1)
+        boxes += [make_box(box[:mid]), make_box(box[mid:])]
+    centers = np.zeros((n, colors.shape[1]), dtype=np.float32)
+    for i, (box, _, _) in enumerate(boxes):
+        centers[i] = np.average(colors[box], axis=0, weights=counts[box])
+    return centers
+
+def quantize_palette(img: np.ndarray, bpp, method="mediancut", 
+        nsample=0x10000, niter=16, timeout=0.0, tol=0.5, seed=0) -> np.ndarray:
+    """
+    make palette from img, 
+        if colors not more than palette, return the colors (filled by 0)
+    :param method: mediancut (refined by lloyd on color histogram), kmeans (by sklearn)
+    :param nsample: the max count of sampled pixels if too many colors
+    :param niter: the max lloyd iterations, 0 for median cut only
+    :param timeout: the max seconds for lloyd iterations, 0 for no limit
+    :param tol: stop when the max center moving less than tol
+    :return: palette (n, c) sorted by the sum of channels
+    """
+
     n = 2**bpp
-    k = KMeans(n_clusters=n, n_init=10)
-    k.fit(img.reshape([img.shape[0]*img.shape[1], img.shape[2]]))
-    c = k.cluster_centers_.astype(np.uint8)
-    palette = c[np.argsort(np.sum(c, axis=1))]
-    return palette
+    pixels = img.reshape([img.shape[0]*img.shape[1], img.shape[2]])
+    if method == "kmeans":
+        from sklearn.cluster import KMeans
+        k = KMeans(n_clusters=n, n_init=10)
+        k.fit(pixels)
+        c = k.cluster_centers_.astype(np.uint8)
+        return c[np.argsort(np.sum(c, axis=1))]
+    elif method != "mediancut": raise ValueError(f"unknown method {method}")
+
+    colors, counts = _unique_colors(pixels)
+    if colors.shape[0] <= n:
+        c = np.zeros((n, colors.shape[1]), dtype=np.uint8)
+        c[:colors.shape[0]] = colors
+        return c[np.argsort(np.sum(c, axis=1), kind="stable")]
+    if colors.shape[0] > nsample:
+        rng = np.random.default_rng(seed)
+        colors, counts = _unique_colors(pixels[rng.integers(0, pixels.shape[0], nsample)])
+    
+    centers = _median_cut(colors, counts, n)
+    points = colors.astype(np.float32)
+    labels = np.zeros(points.shape[0], dtype=np.int32)
+    start = time.perf_counter()
+    for i in range(niter):
+        _nearest_center(points, centers, labels)
+        weights = np.bincount(labels, weights=counts, minlength=n)
+        used = weights > 0 # keep empty centers
+        centers2 = centers.copy()
+        for j in range(points.shape[1]):
+            sums = np.bincount(labels, weights=counts*points[:, j], minlength=n)
+            centers2[used, j] = sums[used] / weights[used]
+        moved = np.abs(centers2 - centers).max()
+        centers = centers2
+        logging.debug(f"lloyd {i+1}/{niter} [moved={moved:.3f}]")
+        if moved < tol: break
+        if timeout > 0 and time.perf_counter() - start > timeout: break
+    c = np.clip(np.round(centers), 0, 0xff).astype(np.uint8)
+    return c[np.argsort(np.sum(c, axis=1), kind="stable")]
+
+@njit([void(numba.types.Array(uint8, 2, "A", True), int32, boolean, numba.types.Array(uint8, 2, "A"))], 
+        parallel=True, cache=True)
+def unpack_bits(data, bpp, msb, values):
+    """
+    unpack 1, 2, 4 bpp pixels in each row (such as tile) of data
+    :param data: (n, nbyte) packed bytes
+    :param msb: the first pixel in high bits of byte, else in low bits
+    :param values: (n, npixel) output pixel values
+    """
+
+    per, mask = 8 // bpp, (1 << bpp) - 1
+    for i in prange(values.shape[0]):
+        for j in range(values.shape[1]):
+            k = j % per
+            shift = (per - 1 - k) * bpp if msb else k * bpp
+            values[i, j] = (data[i, j // per] >> shift) & mask
+
+@njit([void(numba.types.Array(uint8, 2, "A", True), int32, boolean, numba.types.Array(uint8, 2, "A"))], 
+        parallel=True, cache=True)
+def pack_bits(values, bpp, msb, data):
+    """
+    pack 1, 2, 4 bpp pixels in each row (such as tile) to data, 
+        each byte is written once, so no racing in parallel
+    :param values: (n, npixel) pixel values
+    :param msb: the first pixel in high bits of byte, else in low bits
+    :param data: (n, nbyte) output packed bytes
+    """
+
+    per, mask = 8 // bpp, (1 << bpp) - 1
+    npixel = values.shape[1]
+    for i in prange(data.shape[0]):
+        for j in range(data.shape[1]):
+            v = 0
+            for k in range(per):
+                if j*per + k >= npixel: break
+                shift = (per - 1 - k) * bpp if msb else k * bpp
+                v |= (values[i, j*per + k] & mask) << shift
+            data[i, j] = v
 
 @njit([void(uint8[:], int32, int32, int32, readonly(uint8, 1))])
 def encode_pixel(data, bpp, offset, i, pixel):
@@ -178,64 +476,302 @@ def decode_pixel(data, bpp, offset, i, pixel):
         n = 4 if bpp > 24 else 3
         pixel[:n] = data[bytecur: bytecur+n]
 
-@njit([(void)(uint8[:], int32, int32, int32, int32, 
-        readonly(uint8, 2), readonly(uint8, 3))], parallel=True)
+def _merge_channels(r, g, b, a) -> np.ndarray:
+    res = None
+    for i, t in enumerate([r, g, b, a]):
+        if t is None: continue
+        t = t.astype(np.uint32) << (8*i) if np.little_endian else t.astype(np.uint32) << (24 - 8*i)
+        res = t if res is None else (res | t)
+    return res
+
+def decode_tiles_map(tiledata: np.ndarray, tileinfo: tile_t, tilemap: np.ndarray,
+        img: np.ndarray, palette: np.ndarray=None, bitorder="lsb"):
+    """
+    multi tiles -> img by scatter with tilemap,
+        the pixels are unpacked in the whole buffer
+    :param bitorder: lsb or msb, the first pixel in low or high bits for <8bpp
+    """
+
+    n, npixel = len(tilemap) // (tileinfo.w * tileinfo.h), tileinfo.w * tileinfo.h
+    bpp, nbyte = tileinfo.bpp, (npixel * tileinfo.bpp + 7) // 8
+    data = tiledata[:n*tileinfo.size].reshape(n, tileinfo.size)[:, :nbyte]
+    flat = img.view(np.uint32).reshape(-1) # rgba as uint32 to move pixels faster
+    if palette is not None and len(palette) > 1: 
+        palette = np.ascontiguousarray(palette, dtype=np.uint8).view(np.uint32).ravel()
+    else: palette = None
+    if bpp <= 8:
+        d = np.empty((n, npixel), dtype=np.uint8)
+        unpack_bits(data, bpp, bitorder == "msb", d)
+        d = d.ravel()
+        if palette is not None: flat[tilemap] = palette[d]
+        else: flat[tilemap] = _merge_channels(None, None, None, d)
+    elif bpp == 16:
+        d = data.reshape(-1, 2)
+        if palette is not None: flat[tilemap] = palette[(d[:, 1].astype(np.int32) << 8) + d[:, 0]]
+        else: flat[tilemap] = _merge_channels(None, None, d[:, 0], d[:, 1])
+    else:
+        d = data.reshape(-1, 4 if bpp > 24 else 3)
+        flat[tilemap] = _merge_channels(*[d[:, i] for i in range(d.shape[1])])
+
+def _make_tiles_lut(palette: np.ndarray):
+    """
+    make the palette lut once for encode_tiles_map by chunks, None if not palette
+    """
+
+    if palette is None or len(palette) <= 1: return None
+    return make_palette_lut(palette, 3 if len(palette) > 16 else 0)
+
+def encode_tiles_map(img: np.ndarray, tileinfo: tile_t, tilemap: np.ndarray,
+        palette: np.ndarray=None, bitorder="lsb", lut=None) -> np.ndarray:
+    """
+    img -> multi tiles by gather with tilemap,
+        the pixels are packed in the whole buffer
+    :param bitorder: lsb or msb, the first pixel in low or high bits for <8bpp
+    :param lut: palette lut from _make_tiles_lut, made in each call if None
+    """
+
+    n, npixel = len(tilemap) // (tileinfo.w * tileinfo.h), tileinfo.w * tileinfo.h
+    bpp, nbyte = tileinfo.bpp, (npixel * tileinfo.bpp + 7) // 8
+    pixels = np.ascontiguousarray(img).view(np.uint32).reshape(-1)[tilemap].view(np.uint8).reshape(-1, 4)
+    if palette is not None and len(palette) > 1:
+        if lut is None: lut = _make_tiles_lut(palette)
+        d = encode_alpha_palette_lut(pixels.reshape(-1, 1, 4), palette, lut)[:, 0, 3]
+        pixels = np.zeros_like(pixels)
+        if bpp <= 8: pixels[:, 3] = d
+        else: pixels[:, 2] = d # uint8 index
+    tiledata = np.zeros((n, tileinfo.size), dtype=np.uint8)
+    if bpp <= 8: pack_bits(pixels[:, 3].reshape(n, npixel), bpp, bitorder == "msb", tiledata[:, :nbyte])
+    elif bpp == 16: tiledata[:, :nbyte] = pixels[:, 2:].reshape(n, nbyte)
+    else: tiledata[:, :nbyte] = pixels[:, :(4 if bpp > 24 else 3)].reshape(n, nbyte)
+    return tiledata.ravel()
+
 def encode_tiles(tiledata, tilesize, tilew, tileh, tilebpp, palette, img):
     """
-    multi tiles -> implement
+    multi tiles -> implement, wrapper of encode_tiles_map
     """
-    
-    h, w, c = img.shape[0], img.shape[1], img.shape[2]
-    n = tiledata.shape[0]//tilesize
-    for tileidx in prange(n):
-        for tiley in range(tileh):
-            for tilex in range(tilew): # to avoid raceing in encode <8bpp
-                stride_tile = w // tilew                  
-                x = (tileidx % stride_tile) * tilew + tilex
-                y = (tileidx // stride_tile) * tileh + tiley
-                addr = tileidx * tilesize
-                pixeli =  tiley * tilew + tilex
-                if palette.shape[0] > 1:
-                    pixel = np.zeros(4, dtype=np.uint8)
-                    d = find_palette(palette, img[y][x])
-                    if tilebpp<=8: pixel[3] = d
-                    elif tilebpp==16: pixel[2], pixel[3] = d&0xff, d>>8
-                else: pixel = img[y][x]
-                encode_pixel(tiledata, tilebpp, addr, pixeli, pixel)
-    
-@njit([(void)(readonly(uint8, 1), int32, int32, int32, int32, 
-        readonly(uint8, 2), uint8[:, :, :])], parallel=True)
+
+    tileinfo = tile_t(tilew, tileh, tilebpp, tilesize)
+    n, ntilerow = tiledata.shape[0] // tilesize, img.shape[1] // tilew
+    tilemap = make_tile_map(tilew, tileh, tilebpp, n, ntilerow)
+    img = np.ascontiguousarray(img[:math.ceil(n / ntilerow) * tileh, :ntilerow * tilew])
+    img = _pad_tile_rows(img, math.ceil(n / ntilerow) * tileh)
+    tiledata[:n * tilesize] = encode_tiles_map(img, tileinfo, tilemap, palette)
+
 def decode_tiles(tiledata, tilesize, tilew, tileh, tilebpp, palette, img):
     """
-    img -> multi tiles implement
+    img -> multi tiles implement, wrapper of decode_tiles_map
+    """
+
+    tileinfo = tile_t(tilew, tileh, tilebpp, tilesize)
+    n, ntilerow = tiledata.shape[0] // tilesize, img.shape[1] // tilew
+    tilemap = make_tile_map(tilew, tileh, tilebpp, n, ntilerow)
+    img2 = np.zeros((math.ceil(n / ntilerow) * tileh, ntilerow * tilew, 4), dtype=np.uint8)
+    decode_tiles_map(tiledata, tileinfo, tilemap, img2, palette)
+    h = min(img.shape[0], img2.shape[0])
+    img[:h, :img2.shape[1]] = img2[:h]
+
+# streaming png by rows, to keep the memory in a strip
+@njit([void(readonly(uint8, 2), readonly(uint8, 1), int32, uint8[:, :])], cache=True)
+def _unfilter_rows(raw, prev, bpp, out):
+    """
+    :param raw: (n, 1 + stride) rows with filter type
+    :param prev: (stride, ) the last row before raw
+    :param bpp: bytes per pixel (at least 1) for filter
+    """
+
+    for y in range(raw.shape[0]):
+        f = raw[y, 0]
+        up = out[y - 1] if y > 0 else prev
+        for x in range(out.shape[1]):
+            a = int32(out[y, x - bpp]) if x >= bpp else 0
+            b = int32(up[x])
+            c = int32(up[x - bpp]) if x >= bpp else 0
+            if f == 1: d = a
+            elif f == 2: d = b
+            elif f == 3: d = (a + b) >> 1
+            elif f == 4: # paeth
+                p = a + b - c
+                pa, pb, pc = abs(p - a), abs(p - b), abs(p - c)
+                d = a if pa <= pb and pa <= pc else (b if pb <= pc else c)
+            else: d = 0
+            out[y, x] = (int32(raw[y, x + 1]) + d) & 0xff
+
+class pngwriter_t:
+    """
+    write rgba png row by row, used as `with pngwriter_t(outpath, w, h) as writer: ...`
+    """
+
+    def __init__(self, outobj: Union[str, BytesIO], w, h, level=6):
+        self.w, self.h, self.y = w, h, 0
+        self.ctx = writestream(outobj)
+        self.fp = self.ctx.__enter__()
+        self.compressor = zlib.compressobj(level)
+        self.fp.write(b"\x89PNG\r\n\x1a\n")
+        self.write_chunk(b"IHDR", struct.pack(">2I5B", w, h, 8, 6, 0, 0, 0))
+
+    def write_chunk(self, name: bytes, data: bytes):
+        self.fp.write(struct.pack(">I", len(data)) + name)
+        self.fp.write(data)
+        self.fp.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(name))))
+
+    def write(self, rows: np.ndarray):
+        """
+        :param rows: (n, w, 4) rgba rows, the rows out of image are ignored
+        """
+
+        rows = rows[:self.h - self.y]
+        raw = np.zeros((rows.shape[0], 1 + self.w*4), dtype=np.uint8) # filter none
+        raw[:, 1:] = rows[:, :self.w].reshape(rows.shape[0], -1)
+        data = self.compressor.compress(raw.tobytes())
+        if data: self.write_chunk(b"IDAT", data)
+        self.y += rows.shape[0]
+
+    def close(self, *exc):
+        """
+        finish the png, or discard it (temp file removed, old file kept) with exc from __exit__
+        """
+
+        if self.fp is None: return
+        if exc and exc[0] is not None:
+            self.fp, ctx = None, self.ctx
+            ctx.__exit__(*exc)
+            return
+        if self.y < self.h: # fill the rest rows
+            self.write(np.zeros((self.h - self.y, self.w, 4), dtype=np.uint8))
+        self.write_chunk(b"IDAT", self.compressor.flush())
+        self.write_chunk(b"IEND", b"")
+        self.fp, self.ctx = None, self.ctx.__exit__(None, None, None)
+
+    def __enter__(self) -> "pngwriter_t":
+        return self
+
+    def __exit__(self, *exc):
+        self.close(*exc)
+
+class pngreader_t:
+    """
+    read non-interlaced png row by row as rgba, used as `with pngreader_t(inpath) as reader: ...`
     """
+
+    CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4} # by color type
+
+    def __init__(self, inobj: Union[str, BytesIO]):
+        self.ctx = readstream(inobj)
+        self.fp = self.ctx.__enter__()
+        if self.fp.read(8) != b"\x89PNG\r\n\x1a\n": 
+            self.close()
+            raise ValueError(f"not png [inobj={inobj}]")
+        self.lut, self.trns, self.data = None, None, None
+        while self.data is None:
+            name, data = self.read_chunk()
+            if name == b"IHDR":
+                self.w, self.h, self.depth, self.colortype, _, _, interlace = struct.unpack(">2I5B", data)
+            elif name == b"PLTE": 
+                self.lut = np.zeros((256, 4), dtype=np.uint8)
+                self.lut[:, 3] = 0xff
+                self.lut[:len(data)//3, :3] = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+            elif name == b"tRNS": self.trns = data
+            elif name == b"IDAT": self.data = data
+            elif name == b"IEND" or name is None: self.data = b""
+        if interlace or self.colortype not in self.CHANNELS:
+            self.close()
+            raise ValueError(f"not support png [colortype={self.colortype} interlace={interlace}]")
+        if self.lut is not None and self.trns is not None: 
+            self.lut[:len(self.trns), 3] = np.frombuffer(self.trns, dtype=np.uint8)
+        c = self.CHANNELS[self.colortype]
+        self.stride = (self.w * c * self.depth + 7) // 8
+        self.bpp = max(c * self.depth // 8, 1)
+        self.prev = np.zeros(self.stride, dtype=np.uint8)
+        self.decompressor = zlib.decompressobj()
+        self.buf, self.y = bytearray(), 0
+
+    def read_chunk(self):
+        head = self.fp.read(8)
+        if len(head) < 8: return None, b""
+        size, name = struct.unpack(">I4s", head)
+        data = self.fp.read(size)
+        self.fp.read(4) # crc
+        return name, data
+
+    def read(self, n) -> np.ndarray:
+        """
+        :return: (n, w, 4) rgba rows, less at the end of image
+        """
+
+        n = min(n, self.h - self.y)
+        need = n * (self.stride + 1)
+        while len(self.buf) < need and self.data is not None: # only decompress the rows needed
+            self.buf += self.decompressor.decompress(self.data, need - len(self.buf))
+            self.data = self.decompressor.unconsumed_tail
+            if self.data: continue
+            name, data = self.read_chunk()
+            while name not in {b"IDAT", b"IEND", None}: name, data = self.read_chunk()
+            self.data = data if name == b"IDAT" else None
+            if self.data is None: self.buf += self.decompressor.flush()
+        if len(self.buf) < need: raise ValueError(f"png data truncated [y={self.y} n={n}]")
+        raw = np.frombuffer(bytes(self.buf[:need]), dtype=np.uint8).reshape(n, self.stride + 1)
+        del self.buf[:need]
+        out = np.zeros((n, self.stride), dtype=np.uint8)
+        if n > 0: 
+            _unfilter_rows(raw, self.prev, self.bpp, out)
+            self.prev = out[-1].copy()
+        self.y += n
+        return self.to_rgba(out)
+
+    def to_rgba(self, out: np.ndarray) -> np.ndarray:
+        n, c, depth = out.shape[0], self.CHANNELS[self.colortype], self.depth
+        if depth < 8:
+            d = np.zeros((n, self.stride * 8 // depth), dtype=np.uint8)
+            unpack_bits(out, depth, True, d)
+            d = d[:, :self.w, None]
+            if self.colortype == 0: d = (d.astype(np.int32) * 0xff // ((1 << depth) - 1)).astype(np.uint8)
+        elif depth == 16: d = out.reshape(n, self.w, c, 2)[..., 0] # high byte
+        else: d = out.reshape(n, self.w, c)
         
-    h, w, c = img.shape[0], img.shape[1], img.shape[2]
-    n = tiledata.shape[0]//tilesize
-    for tileidx in prange(n):
-        for tiley in prange(tileh):
-            for tilex in prange(tilew):
-                stride_tile = w // tilew                  
-                x = (tileidx % stride_tile) * tilew + tilex
-                y = (tileidx // stride_tile) * tileh + tiley
-                addr = tileidx * tilesize
-                pixeli =  tiley * tilew + tilex
-                pixel = img[y][x]
-                decode_pixel(tiledata, tilebpp, addr, pixeli, pixel)
-                if palette.shape[0] > 1: 
-                    d = pixel[3]
-                    if tilebpp==16: d = (d<<8) + pixel[2]
-                    pixel[:] = palette[d]
+        if self.colortype == 3: return self.lut[d[..., 0]]
+        img = np.zeros((n, self.w, 4), dtype=np.uint8)
+        img[..., 3] = 0xff
+        if c <= 2: img[..., :3] = d[..., :1]
+        else: img[..., :3] = d[..., :3]
+        if c in {2, 4}: img[..., 3] = d[..., -1]
+        elif self.trns is not None: # the transparent color
+            key = np.frombuffer(self.trns, dtype=">u2")[:c]
+            if depth == 16: key = key >> 8
+            elif depth < 8: key = key * 0xff // ((1 << depth) - 1)
+            img[np.all(d == key.astype(np.uint8), axis=-1), 3] = 0
+        return img
+
+    def close(self):
+        if self.fp is None: return
+        self.fp, self.ctx = None, self.ctx.__exit__(None, None, None)
+
+    def __enter__(self) -> "pngreader_t":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
 
 #  wrappers for image convert
+def _pad_tile_rows(img: np.ndarray, h: int) -> np.ndarray:
+    """
+    zero pad the image to h rows, as n counts the partial tile row at bottom
+    """
+
+    if img.shape[0] >= h: return img
+    img2 = np.zeros((h, *img.shape[1:]), dtype=img.dtype)
+    img2[:img.shape[0]] = img
+    return img2
+
 @filter_loadimages((0, "RGBA"))
 def encode_tile_image(imgobj: Union[str, np.ndarray], tileinfo: tile_t, outpath=None, *, 
-        palette: np.ndarray=None, ntiletotal=0) -> np.ndarray:
+        palette: np.ndarray=None, ntiletotal=0, swizzle="none", bitorder="lsb") -> np.ndarray:
     """
     encode tile image wrapper
     :param tile: (w, h, bpp, size)
     :param palette: ndarray (n,4)
     :param ntiletotal: the count of whole tiles
+    :param swizzle: pixel order in a tile, none, morton, switch
+    :param bitorder: lsb or msb, the first pixel in low or high bits for <8bpp
     :return: img in rbga format
     """
 
@@ -245,25 +781,34 @@ def encode_tile_image(imgobj: Union[str, np.ndarray], tileinfo: tile_t, outpath=
     valid_tile(tileinfo, img.shape)
     n =  imgw // tileinfo.w * imgh // tileinfo.h
     if ntiletotal> 0: n = min(n, ntiletotal)
-    if palette is None: palette = np.zeros((1, 4), dtype=np.uint8)
-    tiledata = np.zeros(n*tileinfo.size, dtype=np.uint8)
+    ntilerow = imgw // tileinfo.w
     
-    # init image and decode
+    # init image and encode by chunks to bound the map
     logging.info(f"image {img.shape} -> {n} {repr(tileinfo)}")
-    encode_tiles(tiledata, tileinfo.size, tileinfo.w, tileinfo.h, tileinfo.bpp, palette, img)
+    img = np.ascontiguousarray(img[:math.ceil(n / ntilerow) * tileinfo.h, :ntilerow * tileinfo.w])
+    img = _pad_tile_rows(img, math.ceil(n / ntilerow) * tileinfo.h)
+    tiledata = np.zeros(n * tileinfo.size, dtype=np.uint8)
+    ntile, lut = max(0x100000 // (tileinfo.w * tileinfo.h), 1), _make_tiles_lut(palette)
+    for start in range(0, n, ntile):
+        m = min(ntile, n - start)
+        tilemap = make_tile_map(tileinfo.w, tileinfo.h, tileinfo.bpp, m, ntilerow, swizzle, start)
+        tiledata[start*tileinfo.size: (start + m)*tileinfo.size] = \
+            encode_tiles_map(img, tileinfo, tilemap, palette, bitorder, lut)
     if outpath: writebytes(outpath, tiledata.tobytes())
 
     return tiledata
 
-@filter_loadfiles(0)
+@filter_loadfiles((0, "mmap"))
 def decode_tile_image(binobj: Union[str, bytes, np.ndarray], tileinfo: tile_t, outpath=None, *, 
-        palette: np.ndarray=None, ntiletotal=0, ntilerow=64) -> np.ndarray:
+        palette: np.ndarray=None, ntiletotal=0, ntilerow=64, swizzle="none", bitorder="lsb") -> np.ndarray:
     """
     decode tile image wrapper
     :param tile: (w, h, bpp, size)
     :param palette: ndarray (n,4)
     :param ntiletotal: the count of whole tiles
     :param ntilerow: the count of tiles in a row
+    :param swizzle: pixel order in a tile, none, morton, switch
+    :param bitorder: lsb or msb, the first pixel in low or high bits for <8bpp
     :return: img in rbga format
     """
 
@@ -271,7 +816,6 @@ def decode_tile_image(binobj: Union[str, bytes, np.ndarray], tileinfo: tile_t, o
     valid_tile(tileinfo)
     n = len(binobj) // tileinfo.size
     if ntiletotal> 0: n = min(n, ntiletotal)
-    if palette is None: palette = np.zeros((1, 4), dtype=np.uint8)
     if type(binobj) == np.ndarray: tiledata = binobj[:n*tileinfo.size]
     else: tiledata = np.frombuffer(binobj, dtype=np.uint8, count=n*tileinfo.size)
     
@@ -279,11 +823,75 @@ def decode_tile_image(binobj: Union[str, bytes, np.ndarray], tileinfo: tile_t, o
     imgw, imgh = tileinfo.w * ntilerow, tileinfo.h * math.ceil(n/ntilerow)
     img = np.zeros([imgh, imgw, 4], dtype='uint8')
     logging.info(f"{n} {repr(tileinfo)} -> image {img.shape}")
-    decode_tiles(tiledata, tileinfo.size, tileinfo.w, tileinfo.h, tileinfo.bpp, palette, img)
+    ntile = max(0x100000 // (tileinfo.w * tileinfo.h), 1) # chunks to bound the map
+    for start in range(0, n, ntile):
+        m = min(ntile, n - start)
+        tilemap = make_tile_map(tileinfo.w, tileinfo.h, tileinfo.bpp, m, ntilerow, swizzle, start)
+        data = tiledata[start*tileinfo.size: (start + m)*tileinfo.size]
+        decode_tiles_map(data, tileinfo, tilemap, img, palette, bitorder)
     if outpath: writeimage(outpath, img, "RGBA", "png")
 
     return img
 
+@filter_loadfiles((0, "mmap"))
+def decode_tile_stream(binobj: Union[str, bytes, np.ndarray], tileinfo: tile_t, outpath, *, 
+        palette: np.ndarray=None, ntiletotal=0, ntilerow=64, swizzle="none", bitorder="lsb", nstrip=16):
+    """
+    decode tile image to png by strips, the memory is bounded by a strip
+    :param nstrip: the count of tile rows in a strip
+    :return: image shape
+    """
+
+    # init tile
+    valid_tile(tileinfo)
+    n = len(binobj) // tileinfo.size
+    if ntiletotal> 0: n = min(n, ntiletotal)
+    if type(binobj) == np.ndarray: tiledata = binobj[:n*tileinfo.size]
+    else: tiledata = np.frombuffer(binobj, dtype=np.uint8, count=n*tileinfo.size)
+
+    # decode and write each strip
+    imgw, imgh = tileinfo.w * ntilerow, tileinfo.h * math.ceil(n/ntilerow)
+    logging.info(f"{n} {repr(tileinfo)} -> image {(imgh, imgw, 4)} [nstrip={nstrip}]")
+    ntile = max(nstrip, 1) * ntilerow
+    with pngwriter_t(outpath, imgw, imgh) as writer:
+        for start in range(0, n, ntile):
+            m = min(ntile, n - start)
+            img = np.zeros([tileinfo.h * math.ceil(m/ntilerow), imgw, 4], dtype='uint8')
+            tilemap = make_tile_map(tileinfo.w, tileinfo.h, tileinfo.bpp, m, ntilerow, swizzle)
+            data = tiledata[start*tileinfo.size: (start + m)*tileinfo.size]
+            decode_tiles_map(data, tileinfo, tilemap, img, palette, bitorder)
+            writer.write(img)
+
+    return (imgh, imgw, 4)
+
+def encode_tile_stream(inobj: Union[str, BytesIO], tileinfo: tile_t, outpath, *, 
+        palette: np.ndarray=None, ntiletotal=0, swizzle="none", bitorder="lsb", nstrip=16):
+    """
+    encode png to tile image by strips, the memory is bounded by a strip
+    :param nstrip: the count of tile rows in a strip
+    :return: size of tile data
+    """
+
+    with pngreader_t(inobj) as reader, writestream(outpath) as fp:
+        # init tile
+        imgw, imgh = reader.w, reader.h
+        valid_tile(tileinfo, (imgh, imgw, 4))
+        n =  imgw // tileinfo.w * imgh // tileinfo.h
+        if ntiletotal> 0: n = min(n, ntiletotal)
+        ntilerow = imgw // tileinfo.w
+
+        # read and encode each strip
+        logging.info(f"image {(imgh, imgw, 4)} -> {n} {repr(tileinfo)} [nstrip={nstrip}]")
+        ntile, size, lut = max(nstrip, 1) * ntilerow, 0, _make_tiles_lut(palette)
+        for start in range(0, n, ntile):
+            m = min(ntile, n - start)
+            img = reader.read(tileinfo.h * math.ceil(m/ntilerow))[:, :ntilerow * tileinfo.w]
+            img = _pad_tile_rows(img, tileinfo.h * math.ceil(m/ntilerow))
+            tilemap = make_tile_map(tileinfo.w, tileinfo.h, tileinfo.bpp, m, ntilerow, swizzle)
+            size += fp.write(encode_tiles_map(img, tileinfo, tilemap, palette, bitorder, lut).tobytes())
+
+    return size
+
 def cli(cmdstr=None):
     def filter_paths(args):
         if args.batch:
@@ -305,9 +913,14 @@ def cli(cmdstr=None):
         tileinfo, palette = filter_cfgs(args)
         for i, (inpath, outpath) in enumerate(zip(inpaths, outpaths)):
             if args.batch: logging.info(f"batch {i+1}/{n} [inpath={inpath} outpath={outpath}]")
-            if args.format == "tile":
-                decode_tile_image(inpath, tileinfo, outpath, 
-                    palette=palette, ntiletotal=args.ntiletotal, ntilerow=args.ntilerow)
+            if args.format == "tile" and args.nstrip > 0:
+                decode_tile_stream(inpath, tileinfo, outpath, palette=palette, 
+                    ntiletotal=args.ntiletotal, ntilerow=args.ntilerow, 
+                    swizzle=args.swizzle, bitorder=args.bitorder, nstrip=args.nstrip)
+            elif args.format == "tile":
+                decode_tile_image(inpath, tileinfo, outpath, palette=palette, 
+                    ntiletotal=args.ntiletotal, ntilerow=args.ntilerow, 
+                    swizzle=args.swizzle, bitorder=args.bitorder)
 
     def cmd_encode(args):
         logging.debug(repr(args))
@@ -315,9 +928,12 @@ def cli(cmdstr=None):
         tileinfo, palette = filter_cfgs(args)
         for i, (inpath, outpath) in enumerate(zip(inpaths, outpaths)):
             if args.batch: logging.info(f"batch {i+1}/{n} [inpath={inpath} outpath={outpath}]")
-            if args.format == "tile":
-                encode_tile_image(inpath, tileinfo, outpath, 
-                    palette=palette, ntiletotal=args.ntiletotal)
+            if args.format == "tile" and args.nstrip > 0:
+                encode_tile_stream(inpath, tileinfo, outpath, palette=palette, 
+                    ntiletotal=args.ntiletotal, swizzle=args.swizzle, bitorder=args.bitorder, nstrip=args.nstrip)
+            elif args.format == "tile":
+                encode_tile_image(inpath, tileinfo, outpath, palette=palette, 
+                    ntiletotal=args.ntiletotal, swizzle=args.swizzle, bitorder=args.bitorder)
 
     p = argparse.ArgumentParser(description=__description__)
     p2 = p.add_subparsers(title="operations")
@@ -335,6 +951,12 @@ def cli(cmdstr=None):
         t.add_argument("--tilebpp", type=int, default=0)
         t.add_argument("--tilesize", type=int , default=0)
         t.add_argument("--ntiletotal", type=int , default=0)
+        t.add_argument("--swizzle", default="none", choices=["none", "morton", "switch"], 
+            help="pixel order in a tile, switch for block linear (tile as the whole image)")
+        t.add_argument("--bitorder", default="lsb", choices=["lsb", "msb"], 
+            help="the first pixel in low or high bits of byte for <8bpp")
+        t.add_argument("--nstrip", type=int, default=0, 
+            help="stream png by strips of nstrip tile rows to bound memory, 0 for the whole image")
     p_encode.set_defaults(handler=cmd_encode)
     p_encode.add_argument("inpath")
     p_decode.set_defaults(handler=cmd_decode)
@@ -359,4 +981,10 @@ v0.2, add swizzle method
 v0.2.1, change cv2 to PIL.image
 v0.3, remake with libutil v0.6, accelerate by numba parallel
 v0.3.1, add batch mode to optimize performance
+v0.3.2, decode_tile_image by mmap buffer
+v0.3.3, add make_palette_lut and find_palette_lut for encoding palette, fix uint8 wrap in find_palette
+v0.3.4, encode and decode tiles by cached tile map with swizzle (morton, switch) and whole buffer bits
+v0.3.5, add pack_bits and unpack_bits kernels with bitorder (lsb, msb), encode_tiles and decode_tiles by tile map
+v0.3.6, quantize_palette by median cut and lloyd on color histogram, sklearn kmeans as option
+v0.3.7, add decode_tile_stream and encode_tile_stream by strips with pngwriter_t, pngreader_t
 """
\ No newline at end of file
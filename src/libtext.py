@@ -1,21 +1,36 @@
 # -*- coding: utf-8 -*-
-__version__  = "0.6.3"
+__version__  = "0.6.16"
 __description__ = f"""
 A binary text tool (remake) for text exporting, importing and checking
     v{__version__}, developed by devseed
 """
 
+import os
+import re
+import sys
+import time
 import binascii
 import logging
 import argparse
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from collections import OrderedDict
 from io import StringIO, BytesIO
+from contextlib import nullcontext
 from functools import lru_cache
 from typing import Callable, Tuple, Union, List, Dict
 
 try:
-    from libutil import writelines, writebytes, filter_loadfiles, ftext_t, tbl_t, jtable_t, msg_t, load_batch, save_ftext, load_ftext, load_tbl
+    from libutil import writelines, writebytes, writestream, samefile, filter_loadfiles, ftext_t, ftexttable_t, tbl_t, tblmap_t, jtable_t, shiftmap_t, zippool_t, msg_t, load_batch, save_ftext, load_ftext, load_tbl
 except ImportError:
-    exec("from libutil_v0_6 import writelines, writebytes, filter_loadfiles, ftext_t, tbl_t, jtable_t, msg_t, load_batch, save_ftext, load_ftext, load_tbl")
+    exec("from libutil_v0_6_9 import writelines, writebytes, writestream, samefile, filter_loadfiles, ftext_t, ftexttable_t, tbl_t, tblmap_t, jtable_t, shiftmap_t, zippool_t, msg_t, load_batch, save_ftext, load_ftext, load_tbl")
+
+try: # optional libraries to accelerate detect_text
+    import numpy as np
+    from numba import njit
+except ImportError: 
+    np, njit = None, None
 
 # text basic functions
 def iscjk(c: str): 
@@ -50,20 +65,32 @@ def padding(n, bytes_padding: bytes) -> bytes:
     l2 = n % len(bytes_padding)
     return l1*bytes_padding + bytes_padding[:l2]
 
-def find_tbl(v: Union[str, bytes], tbl: List[tbl_t]):
-    if not hasattr(find_tbl, "tbl") or find_tbl.tbl != tbl:
-        find_tbl.tbl = tbl
-        find_tbl.tcodemap = dict((t.tcode, i) for i, t in enumerate(tbl))
-        find_tbl.tcharmap = dict((t.tchar, i) for i, t in enumerate(tbl))
+def compile_tbl(tbl: Union[List[tbl_t], tblmap_t], invalidate=False) -> tblmap_t:
+    """
+    get the compiled tbl, tblmap_t (from load_tbl) holds its own maps, 
+    other list is compiled and cached by its identity and length in a small lru
+    :param invalidate: recompile the list changed inplace (tblmap_t is invalidated by itself)
+    """
 
-    tcodemap, tcharmap = find_tbl.tcodemap, find_tbl.tcharmap
-    idx = -1
-    try:
-        if type(v) == str: idx = tcharmap[v]
-        elif type(v) == bytes: idx = tcodemap[v]
-    except KeyError: 
-        return -1
-    return idx
+    if isinstance(tbl, tblmap_t): 
+        if invalidate: tbl.invalidate()
+        return tbl.compile()
+    if not hasattr(compile_tbl, "cache"): compile_tbl.cache = OrderedDict()
+    cache: OrderedDict = compile_tbl.cache
+    key = id(tbl)
+    v = cache.get(key) # (tbl, len, tblmap), the tbl ref keeps the id not reused
+    if invalidate or v is None or v[0] is not tbl or v[1] != len(tbl):
+        v = (tbl, len(tbl), tblmap_t(tbl).compile())
+        cache[key] = v
+        if len(cache) > 4: cache.popitem(last=False)
+    else: cache.move_to_end(key)
+    return v[2]
+
+def find_tbl(v: Union[str, bytes], tbl: List[tbl_t]):
+    tblmap = compile_tbl(tbl)
+    if type(v) == str: return tblmap.tcharmap.get(v, -1)
+    elif type(v) == bytes: return tblmap.tcodemap.get(v, -1)
+    return -1
 
 def encode_tbl(text: str, tbl: List[tbl_t], bytes_fallback: bytes=None) -> bytes:
     """
@@ -73,14 +100,11 @@ def encode_tbl(text: str, tbl: List[tbl_t], bytes_fallback: bytes=None) -> bytes
     :return: the encoded bytes
     """
 
-    if not hasattr(encode_tbl, "tbl") or encode_tbl.tbl != tbl:
-        encode_tbl.tbl = tbl
-        encode_tbl.tblmap = dict((t.tchar, t.tcode) for t in tbl)
-
     bufio = BytesIO()
-    tblmap = encode_tbl.tblmap
+    tblmap = compile_tbl(tbl)
+    tcharmap, tcodes = tblmap.tcharmap, tblmap.tcodes
     for i, c in enumerate(text):
-        if c in tblmap: bufio.write(tblmap[c])
+        if c in tcharmap: bufio.write(tcodes[tcharmap[c]])
         elif bytes_fallback is not None: 
             bufio.write(bytes_fallback)
         else:
@@ -98,23 +122,15 @@ def decode_tbl(data: bytes, tbl: List[tbl_t], text_fallback=None) -> str:
     :return: the decoded text in python string
     """
 
-    if not hasattr(decode_tbl, "tbl") or decode_tbl.tbl != tbl:
-        decode_tbl.tbl = tbl
-        decode_tbl.tblrmap = dict((t.tcode, t.tchar) for t in tbl)
-        decode_tbl.maxlen = max(len(t.tcode) for t in tbl)
-
     i = 0
+    n = len(data)
     sbufio = StringIO()
-    tblrmap = decode_tbl.tblrmap
-    maxlen = decode_tbl.maxlen
-    while i < len(data):
-        flag = False
-        for j in range(1, maxlen+1):
-            if data[i: i+j] not in tblrmap: continue
-            sbufio.write(tblrmap[data[i:i+j]])
-            flag = True
-            break
-        if not flag: # not find in tbl
+    tblmap = compile_tbl(tbl)
+    match, tchars = tblmap.match, tblmap.tchars
+    while i < n:
+        idx, j = match(data, i, n)
+        if idx >= 0: sbufio.write(tchars[idx])
+        else: # not find in tbl
             if text_fallback is not None: 
                 sbufio.write(text_fallback)
                 j = 1
@@ -196,8 +212,138 @@ def encode_extend(text: str, enc: Union[str, List[tbl_t]]='utf-8',
         elif type(t) == bytes: res += t
     return res
 
+# detect backends, numba kernels fallback to python if numba not installed
+def select_backend(backend="auto") -> str:
+    """
+    :param backend: auto, python, numba
+    :return: python or numba
+    """
+
+    if backend == "auto": return "python" if njit is None else "numba"
+    if backend not in {"python", "numba"}: raise ValueError(f"unknow backend {backend}")
+    return backend
+
+def _jit(f):
+    return f if njit is None else njit(cache=True, nogil=True)(f)
+
+def _asarray(data):
+    return data if np is None else np.frombuffer(data, dtype=np.uint8)
+
+@lru_cache(16)
+def _make_lut(encoding):
+    """
+    make the byte classify tables for _detect_text_lut
+    :return: single, lead, pair, tail (last byte valid), tail_break
+    """
+
+    if encoding == "sjis":
+        single = bytes(0x20 <= c <= 0x7f or 0xa1 <= c <= 0xdf for c in range(256))
+        lead = bytes(0x81 <= c <= 0x9f or 0xe0 <= c <= 0xef for c in range(256))
+        trail = bytes(0x40 <= c <= 0x7e or 0x80 <= c <= 0xfc for c in range(256))
+        pair = bytes(lead[c >> 8] and trail[c & 0xff] for c in range(0x10000))
+        tail, tail_break = bytes(256), True
+    else:
+        single = bytes(0x20 <= c <= 0x7f for c in range(256))
+        lead = bytes(c > 0x7f for c in range(256))
+        pair = bytes(c >> 8 > 0x7f and istext(c.to_bytes(2, "big"), encoding) for c in range(0x10000))
+        tail = bytes(c > 0x7f and istext(bytes([c]), encoding) for c in range(256))
+        tail_break = False
+    return tuple(map(_asarray, (single, lead, pair, tail))) + (tail_break, )
+
+def _make_tbllut(tblmap: tblmap_t):
+    """
+    make the byte classify tables for _detect_text_lut from tbl within 2 bytes
+    """
+
+    if tblmap.lut is None:
+        code1 = np.frombuffer(tblmap.code1, dtype=np.int32)
+        code2 = np.full(0x10000, -1, dtype=np.int32) if tblmap.code2 is None \
+            else np.frombuffer(tblmap.code2, dtype=np.int32)
+        single = (code1 >= 0).view(np.uint8)
+        pair = (code2 >= 0).view(np.uint8)
+        lead = pair.reshape(0x100, 0x100).max(axis=1)
+        tail = np.zeros(0x100, dtype=np.uint8)
+        tblmap.lut = (single, lead, pair, tail, False)
+    return tblmap.lut
+
+@_jit
+def _detect_text_lut(data, single, lead, pair, tail, tail_break, min_len):
+    i = 0
+    start = -1
+    n = len(data)
+    addrs, sizes = [], []
+    while i < n:
+        flag_find = False
+        c1 = int(data[i])
+        if single[c1]:
+            if start == -1: start = i
+            flag_find = True
+            i += 1
+        elif lead[c1]:
+            if i + 1 < n: valid = pair[c1*256 + int(data[i+1])]
+            elif tail_break: break
+            else: valid = tail[c1]
+            if valid:
+                if start == -1: start = i
+                flag_find = True
+                i += 2
+
+        if flag_find is False or i >= n:
+            if start != -1:
+                if i - start >= min_len:
+                    addrs.append(start)
+                    sizes.append(min(i-start, n))
+                start = -1
+            i += 1
+    return addrs, sizes
+
+@_jit
+def _detect_text_utf8(data, min_len):
+    i = 0
+    start = -1
+    n = len(data)
+    addrs, sizes = [], []
+    while i < n:
+        flag_find = False
+        lead = int(data[i])
+        if lead < 0xc0 or lead > 0xf4: # not seem as utf8
+            if lead >= 0x20 and lead <= 0x7f:
+                if start == -1: start = i
+                i += 1
+                flag_find = True
+        else: # seem as utf8, check as python utf-8 codec
+            j = 1 + (lead >= 0xe0) + (lead >= 0xf0)
+            valid = i + j < n and lead >= 0xc2
+            if valid:
+                c2 = int(data[i+1])
+                lo, hi = 0x80, 0xbf
+                if lead == 0xe0: lo = 0xa0
+                elif lead == 0xed: hi = 0x9f
+                elif lead == 0xf0: lo = 0x90
+                elif lead == 0xf4: hi = 0x8f
+                valid = lo <= c2 <= hi
+                for k in range(2, j+1):
+                    if not valid: break
+                    valid = 0x80 <= int(data[i+k]) <= 0xbf
+            if valid:
+                if start == -1: start = i
+                i += j + 1
+                flag_find = True
+
+        if flag_find is False or i >= n:
+            if start != -1:
+                if i - start >= min_len:
+                    addrs.append(start)
+                    sizes.append(min(i-start, n))
+                start = -1
+            i += 1
+    return addrs, sizes
+
 # text functions
-def detect_text_sjis(data, min_len=2) -> Tuple[List[int], List[int]]:
+def detect_text_sjis(data, min_len=2, *, backend="python") -> Tuple[List[int], List[int]]:
+    if select_backend(backend) == "numba":
+        return _detect_text_lut(_asarray(data), *_make_lut("sjis"), min_len)
+
     i = 0
     start = -1
     n = len(data)
@@ -227,7 +373,10 @@ def detect_text_sjis(data, min_len=2) -> Tuple[List[int], List[int]]:
 
     return addrs, sizes
 
-def detect_text_multichar(data, encoding, min_len=2) -> Tuple[List[int], List[int]]:
+def detect_text_multichar(data, encoding, min_len=2, *, backend="python") -> Tuple[List[int], List[int]]:
+    if select_backend(backend) == "numba":
+        return _detect_text_lut(_asarray(data), *_make_lut(encoding), min_len)
+
     i = 0
     start = -1 
     n = len(data)
@@ -256,25 +405,28 @@ def detect_text_multichar(data, encoding, min_len=2) -> Tuple[List[int], List[in
 
     return addrs, sizes
 
-def detect_text_tbl(data, tbl: List[tbl_t], min_len=2) -> Tuple[List[int], List[int]]: 
+def detect_text_tbl(data, tbl: List[tbl_t], min_len=2, *, backend="python") -> Tuple[List[int], List[int]]: 
     """
     :param tbl: the customized charcode mapping to encoding charcode
     :return: addrs, sizes
     """
+
+    tblmap = compile_tbl(tbl)
+    if select_backend(backend) == "numba" and tblmap.maxlen <= 2:
+        return _detect_text_lut(_asarray(data), *_make_tbllut(tblmap), min_len)
+
     i = 0
     start = -1 
     n = len(data)
     addrs, sizes = [], []
-    lead_max = max(len(t.tcode)for t in tbl)
+    match = tblmap.match
     while i < n:
         flag_find = False
-        for j in range(1, lead_max + 1):
-            if i + j > n: break
-            if find_tbl(bytes(data[i: i+j]), tbl) >= 0:
-                if start==-1: start=i
-                flag_find = True
-                i += j
-                break
+        idx, j = match(data, i, n)
+        if idx >= 0:
+            if start==-1: start=i
+            flag_find = True
+            i += j
 
         if flag_find is False or i >= n:
             if start != -1:
@@ -286,7 +438,10 @@ def detect_text_tbl(data, tbl: List[tbl_t], min_len=2) -> Tuple[List[int], List[
         
     return addrs, sizes
 
-def detect_text_utf8 (data, min_len=3) -> Tuple[List[int], List[int]]:
+def detect_text_utf8 (data, min_len=3, *, backend="python") -> Tuple[List[int], List[int]]:
+    if select_backend(backend) == "numba":
+        return _detect_text_utf8(_asarray(data), min_len)
+
     if not hasattr(detect_text_utf8, "leadbyte_n"):
         detect_text_utf8.leadbyte_n = \
             [1 + (i >= 0xe0) + (i >= 0xf0) \
@@ -322,6 +477,85 @@ def detect_text_utf8 (data, min_len=3) -> Tuple[List[int], List[int]]:
     
     return addrs, sizes
 
+def _make_breaker(method: str, encoding: str=None, tbl: List[tbl_t]=None) -> bytes:
+    """
+    make the flags of bytes that can not be in a char and always fail to detect,
+    detection restarts after these bytes, so the data can be splited there
+    """
+
+    if method == "utf8":
+        return bytes(c < 0x20 or c in {0xc0, 0xc1} or c > 0xf4 for c in range(256))
+    if method == "tbl":
+        tblmap = compile_tbl(tbl)
+        used = bytearray(256)
+        for tcode in tblmap.tcodemap: 
+            for c in tcode: used[c] = 1
+        return bytes(not c for c in used)
+    single, lead, pair, tail, _ = _make_lut("sjis" if method == "sjis" else encoding)
+    single, lead, pair, tail = map(bytes, (single, lead, pair, tail))
+    trail, leadvalid = bytearray(256), bytearray(256)
+    for c1 in range(256):
+        if not lead[c1]: continue
+        row = pair[c1*256: c1*256 + 256]
+        leadvalid[c1] = tail[c1] or any(row)
+        for c2, v in enumerate(row):
+            if v: trail[c2] = 1
+    return bytes(not (single[c] or trail[c] or leadvalid[c]) for c in range(256))
+
+def _detect_chunk_worker(shmname: str, start: int, end: int, method: str, min_len: int, kw: dict):
+    shm = SharedMemory(shmname) # workers share the resource_tracker with parent
+    try:
+        data = shm.buf[start: end]
+        addrs, sizes = globals()[f"detect_text_{method}"](data, min_len=min_len, **kw)
+        data.release()
+    finally: shm.close()
+    return [addr + start for addr in addrs], list(sizes)
+
+def detect_text_parallel(data, method: str, min_len=2, *, 
+        jobs=0, chunk_size=0x100000, **kw) -> Tuple[List[int], List[int]]:
+    """
+    detect text in chunks by process pool on shared memory, 
+    chunks are splited after breaker bytes, the same result as sequential
+    :param method: sjis, utf8, multichar, tbl, as detect_text_{method}
+    :param jobs: process number, 0 for cpu count
+    :param kw: encoding, tbl, backend for detect_text_{method}
+    :return: addrs, sizes
+    """
+
+    n = len(data)
+    jobs = jobs if jobs > 0 else os.cpu_count()
+    nchunk = min(jobs * 4, n // chunk_size) if chunk_size > 0 else jobs * 4
+    breaker = _make_breaker(method, kw.get("encoding"), kw.get("tbl"))
+    charset = b"".join(b"\\x%02x" % c for c in range(256) if breaker[c])
+    bounds = [0]
+    if charset and nchunk > 1:
+        pattern = re.compile(b"[" + charset + b"]")
+        for k in range(1, nchunk):
+            m = pattern.search(data, max(k * n // nchunk, bounds[-1]))
+            if m is None: break
+            if m.end() < n: bounds.append(m.end())
+        bounds = sorted(set(bounds))
+    bounds.append(n)
+    if len(bounds) <= 2 or jobs <= 1: 
+        return globals()[f"detect_text_{method}"](data, min_len=min_len, **kw)
+
+    logging.info(f"detect in {len(bounds) - 1} chunks [method={method} jobs={jobs}]")
+    addrs, sizes = [], []
+    shm = SharedMemory(create=True, size=n)
+    try:
+        shm.buf[:n] = data
+        with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("spawn")) as executor: # not fork after threads
+            futures = [executor.submit(_detect_chunk_worker, shm.name, start, end, method, min_len, kw) 
+                    for start, end in zip(bounds[:-1], bounds[1:])]
+            for future in futures:
+                _addrs, _sizes = future.result()
+                addrs.extend(_addrs)
+                sizes.extend(_sizes)
+    finally:
+        shm.close()
+        shm.unlink()
+    return addrs, sizes
+
 def check_ftextlines(lines: List[str]) -> List[msg_t]:
     indicator_pre = "●"
     msgs = []
@@ -363,27 +597,84 @@ def check_ftextlines(lines: List[str]) -> List[msg_t]:
 
     return msgs
 
-@filter_loadfiles(0)
+def make_addr_finder(data: bytes, targets: List[bytes]=None) -> Callable[[bytes], int]:
+    """
+    make the function to find the first unused addr of target in data,
+    targets (within 4 bytes prefix) are indexed once by numpy if installed, 
+    others are searched by resuming from the last found addr of the same target
+    :param targets: the targets will be searched, for building index
+    :return: f(target) -> addr, -1 if not find
+    """
+
+    used = set() # the addrs already found
+    resume = dict() # target -> next candidate index or next find addr
+    index = dict() # 4 bytes prefix -> candidate addrs
+    if np is not None and targets and len(data) >= 4:
+        keys = set(int.from_bytes(t[:4], 'big') for t in targets if len(t) >= 4)
+        keys = np.array(sorted(keys), dtype=np.uint32)
+        addrs, step = [np.zeros(0, dtype=np.int64)], 0x1000000
+        for start in range(0, len(data) - 3, step): # in chunks to bound the memory
+            end = min(start + step, len(data) - 3)
+            for i in range(4): # 4 bytes grams at start + i + 4k, as view
+                grams = np.frombuffer(data, dtype=">u4", count=(end - start - i + 3) // 4, offset=start + i)
+                addrs.append(np.flatnonzero(np.isin(grams, keys)) * 4 + start + i)
+        addrs = np.concatenate(addrs)
+        buf = np.frombuffer(data, dtype=np.uint8)
+        grams = np.zeros(len(addrs), dtype=np.uint32)
+        for i in range(4): grams = (grams << 8) | buf[addrs + i]
+        order = np.lexsort((addrs, grams))
+        addrs, grams = addrs[order], grams[order]
+        uniques, starts = np.unique(grams, return_index=True)
+        for k, start, end in zip(uniques.tolist(), starts.tolist(), starts[1:].tolist() + [len(grams)]):
+            index[k] = addrs[start: end].tolist()
+        
+    def f(target: bytes) -> int:
+        if index and len(target) >= 4:
+            addrs = index.get(int.from_bytes(target[:4], 'big'), [])
+            i = resume.get(target, 0)
+            while i < len(addrs):
+                addr = addrs[i]
+                i += 1
+                if addr in used or data[addr: addr+len(target)] != target: continue
+                resume[target] = i
+                used.add(addr)
+                return addr
+            resume[target] = i
+            return -1
+        
+        addr = resume.get(target, 0)
+        while True:
+            addr = data.find(target, addr)
+            if addr < 0: 
+                resume[target] = len(data) + 1
+                return -1
+            if addr not in used: break
+            addr += 1
+        resume[target] = addr + 1
+        used.add(addr)
+        return addr
+
+    return f
+
+@filter_loadfiles((0, "mmap"))
 def extract_ftexts(binobj: Union[str, bytes], outpath=None, 
         encoding='utf-8', tblobj: Union[str, List[tbl_t]]=None, *, 
-        min_len=2, has_cjk=True, data_slice=None) -> List[ftext_t]:
+        min_len=2, has_cjk=True, data_slice=None, backend="auto", jobs=1) -> List[ftext_t]:
     """
     extract ftexts by search encoding or tbl in binfile
+    :param backend: detect backend, auto, python, numba
+    :param jobs: detect in chunks by processes if not 1, 0 for cpu count
     """
 
     def _detect_text(target):
-        if tbl is not None:
-            logging.info("try detect_text_tbl")
-            addrs, sizes = detect_text_tbl(target, tbl, min_len=min_len)
-        elif encoding =="utf-8" :
-            logging.info("try detect_text_utf8")
-            addrs, sizes = detect_text_utf8(target, min_len=min_len)
-        elif encoding == "sjis":
-            logging.info("try detect_text_sjis")
-            addrs, sizes = detect_text_sjis(target, min_len=min_len)
-        else: 
-            logging.info("try detect_text_multichar")
-            addrs, sizes = detect_text_multichar(target,  encoding=encoding, min_len=min_len)
+        if tbl is not None: method, kw = "tbl", dict(tbl=tbl)
+        elif encoding == "utf-8": method, kw = "utf8", dict()
+        elif encoding == "sjis": method, kw = "sjis", dict()
+        else: method, kw = "multichar", dict(encoding=encoding)
+        logging.info(f"try detect_text_{method} [backend={backend}]")
+        if jobs == 1: 
+            addrs, sizes = globals()[f"detect_text_{method}"](target, min_len=min_len, backend=backend, **kw)
+        else: addrs, sizes = detect_text_parallel(target, method, min_len=min_len, jobs=jobs, backend=backend, **kw)
         return addrs, sizes
 
     def _make_ftexts(addrs, sizes):
@@ -399,6 +690,7 @@ def extract_ftexts(binobj: Union[str, bytes], outpath=None,
 
     data = memoryview(binobj)
     data_slice = slice(0, None, 1) if data_slice is None else data_slice
+    backend = select_backend(backend)
     tbl =  load_tbl(tblobj, encoding=encoding)
     addrs, sizes = _detect_text(data[data_slice])
     addrs = list(map(lambda x: x + data_slice.start, addrs))
@@ -407,7 +699,18 @@ def extract_ftexts(binobj: Union[str, bytes], outpath=None,
     logging.info(f"finish extract {len(ftexts)} ftexts")
     return ftexts
 
-@filter_loadfiles([0, (1, 'utf-8', 'ignore', False), "referobj"])
+def _same_content(path: str, data: memoryview, chunk_size=0x1000000) -> bool:
+    """
+    compare the file with data by chunks
+    """
+
+    if os.path.getsize(path) != len(data): return False
+    with open(path, 'rb') as fp:
+        for i in range(0, len(data), chunk_size):
+            if fp.read(chunk_size) != data[i: i + chunk_size]: return False
+    return True
+
+@filter_loadfiles([(0, "mmap"), ("referobj", "mmap")])
 def insert_ftexts(binobj: Union[str, bytes], 
         ftextsobj: Union[str, Tuple[List[ftext_t], List[ftext_t]]], 
         outpath=None, encoding='utf-8', tblobj: Union[str, List[tbl_t]]=None, *, 
@@ -415,6 +718,7 @@ def insert_ftexts(binobj: Union[str, bytes],
         bytes_padding: bytes=b'\x00', bytes_fallback: bytes = None, 
         insert_longer=False, insert_shorter=False, insert_align=1, 
         referobj: Union[str, bytes]=None, jump_table: List[jtable_t] = None,
+        out_shiftmap: shiftmap_t = None, return_data=True, insert_inplace=False, 
         f_before: Callable[[bytes, ftext_t], str] = None, 
         f_after: Callable[[bytes, memoryview, bytes, ftext_t], bytes] = None, 
     ) -> bytes:
@@ -424,38 +728,25 @@ def insert_ftexts(binobj: Union[str, bytes],
     :param bytes_padding: padding the replace_bytes if not data_shorter
     :param bytes_fallback: bytes when encoding tbl failed
     :paran referobj: search from the reference obj to get new addr
+    :param jump_table: relocate addr_new, toaddr_new after insertion
+    :param out_shiftmap: output the shift of insertions for relocating pointers
+    :param return_data: if False with outpath, stream to outpath and return None 
+    :param insert_inplace: patch the outpath (the same content as binobj, or raise) 
+        if all the same size, otherwise rebuild the outpath
     :param f_before: f(srcdata, ftext_t) -> replace_text
-    :param f_after: f(srcdata, dstdata, encbytes, ftext_t) -> replace_bytes
+    :param f_after: f(srcdata, dstdata, encbytes, ftext_t) -> replace_bytes, dstdata None in stream
     """
     
-    def addr_find(t:ftext_t, data: bytes, refdata: bytes, addr_cache: set=None) -> int:
+    def addr_find(t:ftext_t, refdata: bytes, finder: Callable[[bytes], int]) -> int:
         if t.addr < 0 or t.size <= 0: return -1
-        addr = 0
         n = len(refdata)
         if t.addr + t.size > n: 
             logging.warning(f"0x{t.addr:x} + 0x{t.size:x} > 0x{n:x}")
             t.size = 0
             return -1
-        target = refdata[t.addr: t.addr+t.size]
-        while True:
-            flag_find = False
-            addr = data.find(target, addr)
-            if addr >= 0:
-                if addr_cache:
-                    if addr in addr_cache:
-                        # logging.debug(f"{t.addr: x} is in cache")
-                        addr += 1
-                        continue
-                    else: flag_find = True
-                else: flag_find = True
-                
-                if flag_find:
-                    # logging.debug(f"0x{t.addr:x}->0x{addr:x}")
-                    addr_cache |= {addr}
-                    return addr
-            else: 
-                logging.warning(f"ref addr not find [addr=0x{t.addr:x} text='{t.text}]'")
-                return -1
+        addr = finder(bytes(refdata[t.addr: t.addr+t.size]))
+        if addr < 0: logging.warning(f"ref addr not find [addr=0x{t.addr:x} text='{t.text}]'")
+        return addr
 
     def insert_adjust(encbytes: bytes, t: ftext_t, *,
             insert_longer=False, insert_shorter=False, insert_align=1, bytes_padding=b'\x00'):
@@ -475,62 +766,96 @@ def insert_ftexts(binobj: Union[str, bytes],
             else: encbytes += padding(d%insert_align, bytes_padding)
         return encbytes
     
-    refcache = set()
     refdata = memoryview(referobj) if referobj else None
     tbl = load_tbl(tblobj)
     enc = tbl if tbl else encoding
     enc_error = bytes_fallback if tbl else ("ignore" if bytes_fallback else "strict")
     text_replace = text_replace if text_replace else dict()
-    _, ftexts = load_ftext(ftextsobj)
-    ftexts.sort(key=lambda x: x.addr)
+    _, ftexts = load_ftext(ftextsobj, as_table=True)
+    if type(ftexts) == ftexttable_t: ftexts.sort("addr") # argsort the columns
+    else: ftexts.sort(key=lambda x: x.addr)
     logging.info(f"load {len(ftexts)} ftexts")
 
     shift = 0
     last_addr = 0
-    srcdata = bytes(binobj)
-    dstio = BytesIO()
+    shiftmap = out_shiftmap if out_shiftmap is not None else shiftmap_t()
+    srcdata = binobj if hasattr(binobj, "find") else bytes(binobj) # bytes, mmap
+    srcview = memoryview(srcdata)
+    stream = bool(outpath) and not return_data
+    if refdata: 
+        finder = make_addr_finder(srcdata, [bytes(refdata[t.addr: t.addr+t.size]) 
+            for t in ftexts if t.addr >= 0 and 0 < t.size and t.addr + t.size <= len(refdata)])
+    items: List[Tuple[int, ftext_t, str, bytes]] = [] # addr, ftext, text, encbytes
     for i, t in enumerate(ftexts):
-        addr = addr_find(t, srcdata, refdata, refcache) if refdata else t.addr
+        addr = addr_find(t, refdata, finder) if refdata else t.addr
         if addr < 0: 
             logging.warning(f"ftext addr not find [i={i} addr=0x{t.addr:x} text='{t.text}]'")
             continue
-        dstio.write(srcdata[last_addr: addr])
         text = f_before(srcdata, t) if f_before else t.text
         for k, v in text_replace.items(): text = text.replace(k, v)
         encbytes = encode_extend(text, enc, enc_error, text_noeval)
         encbytes = insert_adjust(encbytes, t, insert_longer=insert_longer, 
             insert_shorter=insert_shorter, insert_align=insert_align, bytes_padding=bytes_padding)
-        if f_after: 
-            dstdata = dstio.getbuffer()
-            encbytes = f_after(srcdata, dstdata, encbytes, t)
-            dstio.flush()
-            del dstdata
-        dstio.write(encbytes)
-        last_addr = addr + t.size
-        shift += len(encbytes) - t.size
+        items.append((addr, t, text, encbytes))
+    
+    reason = None # why not insert inplace
+    if not insert_inplace: pass
+    elif type(outpath) != str: reason = "outpath not a path"
+    elif os.path.splitext(outpath)[1] == ".gz" or ".zip>" in outpath: reason = "outpath in gz or zip"
+    elif not os.path.exists(outpath): reason = "outpath not exist"
+    elif f_after: reason = "f_after might change dstdata"
+    else:
+        for addr, t, _, encbytes in items:
+            if len(encbytes) == t.size: continue
+            reason = f"size changed at 0x{addr:x} 0x{t.size:x}->0x{len(encbytes):x}"
+            break
+    if insert_inplace and reason is None and not _same_content(outpath, srcview):
+        raise ValueError(f"outpath not the same as binobj to insert inplace [outpath={outpath}]")
+    if insert_inplace and reason is None:
+        logging.info(f"insert inplace [outpath={outpath}]")
+        dstdata = bytearray(srcdata) if return_data else None
+        with open(outpath, 'r+b') as fp:
+            for addr, t, text, encbytes in items:
+                fp.seek(addr)
+                fp.write(encbytes)
+                if dstdata is not None: dstdata[addr: addr + t.size] = encbytes
+                shiftmap.add(addr, 0)
+                logging.info(f"inserted [addr=0x{addr:x} size=0x{t.size:x} text='{text}]'")
+        dstdata = bytes(dstdata) if dstdata is not None else None
+    else:
+        if insert_inplace: logging.info(f"insert inplace not fit, rebuild [outpath={outpath} reason={reason}]")
+        with writestream(outpath) if stream else nullcontext(BytesIO()) as dstio:
+            for addr, t, text, encbytes in items:
+                dstio.write(srcview[last_addr: addr])
+                if f_after: 
+                    dstdata = dstio.getbuffer() if not stream else None
+                    encbytes = f_after(srcdata, dstdata, encbytes, t)
+                    dstio.flush()
+                    del dstdata
+                dstio.write(encbytes)
+                last_addr = addr + t.size
+                shift += len(encbytes) - t.size
+                shiftmap.add(addr, shift)
+                _sizestr = f"0x{t.size:x}" + (f"->0x{len(encbytes):x}" if len(encbytes)!=t.size else "")
+                logging.info(f"inserted [addr=0x{addr:x} size={_sizestr} text='{text}]'")
+            dstio.write(srcview[last_addr:])
+            dstdata = None if stream else dstio.getvalue()
+        if outpath and not stream: writebytes(outpath, dstdata)
     
-        if jump_table:
-            for t2 in jump_table:
-                if t2.addr >= addr: t2.addr_new  = t2.addr + shift
-                if t2.toaddr >= addr:  t2.toaddr_new = t2.toaddr + shift
-        _sizestr = f"0x{t.size:x}" + (f"->0x{len(encbytes):x}" if len(encbytes)!=t.size else "")
-        logging.info(f"inserted [addr=0x{addr:x} size={_sizestr} text='{text}]'")
-
-    dstio.write(srcdata[last_addr:])
-    dstdata = dstio.getvalue()
-    dstio.close()
-    if outpath: writebytes(outpath, dstdata)
-    logging.info(f"finished with datasize 0x{len(srcdata):x}->0x{len(dstdata):x}")
+    srcview.release()
+    if jump_table: shiftmap.relocate(jump_table)
+    logging.info(f"finished with datasize 0x{len(srcdata):x}->0x{len(srcdata) + shift:x}")
     return dstdata
 
-@filter_loadfiles([(0, 'utf-8', 'ignore', False), "referobj"])
-def check_ftexts(linesobj: Union[str, Tuple[List[ftext_t], List[ftext_t]]], outpath=None, 
+@filter_loadfiles([(0, 'utf-8', 'ignore', False), ("referobj", "mmap")])
+def check_ftexts(linesobj: Union[str, List[str], Tuple[List[ftext_t], List[ftext_t]]], outpath=None, 
         encoding='utf-8', tblobj: Union[str, List[tbl_t]]=None, *, 
         text_noeval=False, text_replace: Dict[bytes, bytes]=None,
         bytes_fallback: bytes = None, insert_longer=False, 
         referobj: Union[str, bytes]=None, referencoding=None, refertblobj=None) -> List[msg_t]:
     """
     check the ftexts including format and charactors
+    :param linesobj: ftextpath, lines or (ftexts1, ftexts2) without format check
     :param referobj: origin raw reference file
     :param referencoding: reference file encoding
     :param refertblobj: reference file tbl
@@ -543,8 +868,8 @@ def check_ftexts(linesobj: Union[str, Tuple[List[ftext_t], List[ftext_t]]], outp
     enc_error = bytes_fallback if tbl else ("ignore" if bytes_fallback else "strict")
     refdata = memoryview(referobj) if referobj else None
     text_replace = text_replace if text_replace else dict()
-    msgs += check_ftextlines(lines)
-    ftexts1, ftexts2 = load_ftext(lines)
+    if type(linesobj) != tuple: msgs += check_ftextlines(lines)
+    ftexts1, ftexts2 = load_ftext(lines, as_table=True)
     if len(ftexts1) != len(ftexts2):
         msg = msg_t(-1, f"○● count not match {len(ftexts1)}!={len(ftexts2)}", logging.WARNING)
         logging.warning(msg.msg)
@@ -608,6 +933,101 @@ def check_ftexts(linesobj: Union[str, Tuple[List[ftext_t], List[ftext_t]]], outp
 
     return msgs
 
+@lru_cache(8)
+def _load_tbl_batch(path: str) -> tblmap_t:
+    return load_tbl(path)
+
+def _batch_worker(name: str, args: list, kw: dict, loglevel: int=None) -> Tuple[str, str, float, int, bytes]:
+    """
+    run the function by name for batch, outpath is written by the function itself,
+    except zip entry written in memory first, tbl path is loaded once in each process
+    :param loglevel: capture logs in this level, None for not capture
+    :return: status, logs, time, size, data (zip outpath written by caller)
+    """
+
+    f = globals()[name]
+    kw = dict(kw) # not change the task in serial
+    for k in ["tblobj", "refertblobj"]:
+        if type(kw.get(k)) == str: kw[k] = _load_tbl_batch(kw[k])
+    outpath = kw.get("outpath")
+    inzip = type(outpath) == str and ".zip>" in outpath # zip is not shared by processes
+    if inzip: kw["outpath"] = BytesIO()
+
+    logs = ""
+    logger = logging.getLogger()
+    if loglevel is not None:
+        logio = StringIO()
+        handler = logging.StreamHandler(logio)
+        handler.setFormatter(logging.Formatter("%(levelname)s:%(funcName)s: %(message)s"))
+        handlers, level = logger.handlers, logger.level
+        logger.handlers = [handler]
+        logger.setLevel(loglevel)
+    
+    status, data, size = "ok", b"", 0
+    start = time.perf_counter()
+    try:
+        f(*args, **kw)
+        if inzip: data = kw["outpath"].getvalue()
+        elif type(outpath) == str and os.path.exists(outpath): size = os.path.getsize(outpath)
+    except Exception as e:
+        logging.exception(f"{name} failed")
+        status = f"{type(e).__name__}: {e}"
+    end = time.perf_counter()
+
+    if loglevel is not None:
+        logger.handlers = handlers
+        logger.setLevel(level)
+        logs = logio.getvalue()
+    size = size or len(data)
+    data = data if inzip else None
+    return status, logs, end - start, size, data
+
+def run_batch(name: str, tasks: List[Tuple[str, list, dict]], jobs=1) -> bool:
+    """
+    run extract_ftexts, insert_ftexts, check_ftexts in batch, 
+    by process pool if jobs > 1, and log the summary in the end
+    :param tasks: [(desc, args, kw)], outpath should be in kw
+    :param jobs: process number, 0 for cpu count
+    :return: whether all tasks successed
+    """
+
+    def _collect(i, result):
+        status, logs, _, _, data = result
+        if loglevel is not None: sys.stderr.write(logs)
+        if data is not None: writebytes(tasks[i][2]["outpath"], data)
+        results[i] = result
+
+    n = len(tasks)
+    results = [None] * n
+    jobs = jobs if jobs > 0 else os.cpu_count()
+    start = time.perf_counter()
+    with zippool_t(): # keep the zip archives opened in batch
+        if jobs <= 1:
+            loglevel = None
+            for i, (desc, args, kw) in enumerate(tasks):
+                logging.info(f"batch {i+1}/{n} [{desc}]")
+                _collect(i, _batch_worker(name, args, kw))
+        else:
+            loglevel = logging.getLogger().getEffectiveLevel()
+            with ProcessPoolExecutor(jobs, mp_context=multiprocessing.get_context("spawn")) as executor:
+                futures = dict((executor.submit(_batch_worker, name, args, kw, loglevel), i) 
+                        for i, (_, args, kw) in enumerate(tasks))
+                for future in as_completed(futures):
+                    i = futures[future]
+                    logging.info(f"batch {i+1}/{n} [{tasks[i][0]}]")
+                    _collect(i, future.result())
+    end = time.perf_counter()
+
+    failed, total = 0, 0
+    for (desc, _, _), (status, _, elapsed, size, _) in zip(tasks, results):
+        failed += status != "ok"
+        total += size
+        _level = logging.INFO if status == "ok" else logging.ERROR
+        logging.log(_level, f"{status} [time={elapsed:.3f}s size=0x{size:x} {desc}]")
+    _level = logging.INFO if failed == 0 else logging.ERROR
+    logging.log(_level, f"batch finished [n={n} failed={failed} jobs={jobs} time={end-start:.3f}s size=0x{total:x}]")
+    return failed == 0
+
 def cli(cmdstr=None):
     def cmd_extract(args):
         logging.debug(repr(args))
@@ -619,13 +1039,15 @@ def cli(cmdstr=None):
             outpaths = [args.outpath if args.outpath!="" else None]
         start = int(args.skip, 0) if args.skip else 0 
         end =  start + int(args.size, 0) if args.size else None
-        n = min(len(binpaths), len(outpaths))
-        for i, (binpath, outpath) in enumerate(zip(binpaths, outpaths)):
-            if args.batch: logging.info(f"batch {i+1}/{n} [binpath={binpath} outpath={outpath}]")
-            extract_ftexts(binpath, outpath, 
+        tasks = [(f"binpath={binpath} outpath={outpath}", [binpath], dict(outpath=outpath, 
                 encoding=args.encoding, tblobj=args.tbl, 
                 min_len=args.min_len, has_cjk=args.has_cjk, 
-                data_slice=slice(start, end, 1))
+                data_slice=slice(start, end, 1), backend=args.backend, 
+                jobs=1 if args.batch else args.jobs)) 
+                for binpath, outpath in zip(binpaths, outpaths)]
+        if args.batch: 
+            if not run_batch("extract_ftexts", tasks, args.jobs): sys.exit(1)
+        else: extract_ftexts(*tasks[0][1], **tasks[0][2])
 
     def cmd_insert(args):
         logging.debug(repr(args))
@@ -642,15 +1064,22 @@ def cli(cmdstr=None):
         text_replace = dict((t[0], t[1]) for t in  args.text_replace) if args.text_replace else None
         bytes_padding = bytes.fromhex(args.bytes_padding)
         bytes_fallback = bytes.fromhex(args.bytes_fallback) if args.bytes_fallback else None
-        n = min(len(binpaths), len(ftextpaths), len(outpaths))
-        for i, (binpath, ftextpath, outpath, referpath) in enumerate(zip(binpaths, ftextpaths, outpaths, referpaths)):
-            if args.batch: logging.info(f"batch {i+1}/{n} [binpath={binpath} ftextpath={ftextpath} referpath={referpath} outpath={outpath}]")
-            insert_ftexts(binpath, ftextpath, outpath, 
+        inplaces = [args.insert_inplace and bool(outpath) and samefile(binpath, outpath) 
+            for binpath, outpath in zip(binpaths, outpaths)] # copying is not less than rebuilding
+        if args.insert_inplace and not all(inplaces): 
+            logging.info("insert inplace only when outpath is binpath, others rebuild")
+        tasks = [(f"binpath={binpath} ftextpath={ftextpath} referpath={referpath} outpath={outpath}", 
+                [binpath, ftextpath], dict(outpath=outpath, 
                 encoding=args.encoding, tblobj=args.tbl, referobj=referpath, 
                 text_noeval=args.text_noeval, text_replace=text_replace, 
                 bytes_padding=bytes_padding, bytes_fallback=bytes_fallback, 
                 insert_longer=args.insert_longer, insert_shorter=args.insert_shorter, 
-                insert_align=args.insert_align)
+                insert_align=args.insert_align, insert_inplace=inplace, return_data=False))
+                for binpath, ftextpath, outpath, referpath, inplace in 
+                    zip(binpaths, ftextpaths, outpaths, referpaths, inplaces)]
+        if args.batch: 
+            if not run_batch("insert_ftexts", tasks, args.jobs): sys.exit(1)
+        else: insert_ftexts(*tasks[0][1], **tasks[0][2])
 
     def cmd_check(args):
         logging.debug(repr(args))
@@ -665,14 +1094,16 @@ def cli(cmdstr=None):
         
         text_replace = dict((t[0], t[1]) for t in  args.text_replace) if args.text_replace else None
         bytes_fallback = bytes.fromhex(args.bytes_fallback) if args.bytes_fallback else None
-        n = min(len(ftextpaths), len(outpaths))
-        for i, (ftextpath, outpath, referpath) in enumerate(zip(ftextpaths, outpaths, referpaths)):
-            if args.batch: logging.info(f"batch {i+1}/{n} [ftextpath={ftextpath} referpath={referpath} outpath={outpath}]")
-            check_ftexts(ftextpath, outpath,  
+        tasks = [(f"ftextpath={ftextpath} referpath={referpath} outpath={outpath}", 
+                [ftextpath], dict(outpath=outpath, 
                 encoding=args.encoding, tblobj=args.tbl, 
                 referobj=referpath, referencoding=args.referencoding, refertblobj=args.refertbl,
                 text_replace=text_replace, text_noeval=args.text_noeval,
-                bytes_fallback=bytes_fallback, insert_longer=args.insert_longer)
+                bytes_fallback=bytes_fallback, insert_longer=args.insert_longer))
+                for ftextpath, outpath, referpath in zip(ftextpaths, outpaths, referpaths)]
+        if args.batch: 
+            if not run_batch("check_ftexts", tasks, args.jobs): sys.exit(1)
+        else: check_ftexts(*tasks[0][1], **tasks[0][2])
 
     p = argparse.ArgumentParser(description=__description__)
     p2 = p.add_subparsers(title="operations")
@@ -687,6 +1118,7 @@ def cli(cmdstr=None):
         t.add_argument("--log_level", default="info", help="set log level", 
             choices=("none", "critical", "error", "warning", "info", "debug"))
         t.add_argument("--batch", action="store_true", help="batch mode on binpath, ftextpath, outpath, referpath")
+        t.add_argument("--jobs", type=int, default=1, help="process number in batch mode (or chunks in extract), 0 for cpu count")
        
     p_extract.set_defaults(handler=cmd_extract)
     p_extract.add_argument("binpath")
@@ -694,6 +1126,8 @@ def cli(cmdstr=None):
     p_extract.add_argument('--min_len', type=int, default=2, help="filter text below len")
     p_extract.add_argument('--skip', default=None, help="skip bytes to extract")
     p_extract.add_argument('--size', default=None, help="extract bytes size")
+    p_extract.add_argument('--backend', default="auto", 
+        choices=("auto", "python", "numba"), help="detect text backend")
     p_insert.set_defaults(handler=cmd_insert)
     p_insert.add_argument("binpath")
     p_insert.add_argument("ftextpath")
@@ -706,6 +1140,7 @@ def cli(cmdstr=None):
     p_insert.add_argument("--insert_shorter", action="store_true", help="insert data can longer than origin")
     p_insert.add_argument("--insert_longer", action="store_true",  help="insert data can shorter than origin")
     p_insert.add_argument("--insert_align", default=1, help="insert data by align value")
+    p_insert.add_argument("--insert_inplace", action="store_true", help="patch outpath in place if it is binpath and all the same size")
     p_check.set_defaults(handler=cmd_check)
     p_check.add_argument("ftextpath")
     p_check.add_argument("--refer", dest="referpath", help="binfile path")
@@ -735,4 +1170,17 @@ v0.6, remake to increase speed and simplify functions
 v0.6.1, add batch mode on extract, insert to optimize performance
 v0.6.2, add referencoding, refertbl
 v0.6.3, add decode_tbl text_fallback parameter, decode_general
+v0.6.4, add numba backend for detect_text_sjis, detect_text_utf8, detect_text_multichar
+v0.6.5, add tblmap_t to compile tbl for find_tbl, encode_tbl, decode_tbl, detect_text_tbl
+v0.6.6, move tblmap_t to libutil, compile_tbl with lru cache for plain list
+v0.6.7, add make_addr_finder to index refer addrs in insert_ftexts
+v0.6.8, add out_shiftmap in insert_ftexts, relocate jump_table by shiftmap_t
+v0.6.9, add --jobs for batch mode by process pool, run_batch with summary
+v0.6.10, add detect_text_parallel for extracting in chunks on shared memory
+v0.6.11, extract_ftexts, insert_ftexts, check_ftexts read binfile by mmap
+v0.6.12, add insert_ftexts return_data=False to stream output by writestream
+v0.6.13, add insert_inplace to patch the same size ftexts without rebuilding
+v0.6.14, insert_ftexts pass ftextpath to load_ftext for the sidecar cache
+v0.6.15, insert_ftexts, check_ftexts load ftexts as ftexttable_t
+v0.6.16, run_batch keeps zip archives opened by zippool_t
 """
\ No newline at end of file
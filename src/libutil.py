@@ -1,17 +1,26 @@
 # -*- coding: utf-8 -*-
-__version__  = "0.6"
+__version__  = "0.6.9"
 __description__ = f"""
 util functions and structures for galgame localization
     v{__version__}, developed by devseed
 """
 
 import os
+import sys
 import gzip
+import mmap
+import struct
 import zipfile
-from io import BytesIO
+import hashlib
+from bisect import bisect_right
+from array import array
+from itertools import repeat, zip_longest
+from collections import deque
+from io import BytesIO, TextIOBase, TextIOWrapper
+from contextlib import contextmanager
 from datetime import datetime
 from dataclasses import dataclass
-from typing import Union, List, Tuple
+from typing import Callable, Iterator, Iterable, Union, List, Tuple, Dict
 
 try: # optional libraries to import
     import numpy as np
@@ -47,7 +56,11 @@ def writelines(lines: List[str], encoding='utf-8', encoding_error='ignore') -> b
     bufio.close()
     return data
 
-def readbytes(inobj: Union[str, BytesIO]) -> bytes:
+def readbytes(inobj: Union[str, BytesIO], use_mmap=False) -> Union[bytes, mmap.mmap]:
+    """
+    :param use_mmap: map the direct file as readonly buffer, should close after use
+    """
+
     def load_gz(path) -> bytes: # path/x.gz 
         with gzip.GzipFile(path, 'rb') as fp: 
             return fp.read()
@@ -55,53 +68,133 @@ def readbytes(inobj: Union[str, BytesIO]) -> bytes:
     def load_zip(path) -> bytes: # path1/x.zip>path2/y
         path1, path2 = path.split(".zip>")
         path2 = path2.replace('\\', '/')
-        with zipfile.ZipFile(path1 + ".zip", 'r') as fp1:
-            with fp1.open(path2, 'r') as fp2:
-                return fp2.read()
+        with openzip(path1 + ".zip", 'r') as fp1:
+            return fp1.read(path2)
     
     def load_direct(path) -> bytes:
         with open(path, 'rb') as fp:
             return fp.read()
-        
+    
+    def load_mmap(path) -> mmap.mmap:
+        with open(path, 'rb') as fp:
+            if os.fstat(fp.fileno()).st_size == 0: return b""
+            return mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
     if type(inobj)==str:
         path = inobj
         if os.path.splitext(path)[1] == '.gz': data = load_gz(path)
         elif ".zip>" in path: data = load_zip(path)
+        elif use_mmap: data = load_mmap(path)
         else: data = load_direct(path)
     else:
         data = inobj.read()
     return data
 
-def writebytes(outobj: Union[str, BytesIO], dataobj: Union[bytes, BytesIO]) -> int:
-    def save_gz(path, data) -> int: # path/x.gz 
-        with gzip.GzipFile(path, 'wb') as fp: 
-            return fp.write(data)
-        
-    def save_zip(path, data) -> int: # path1/x.zip>path2/y
-        path1, path2 = path.split(".zip>")
+class zippool_t:
+    """
+    the opened zip archives for path1/x.zip>path2/y in readbytes, readstream, 
+    writestream and writebytes, to read or append many entries in one session, 
+    used as `with zippool_t(): ...`, and the archives are closed at exit
+    """
+
+    current: "zippool_t" = None # the active pool
+
+    def __init__(self):
+        self.archives: Dict[str, zipfile.ZipFile] = dict()
+        self.prev: zippool_t = None
+
+    def open(self, path: str, mode='r') -> zipfile.ZipFile:
+        if self.prev is not None: return self.prev.open(path, mode) # nested
+        key = os.path.abspath(path)
+        fp = self.archives.get(key)
+        if fp is not None and (mode == 'r' or fp.mode != 'r'): return fp
+        if fp is not None: fp.close() # reopen readonly archive to append
+        fp = self.archives[key] = zipfile.ZipFile(path, mode)
+        return fp
+
+    def close(self):
+        for fp in self.archives.values(): fp.close()
+        self.archives.clear()
+
+    def __enter__(self) -> "zippool_t":
+        self.prev, zippool_t.current = zippool_t.current, self
+        return self
+
+    def __exit__(self, *exc):
+        zippool_t.current, self.prev = self.prev, None
+        self.close()
+
+@contextmanager
+def openzip(path: str, mode='r'):
+    """
+    open the zip archive from the active zippool_t, or open and close directly
+    """
+
+    if zippool_t.current is not None: 
+        yield zippool_t.current.open(path, mode)
+    else:
+        with zipfile.ZipFile(path, mode) as fp:
+            yield fp
+
+@contextmanager
+def readstream(inobj: Union[str, BytesIO]):
+    """
+    open the stream to read, for path, path.gz, path1/x.zip>path2/y or io
+    """
+
+    if type(inobj) != str: # io
+        yield inobj
+    elif os.path.splitext(inobj)[1]==".gz":
+        with gzip.GzipFile(inobj, 'rb') as fp: 
+            yield fp
+    elif ".zip>" in inobj:
+        path1, path2 = inobj.split(".zip>")
         path2 = path2.replace('\\', '/')
-        with zipfile.ZipFile(path1 + ".zip", 'a') as fp1:
+        with openzip(path1 + ".zip", 'r') as fp1:
+            with fp1.open(path2, 'r') as fp2:
+                yield fp2
+    else:
+        with open(inobj, 'rb') as fp:
+            yield fp
+
+@contextmanager
+def writestream(outobj: Union[str, BytesIO], size: int=None):
+    """
+    open the stream to write, for path, path.gz, path1/x.zip>path2/y or io,
+    path and path.gz are written to a temp file replacing outobj at the end,
+    so the old file (might be still read) is kept if failed
+    :param size: the size to write in zip, None for unknown (force zip64)
+    """
+
+    if type(outobj) != str: # io
+        yield outobj
+    elif ".zip>" in outobj:
+        path1, path2 = outobj.split(".zip>")
+        path2 = path2.replace('\\', '/')
+        with openzip(path1 + ".zip", 'a') as fp1:
             now = datetime.now()
             info = zipfile.ZipInfo(filename=path2, date_time= \
                     (now.year, now.month, now.day, now.hour, now.minute, now.second))
-            fp1.writestr(info, data)
-            return len(data)
-    
-    def save_direct(path, data) -> int:
-        with open(path, 'wb') as fp:
-            return fp.write(data)
-        
+            if size is not None: info.file_size = size
+            with fp1.open(info, 'w', force_zip64=size is None) as fp2: 
+                yield fp2
+    else:
+        tmppath = f"{outobj}.{os.getpid()}.tmp"
+        try:
+            with open(tmppath, 'wb') as fp:
+                if os.path.splitext(outobj)[1]==".gz":
+                    with gzip.GzipFile(outobj, 'wb', fileobj=fp) as fp2: 
+                        yield fp2
+                else: yield fp
+            os.replace(tmppath, outobj)
+        finally:
+            if os.path.exists(tmppath): os.remove(tmppath)
+
+def writebytes(outobj: Union[str, BytesIO], dataobj: Union[bytes, BytesIO]) -> int:
     if type(dataobj) in {bytes, bytearray, memoryview}: data = dataobj
     else: data = dataobj.read() 
-    
-    size = 0
-    if type(outobj)==str:
-        path = outobj
-        if os.path.splitext(outobj)[1]==".gz": size = save_gz(path, data)
-        elif ".zip>" in outobj: size = save_zip(path, data)
-        else: size = save_direct(path, data)
-    else: size = outobj.write(data)
-    return size
+    with writestream(outobj, len(data)) as fp:
+        return fp.write(data)
 
 def readimage(inobj: Union[bytes, str], pixel_format=None, img_format=None, palette=None):
     """
@@ -144,9 +237,18 @@ def writeimage(outobj: Union[str, BytesIO], img, pixel_format=None, img_format="
     bufio.close()
     return writebytes(outobj, data)
 
+def samefile(path1: str, path2: str) -> bool:
+    """
+    whether two paths are the same file, or the same real path if not exist
+    """
+
+    try: return os.path.samefile(path1, path2)
+    except (OSError, ValueError): return os.path.realpath(path1) == os.path.realpath(path2)
+
 def filter_loadfiles(targets: Union[int, str, List]=None):
     """
     :params targets: can be 0, 'k', [0], [(0, 'utf8', 'ignore', False), 'k'], 
+        (0, 'mmap') for readonly mmap buffer, closed after the function
     """
     
     if targets == None: targets = [0]
@@ -155,16 +257,30 @@ def filter_loadfiles(targets: Union[int, str, List]=None):
     def wrapper1(func): # decorator(dec_args)(func)(fun_args)
         def wrapper2(*_args, **kw):
             args = list(_args)
+            maps = []
+            keys = set(t[0] if type(t)==tuple else t for t in targets)
+            others = [v for i, v in enumerate(args) if i not in keys and type(v)==str] + \
+                    [v for k, v in kw.items() if k not in keys and type(v)==str]
             for i, t in enumerate(targets):
                 w = None # for args or kw
                 t0 = t[0] if type(t)==tuple else t # for index
                 t1 = t[1:] if type(t)==tuple else None # for encoding, encoding_error
-                if type(t0)==int and type(args[t0])==str: w=args
-                elif type(t0)==str and t in kw and type(kw[t0]) == str: w=kw
+                if type(t0)==int and t0 < len(args) and type(args[t0])==str: w=args
+                elif type(t0)==str and t0 in kw and type(kw[t0]) == str: w=kw
                 if w is None: continue # no target arg
+                if t1 == ("mmap", ): # not map the file might be written, such as outpath
+                    use_mmap = not any(samefile(w[t0], v) for v in others)
+                    w[t0] = readbytes(w[t0], use_mmap=use_mmap)
+                    if type(w[t0]) == mmap.mmap: maps.append(w[t0])
+                    continue
                 data = readbytes(w[t0])
                 w[t0] = readlines(data, *t1) if t1 else data
-            return func(*args, **kw)
+            try: return func(*args, **kw)
+            finally: 
+                args = kw = w = None
+                for m in maps:
+                    try: m.close()
+                    except BufferError: pass # still used in return value
         return wrapper2
     return wrapper1
 
@@ -198,11 +314,178 @@ class ftext_t:
     size: int = 0
     text: str = ""
 
+class ftextview_t:
+    """
+    a row view of ftexttable_t, used as ftext_t
+    """
+
+    __slots__ = ("table", "index")
+
+    def __init__(self, table: "ftexttable_t", index: int):
+        self.table, self.index = table, index
+
+    def _column(name):
+        def fget(self): return getattr(self.table, name)[self.index]
+        def fset(self, v): getattr(self.table, name)[self.index] = v
+        return property(fget, fset)
+    addr = _column("addrs")
+    size = _column("sizes")
+    text = _column("texts")
+    del _column
+
+    def __eq__(self, other):
+        if not all(hasattr(other, k) for k in ("addr", "size", "text")): return NotImplemented
+        return (self.addr, self.size, self.text) == (other.addr, other.size, other.text)
+
+    def __repr__(self):
+        return f"ftextview_t(addr={self.addr!r}, size={self.size!r}, text={self.text!r})"
+
+class ftexttable_t:
+    """
+    columnar ftexts, addrs and sizes in array('q'), texts in list,
+    used as List[ftext_t] by iterating ftextview_t rows, 
+    views follow the index, so they are changed after sort
+    """
+
+    def __init__(self, ftexts: List[ftext_t]=(), *, addrs=None, sizes=None, texts=None):
+        if addrs is None:
+            ftexts = list(ftexts)
+            addrs = [t.addr for t in ftexts]
+            sizes = [t.size for t in ftexts]
+            texts = [t.text for t in ftexts]
+        self.addrs = array('q', addrs)
+        self.sizes = array('q', sizes)
+        self.texts: List[str] = list(texts)
+        if not len(self.addrs) == len(self.sizes) == len(self.texts):
+            raise ValueError(f"column size not match [addrs={len(self.addrs)} "
+                f"sizes={len(self.sizes)} texts={len(self.texts)}]")
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __getitem__(self, i: Union[int, slice]) -> Union[ftextview_t, "ftexttable_t"]:
+        if type(i) == slice: 
+            return ftexttable_t(addrs=self.addrs[i], sizes=self.sizes[i], texts=self.texts[i])
+        n = len(self.texts)
+        if i < -n or i >= n: raise IndexError(f"ftexttable_t index out of range [i={i} n={n}]")
+        return ftextview_t(self, i % n)
+
+    def __iter__(self):
+        return map(ftextview_t, repeat(self), range(len(self.texts)))
+
+    def __eq__(self, other):
+        if type(other) == ftexttable_t: 
+            return (self.addrs, self.sizes, self.texts) == (other.addrs, other.sizes, other.texts)
+        try: return len(self) == len(other) and all(t1 == t2 for t1, t2 in zip(self, other))
+        except TypeError: return NotImplemented
+
+    def __repr__(self):
+        return f"ftexttable_t(n={len(self)})"
+
+    def append(self, t: ftext_t):
+        self.addrs.append(t.addr)
+        self.sizes.append(t.size)
+        self.texts.append(t.text)
+
+    def extend(self, ftexts: List[ftext_t]):
+        if type(ftexts) != ftexttable_t: ftexts = ftexttable_t(ftexts)
+        self.addrs.extend(ftexts.addrs)
+        self.sizes.extend(ftexts.sizes)
+        self.texts.extend(ftexts.texts)
+
+    def argsort(self, key: Union[str, Callable[[ftext_t], object]]="addr", reverse=False) -> List[int]:
+        """
+        :param key: column name "addr", "size", "text" or f(ftext_t)
+        :return: stable sorted indexs
+        """
+
+        if type(key) == str: f = getattr(self, key + "s").__getitem__
+        else: f = lambda i: key(ftextview_t(self, i))
+        return sorted(range(len(self.texts)), key=f, reverse=reverse)
+
+    def take(self, idxs: List[int]) -> "ftexttable_t":
+        return ftexttable_t(addrs=map(self.addrs.__getitem__, idxs), 
+            sizes=map(self.sizes.__getitem__, idxs), texts=map(self.texts.__getitem__, idxs))
+
+    def sort(self, key: Union[str, Callable[[ftext_t], object]]="addr", reverse=False):
+        t = self.take(self.argsort(key, reverse))
+        self.addrs, self.sizes, self.texts = t.addrs, t.sizes, t.texts
+
+    def tolist(self) -> List[ftext_t]:
+        return list(map(ftext_t, self.addrs, self.sizes, self.texts))
+
 @dataclass
 class tbl_t:
     tcode : bytes = b""
     tchar : str = ""
 
+class tblmap_t(list):
+    """
+    compiled tbl handle, used as List[tbl_t] and compiled at first use, 
+    1, 2 bytes tcode in flat array, longer tcode in dict masked by first byte,
+    list changes make it recompile, call invalidate if tbl_t is changed inplace
+    """
+
+    def __init__(self, tbl: List[tbl_t]=()):
+        super().__init__(tbl)
+        self.invalidate()
+
+    def invalidate(self):
+        self.compiled = False
+        self.lut = None # the cache for other accelerating tables
+
+    def compile(self) -> "tblmap_t":
+        if self.compiled: return self
+        self.tcodes = [t.tcode for t in self]
+        self.tchars = [t.tchar for t in self]
+        self.tcodemap = dict((t.tcode, i) for i, t in enumerate(self))
+        self.tcharmap = dict((t.tchar, i) for i, t in enumerate(self))
+        self.maxlen = max((len(t.tcode) for t in self), default=0)
+        self.code1 = array('i', [-1]) * 0x100
+        self.code2 = array('i', [-1]) * 0x10000 if self.maxlen > 1 else None
+        self.leadmask = [0] * 0x100 # bit (j-1) for tcode length j > 2
+        for tcode, idx in self.tcodemap.items():
+            if len(tcode) == 1: self.code1[tcode[0]] = idx
+            elif len(tcode) == 2: self.code2[(tcode[0] << 8) + tcode[1]] = idx
+            elif len(tcode) > 2: self.leadmask[tcode[0]] |= 1 << (len(tcode) - 1)
+        md5 = hashlib.md5()
+        for t in self: md5.update(t.tcode.hex().encode() + b'=' + t.tchar.encode('utf-8') + b'\n')
+        self.digest = md5.hexdigest()
+        self.compiled = True
+        return self
+
+    def match(self, data, i: int, n: int) -> Tuple[int, int]:
+        """
+        match the shortest tcode at data[i: n], should compile before
+        :return: tbl index and tcode length, (-1, 0) if not find
+        """
+
+        c = data[i]
+        idx = self.code1[c]
+        if idx >= 0: return idx, 1
+        if self.code2 is not None and i + 1 < n:
+            idx = self.code2[(c << 8) + data[i+1]]
+            if idx >= 0: return idx, 2
+        mask = self.leadmask[c]
+        if mask:
+            for j in range(3, min(self.maxlen, n - i) + 1):
+                if not mask >> (j-1) & 1: continue
+                idx = self.tcodemap.get(bytes(data[i: i+j]), -1)
+                if idx >= 0: return idx, j
+        return -1, 0
+
+def _tblmap_modify(name):
+    f = getattr(list, name)
+    def wrapper(self, *args, **kw):
+        self.invalidate()
+        return f(self, *args, **kw)
+    wrapper.__name__ = name
+    return wrapper
+
+for _name in ["__setitem__", "__delitem__", "__iadd__", "__imul__", "append", 
+        "extend", "insert", "pop", "remove", "clear", "sort", "reverse"]:
+    setattr(tblmap_t, _name, _tblmap_modify(_name))
+
 @dataclass
 class jtable_t: # jump table
     addr: int = 0
@@ -210,6 +493,33 @@ class jtable_t: # jump table
     toaddr: int = 0
     toaddr_new: int = 0
 
+class shiftmap_t:
+    """
+    cumulative shift of insertions, offset >= addrs[i] is moved by shifts[i],
+    used for relocating jump tables or other pointers after insertion
+    """
+
+    def __init__(self):
+        self.addrs: List[int] = [] # ascending
+        self.shifts: List[int] = []
+
+    def add(self, addr: int, shift: int):
+        # the later insertion overrides the offsets after it
+        while self.addrs and self.addrs[-1] >= addr: 
+            self.addrs.pop()
+            self.shifts.pop()
+        self.addrs.append(addr)
+        self.shifts.append(shift)
+
+    def __call__(self, offset: int) -> int:
+        i = bisect_right(self.addrs, offset) - 1
+        return offset + self.shifts[i] if i >= 0 else offset
+
+    def relocate(self, jump_table: List[jtable_t]) -> List[jtable_t]:
+        for t in jump_table:
+            t.addr_new, t.toaddr_new = self(t.addr), self(t.toaddr)
+        return jump_table
+
 @dataclass
 class tile_t:
     w: int
@@ -277,37 +587,166 @@ def save_ftext(ftexts1: List[ftext_t], ftexts2: List[ftext_t],
 
     return lines 
 
-@filter_loadfiles(0)
-def load_ftext(inobj: Union[str, List[str], Tuple], *, 
-        encoding="utf-8") -> Tuple[List[ftext_t], List[ftext_t]]:
+def save_ftext_iter(pairs: Iterable[Tuple[ftext_t, ftext_t]], outobj: Union[str, BytesIO], *, 
+        encoding="utf-8", width_index = (5, 6, 3)) -> int:
     """
-    format text, such as ●num|addr|size● text
-    :param inobj: can be path, or lines[], in the end, no \r \n
-    :return: ftexts1[]: text dict array in '○' line, 
-             ftexts2[]: text dict array in '●' line
+    write (org, now) pairs as ftext lines incrementally, in constant memory 
+    :param outobj: path, path.gz, path1/x.zip>path2/y or binary io
+    :param width_index: fixed width of num|addr|size, 0 is not supported
+    :return: count of pairs
     """
 
-    if inobj==None: return None
-    if type(inobj) == tuple: return inobj
-    ftexts1, ftexts2 = [], []
-    lines = readlines(inobj, encoding, "ignore", False) if type(inobj) != list else inobj
-    if len(lines) > 0: lines[0] = lines[0].lstrip("\ufeff") # remove bom
-    for line in lines:
+    if 0 in width_index: raise ValueError(f"width 0 not supported in stream [width_index={width_index}]")
+    width_num, width_addr, width_size = width_index
+    fstr1 = "○{num:0%dd}|{addr:0%dX}|{size:0%dX}○ {text}\n" \
+            % (width_num, width_addr, width_size)
+    fstr2 = fstr1.replace('○', '●')
+    n = 0
+    with writestream(outobj) as fp:
+        for n, (t1, t2) in enumerate(pairs, 1):
+            line = fstr1.format(num=n-1, addr=t1.addr, size=t1.size, text=t1.text) if t1 else ""
+            if t2: line += fstr2.format(num=n-1, addr=t2.addr, size=t2.size, text=t2.text)
+            fp.write((line + "\n").encode(encoding, "ignore"))
+    return n
+
+def parse_ftextlines(lines: Iterable[str]) -> Iterator[Tuple[str, int, int, str]]:
+    """
+    parse ftext lines, such as ●num|addr|size● text
+    :return: (indicator, addr, size, text), addr -1 and size 0 if invalid
+    """
+
+    for i, line in enumerate(lines):
+        if i == 0: line = line.lstrip("\ufeff") # remove bom
         if len(line) <= 0: continue
         indicator = line[0]
         if indicator == "#": continue
         if indicator not in {"○", "●"}: continue
         _, t1, *t2 = line.split(indicator)
         t2 = "".join(t2)
-        ftext = ftext_t(-1, 0, t2[1:])
+        addr, size = -1, 0
         try: 
             _, t12, t13 = t1.split('|')
-            ftext.addr, ftext.size = int(t12, 16), int(t13, 16)
+            addr, size = int(t12, 16), int(t13, 16)
         except ValueError: pass 
-        if indicator=='○': ftexts1.append(ftext)
-        else: ftexts2.append(ftext)
+        yield indicator, addr, size, t2[1:]
+
+def load_ftext_iter(inobj: Union[str, BytesIO, Iterable[str]], *, 
+        encoding="utf-8") -> Iterator[Tuple[ftext_t, ftext_t]]:
+    """
+    lazily load ftext as (org, now) pairs, in constant memory
+    :param inobj: path, path.gz, path1/x.zip>path2/y, bytes, binary io or lines
+    :return: iterator of (ftext1, ftext2), None for the missing one in the end
+    """
+
+    if type(inobj) in {bytes, bytearray, memoryview}: inobj = BytesIO(inobj)
+    if type(inobj) == str:
+        with readstream(inobj) as fp: 
+            yield from load_ftext_iter(fp, encoding=encoding)
+        return
+    
+    wrapper = None
+    if hasattr(inobj, "read") and not isinstance(inobj, TextIOBase): 
+        inobj = wrapper = TextIOWrapper(inobj, encoding, "ignore")
+    try:
+        lines = (line.rstrip("\r\n") for line in inobj)
+        orgs, nows = deque(), deque()
+        for indicator, addr, size, text in parse_ftextlines(lines):
+            (orgs if indicator=='○' else nows).append(ftext_t(addr, size, text))
+            if orgs and nows: yield orgs.popleft(), nows.popleft()
+        yield from zip_longest(orgs, nows)
+    finally:
+        if wrapper: wrapper.detach() # not close the io from outside
+
+def load_ftext_cache(path: str, *, encoding="utf-8", 
+        as_table=False) -> Tuple[List[ftext_t], List[ftext_t]]:
+    """
+    load the sidecar cache path.ftc made by save_ftext_cache, 
+    :param as_table: return ftexttable_t from the columns directly
+    :return: None if the cache is missing or stale (path mtime, size, encoding changed)
+    """
+
+    try: 
+        st = os.stat(path)
+        with open(path + ".ftc", 'rb') as fp: data = fp.read()
+    except OSError: return None
+    fmt = "<4sqqII16s"
+    cur = struct.calcsize(fmt)
+    if len(data) < cur: return None
+    magic, mtime, size, n1, n2, enc = struct.unpack_from(fmt, data)
+    if magic != b"FTC1" or mtime != st.st_mtime_ns or size != st.st_size: return None
+    if enc.rstrip(b"\0") != encoding.encode()[:16]: return None
+    
+    n = n1 + n2
+    addrs, sizes = array('q'), array('q')
+    for arr in [addrs, sizes]:
+        arr.frombytes(data[cur: cur + 8*n])
+        if sys.byteorder == "big": arr.byteswap()
+        cur += 8*n
+    texts = str(data[cur:], "utf-8", "surrogatepass").split("\n") if n else []
+    if len(addrs) != n or len(sizes) != n or len(texts) != n: return None
+    if as_table: return tuple(ftexttable_t(addrs=addrs[s], sizes=sizes[s], texts=texts[s]) 
+        for s in [slice(None, n1), slice(n1, None)])
+    ftexts = list(map(ftext_t, addrs, sizes, texts))
+    return ftexts[:n1], ftexts[n1:]
+
+def save_ftext_cache(path: str, ftexts1: List[ftext_t], ftexts2: List[ftext_t], *, encoding="utf-8") -> int:
+    """
+    save the sidecar cache path.ftc, keyed by path mtime, size and encoding,
+    in header, addrs, sizes (int64 little endian), texts joined by line break (utf-8)
+    """
+
+    st = os.stat(path)
+    t1, t2 = [t if type(t) == ftexttable_t else ftexttable_t(t) for t in (ftexts1, ftexts2)]
+    addrs, sizes = t1.addrs + t2.addrs, t1.sizes + t2.sizes
+    if sys.byteorder == "big": 
+        for arr in [addrs, sizes]: arr.byteswap()
+    text = "\n".join(t1.texts + t2.texts)
+    if text.count("\n") != max(len(t1) + len(t2) - 1, 0): raise ValueError("ftext with line break")
+    header = struct.pack("<4sqqII16s", b"FTC1", st.st_mtime_ns, st.st_size, 
+        len(ftexts1), len(ftexts2), encoding.encode()[:16])
+    data = b"".join([header, addrs.tobytes(), sizes.tobytes(), text.encode("utf-8", "surrogatepass")])
+    tmppath = path + f".ftc.{os.getpid()}" # replace at once for batch processes
+    with open(tmppath, 'wb') as fp: fp.write(data)
+    os.replace(tmppath, path + ".ftc")
+    return len(data)
+
+def load_ftext(inobj: Union[str, bytes, List[str], Tuple], *, encoding="utf-8", 
+        cache: bool=None, as_table=False) -> Tuple[List[ftext_t], List[ftext_t]]:
+    """
+    format text, such as ●num|addr|size● text
+    :param inobj: can be path, or lines[], in the end, no \r \n
+    :param cache: use the sidecar path.ftc for direct file path,
+        None for environment FTEXT_CACHE=1
+    :param as_table: load as ftexttable_t, (tuple inobj is returned as it is)
+    :return: ftexts1[]: text dict array in '○' line, 
+             ftexts2[]: text dict array in '●' line
+    """
+
+    if inobj==None: return None
+    if type(inobj) == tuple: return inobj
+    if type(inobj) == str:
+        path = inobj
+        if cache is None: cache = os.environ.get("FTEXT_CACHE", "0") == "1"
+        cache = cache and os.path.splitext(path)[1] != ".gz" and ".zip>" not in path
+        if cache:
+            res = load_ftext_cache(path, encoding=encoding, as_table=as_table)
+            if res is not None: return res
+        res = load_ftext(readbytes(path), encoding=encoding, as_table=as_table)
+        if cache:
+            try: save_ftext_cache(path, *res, encoding=encoding)
+            except OSError: pass # such as readonly dir
+        return res
+    
+    cols1, cols2 = ([], [], []), ([], [], []) # addrs, sizes, texts
+    lines = readlines(inobj, encoding, "ignore", False) if type(inobj) != list else inobj
+    for indicator, addr, size, text in parse_ftextlines(lines):
+        cols = cols1 if indicator=='○' else cols2
+        cols[0].append(addr)
+        cols[1].append(size)
+        cols[2].append(text)
 
-    return ftexts1, ftexts2
+    if as_table: return tuple(ftexttable_t(addrs=c[0], sizes=c[1], texts=c[2]) for c in (cols1, cols2))
+    return list(map(ftext_t, *cols1)), list(map(ftext_t, *cols2))
 
 def save_tbl(tbl: List[tbl_t], outpath=None, *, encoding='utf-8')  -> List[str]:
     lines = []
@@ -324,12 +763,13 @@ def load_tbl(inobj: Union[str, List[str], List[ftext_t]], *, encoding='utf-8') -
     """
     tbl file format "tcode=tchar", 
     :param inobj: can be path, or lines[], in the end, no \r \n
-    :return: [(charcode, charstr)]
+    :return: tblmap_t [(charcode, charstr)], compiled at first use
     """
 
     if inobj==None: return None
-    if len(inobj) > 0 and hasattr(inobj[0], "tchar"): return inobj
-    tbl: List[tbl_t] = []
+    if isinstance(inobj, tblmap_t): return inobj
+    if len(inobj) > 0 and hasattr(inobj[0], "tchar"): return tblmap_t(inobj) # compile once
+    tbl = tblmap_t()
     lines = readlines(inobj, encoding, 'ignore', False) if type(inobj) != list else inobj
     for line in lines:
         if len(line) <= 0: continue
@@ -20,7 +20,7 @@ import numpy as np
 try:
     from libutil import readlines, writelines, readbytes, writebytes, filter_loadfiles, load_ftext
 except ImportError:
-    exec("from libutil_v0_6 import readlines, writelines, readbytes, writebytes, filter_loadfiles, load_ftext")
+    exec("from libutil_v0_6_9 import readlines, writelines, readbytes, writebytes, filter_loadfiles, load_ftext")
 
 # algorithms for string
 def calc_lcs(s1: str, s2: str, cache_max=256) -> int:
@@ -1,3 +1,4 @@
+import os
 import logging
 import unittest
 import tempfile
@@ -19,6 +20,28 @@ class TestJson(unittest.TestCase):
         jsonlines = ftextcvt.ftext2json(ftextlines)
         ftextlines2 = ftextcvt.json2ftext(b"".join([x.encode('utf-8') for x in jsonlines]))
         assert_lines(self, ftextlines, ftextlines2)
+    
+    def test_stream(self):
+        jsonlines = ftextcvt.ftext2json(paths_ftext["COM001"])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outpath = os.path.join(tmpdir, "a.json")
+            n = len(libutil.load_ftext(paths_ftext["COM001"])[0])
+            self.assertEqual(ftextcvt.ftext2json(paths_ftext["COM001"], outpath, return_lines=False), n)
+            self.assertEqual(libutil.readbytes(outpath), "".join(jsonlines).encode("utf-8"))
+            data = libutil.readbytes(paths_ftext["COM001"])
+            self.assertEqual(ftextcvt.ftext2json(data, outpath), jsonlines) # bytes and lines
+            self.assertEqual(libutil.readbytes(outpath), "".join(jsonlines).encode("utf-8"))
+            
+            # keep the old file if ○● not match
+            lines = libutil.readlines(libutil.readbytes(paths_ftext["COM001"]))
+            lines.pop(max(i for i, line in enumerate(lines) if line[0] == "●")) # fail at the end
+            for name in ["a.json", "a.zip>a.json"]:
+                for return_lines in [True, False]:
+                    with self.assertRaises(ValueError): 
+                        ftextcvt.ftext2json(lines, os.path.join(tmpdir, name), return_lines=return_lines)
+            self.assertEqual(libutil.readbytes(outpath), "".join(jsonlines).encode("utf-8"))
+            self.assertEqual(sorted(os.listdir(tmpdir)), ["a.json"])
+        self.assertEqual(ftextcvt.ftext2json([]), ["[]"])
 
 class TestDocx(unittest.TestCase):
     def test_file_com001(self):
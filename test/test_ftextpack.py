@@ -53,6 +53,123 @@ class TestFpack(unittest.TestCase):
             end = start + info.now.size
             self.assertEqual(zlib.crc32(buf[start: end]), info.org.hash)
 
+    def test_reader(self):
+        with open(paths_bin["COM001"], 'rb') as fp: srcdata = fp.read()
+        ftexts1, ftexts2 = libutil.load_ftext(paths_ftext["COM001"])
+        ftexts2[0].text = "test_reader"
+        for pack_sort, pack_compact in [("hash", False), ("hash", True), ("addr", False)]:
+            bufio = BytesIO()
+            ftextpack.pack_ftexts(paths_bin["COM001"], [(ftexts1, ftexts2)], bufio, 
+                encoding="sjis", pack_sort=pack_sort, pack_compact=pack_compact)
+            bufio.seek(0)
+            with ftextpack.FpackReader(bufio) as reader:
+                self.assertEqual(len(reader), len(ftexts1))
+                self.assertEqual(reader.compact, pack_compact)
+                hashs = [zlib.crc32(srcdata[t.addr: t.addr+t.size]) for t in ftexts1]
+                idxs = reader.finds(hashs + [0])
+                self.assertEqual(idxs[-1], -1)
+                for t1, t2, h, i in zip(ftexts1, ftexts2, hashs, idxs):
+                    self.assertEqual(reader.find_hash(h), i)
+                    self.assertEqual(reader.addrs[reader.find_addr(t1.addr)], t1.addr)
+                    text = reader.lookup(srcdata[t1.addr: t1.addr+t1.size])
+                    self.assertEqual(text, ftextpack.encode_extend(t2.text, "sjis"))
+                self.assertEqual(reader.find_addr(0xffffffff), -1)
+
+    def test_incremental(self):
+        ftexts1, ftexts2 = libutil.load_ftext(paths_ftext["COM001"])
+        kw = dict(encoding="sjis", pack_org=True)
+        bufio = BytesIO()
+        ftextpack.pack_ftexts(paths_bin["COM001"], [(ftexts1, ftexts2)], bufio, **kw)
+        for i in range(24): # change one text each time
+            ftexts2[i % len(ftexts2)].text += f"changed{i}"
+            bufio.seek(0)
+            bufio2 = BytesIO()
+            fpack = ftextpack.pack_ftexts(paths_bin["COM001"], 
+                [(ftexts1, ftexts2)], bufio2, pack_base=bufio, **kw)
+            fpack2 = ftextpack.pack_ftexts(paths_bin["COM001"], [(ftexts1, ftexts2)], None, **kw)
+            self.assertLessEqual(len(fpack.content), 2*len(fpack2.content)) # compacted
+            for info, info2 in zip(fpack.infos, fpack2.infos):
+                for t, t2 in [(info.org, info2.org), (info.now, info2.now)]:
+                    self.assertEqual((t.hash, t.addr, t.size), (t2.hash, t2.addr, t2.size))
+                    self.assertEqual(fpack.content[t.offset: t.offset + t.size], 
+                        fpack2.content[t2.offset: t2.offset + t2.size])
+            bufio = bufio2
+
+    def test_fp02(self):
+        self.assertEqual(ftextpack.xxh64(b""), 0xEF46DB3751D8E999)
+        self.assertEqual(ftextpack.xxh64(b"abc"), 0x44BC2CF5AD770999)
+        with open(paths_bin["COM001"], 'rb') as fp: srcdata = fp.read()
+        ftexts1, ftexts2 = libutil.load_ftext(paths_ftext["COM001"])
+        for pack_hash in ["crc32", "xxh64"]:
+            self.assertRaises(ValueError, ftextpack.pack_ftexts, paths_bin["COM001"], [(ftexts1, ftexts2)], 
+                None, encoding="sjis", pack_format="fp02", pack_hash=pack_hash, pack_sort="addr")
+            for pack_compact in [False, True]:
+                bufio = BytesIO()
+                ftextpack.pack_ftexts(paths_bin["COM001"], [(ftexts1, ftexts2)], bufio,
+                    encoding="sjis", pack_format="fp02", pack_hash=pack_hash, pack_compact=pack_compact)
+                with ftextpack.FpackReader(bufio.getvalue()) as reader:
+                    self.assertEqual((reader.version, reader.hashtype), ("fp02", pack_hash))
+                    self.assertIsNotNone(reader.buckets)
+                    for t1, t2 in zip(ftexts1, ftexts2):
+                        text = reader.lookup(srcdata[t1.addr: t1.addr + t1.size])
+                        self.assertEqual(text, ftextpack.encode_extend(t2.text, "sjis"))
+                    self.assertEqual(reader.lookup(b"not exist"), None)
+
+    def test_collision(self): # fp01 finds by crc only, not crc and size
+        data1, data2 = b"t89f", b"t39c262_" # the same crc32
+        ftexts1 = [libutil.ftext_t(0, len(data1), "a"), libutil.ftext_t(len(data1), len(data2), "b")]
+        ftexts2 = [libutil.ftext_t(0, len(data1), "c"), libutil.ftext_t(len(data1), len(data2), "d")]
+        for pack_format, warned in [("fp01", True), ("fp02", False)]:
+            with self.assertLogs(level=logging.INFO) as cm:
+                ftextpack.pack_ftexts([data1 + data2], [(ftexts1, ftexts2)], BytesIO(), pack_format=pack_format)
+            self.assertEqual(any("hash collision" in t for t in cm.output), warned)
+
+    def test_block(self):
+        with open(paths_bin["COM001"], 'rb') as fp: srcdata = fp.read()
+        ftexts1, ftexts2 = libutil.load_ftext(paths_ftext["COM001"])
+        for pack_block in [0x10, 0x10000]: # text in multi blocks, single block
+            bufio = BytesIO()
+            fpack = ftextpack.pack_ftexts(paths_bin["COM001"], [(ftexts1, ftexts2)], bufio,
+                encoding="sjis", pack_format="fp02", pack_org=True, pack_block=pack_block)
+            with ftextpack.FpackReader(bufio.getvalue(), cache_block=2) as reader:
+                self.assertEqual(reader.blocksize, pack_block)
+                self.assertEqual(reader.content(), fpack.content)
+                for t1, t2 in zip(ftexts1, ftexts2):
+                    text = reader.lookup(srcdata[t1.addr: t1.addr + t1.size])
+                    self.assertEqual(text, ftextpack.encode_extend(t2.text, "sjis"))
+                self.assertLessEqual(len(reader.cached), 2)
+
+    def test_merge(self):
+        with open(paths_bin["COM001"], 'rb') as fp: srcdata = fp.read()
+        ftexts1, ftexts2 = libutil.load_ftext(paths_ftext["COM001"])
+        ftexts2[1].text = ftexts2[0].text # same
+        ftexts2[2].text = ftexts2[0].text[2:] # suffix
+        sizes = dict()
+        for pack_merge in ["none", "same", "tail"]:
+            fpack = ftextpack.pack_ftexts(paths_bin["COM001"], [(ftexts1, ftexts2)], None,
+                encoding="sjis", pack_org=True, pack_merge=pack_merge)
+            sizes[pack_merge] = len(fpack.content)
+            offsets = set(info.now.offset for info in fpack.infos)
+            self.assertEqual(len(offsets), len(fpack.infos) - (pack_merge != "none")) # suffix in other offset
+            for info in fpack.infos:
+                t = ftexts2[[t.addr for t in ftexts1].index(info.org.addr)]
+                now, org = info.now, info.org
+                self.assertEqual(fpack.content[now.offset: now.offset + now.size + 1],
+                    ftextpack.encode_extend(t.text, "sjis") + b"\x00")
+                self.assertEqual(fpack.content[org.offset: org.offset + org.size],
+                    srcdata[org.addr: org.addr + org.size])
+        self.assertLess(sizes["tail"], sizes["same"])
+        self.assertLess(sizes["same"], sizes["none"])
+
+    def test_jobs(self):
+        binpaths = [paths_bin["COM001"]] * 3
+        ftextpaths = [paths_ftext["COM001"]] * 3
+        for kw in [dict(pack_org=True), dict(pack_nodup=True, pack_compact=True)]:
+            bufio1, bufio2 = BytesIO(), BytesIO()
+            ftextpack.pack_ftexts(binpaths, ftextpaths, bufio1, encoding="sjis", **kw)
+            ftextpack.pack_ftexts(binpaths, ftextpaths, bufio2, encoding="sjis", jobs=2, **kw)
+            self.assertEqual(bufio1.getvalue(), bufio2.getvalue())
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.WARNING, format="%(levelname)s:%(funcName)s: %(message)s")
     unittest.main()
\ No newline at end of file
@@ -1,8 +1,11 @@
+import math
 import time
 import logging
 import unittest
 import numpy as np
 import tempfile
+from unittest import mock
+from io import BytesIO
 
 from common import *
 import libimage
@@ -19,6 +22,17 @@ class TestIndexPattern(unittest.TestCase):
         self.assertEqual(res.shape, (4, 8))
         self.assertEqual(res[3, 3], 23)
         self.assertEqual(res[-1, -1], -1)
+
+    def test_tile_map(self):
+        self.assertTrue(np.array_equal(libimage.make_morton_pattern(8, 8), libimage.make_swizzle_pattern(3)))
+        res = libimage.make_tile_pattern(4, 2, 3, 2).ravel()
+        tilemap = libimage.make_tile_map(4, 2, 2, 3, 2)
+        self.assertTrue(np.array_equal(res[tilemap], np.arange(len(tilemap))))
+        self.assertTrue(np.array_equal(tilemap[8:], libimage.make_tile_map(4, 2, 2, 2, 2, start=1)))
+        self.assertEqual(libimage.make_tile_map.cache[(4, 2, 2, "none")].size, 8) # only the tile cached
+        res = libimage.make_switch_pattern(32, 16, 16)
+        self.assertEqual(sorted(res.ravel()), list(range(32*16)))
+        self.assertEqual(res[1, 0], 8) # 16 bytes each line in gob
         
 class TestTileImage(unittest.TestCase):
     def test_file_it(self):
@@ -55,6 +69,102 @@ class TestTileImage(unittest.TestCase):
             self.assertTrue(np.array_equal(data[:datasize], data2[:datasize]))
             # Image.fromarray(img).save("project/pyexe_libtext/build/it.png")
 
+    def test_swizzle(self):
+        rng = np.random.default_rng(0)
+        for bpp in [4, 8, 16, 32]:
+            for swizzle in ["none", "morton", "switch"]:
+                if swizzle == "switch" and bpp < 8: continue
+                tileinfo = libutil.tile_t(64, 16, bpp, 64*16*bpp//8)
+                data = rng.integers(0, 256, tileinfo.size*3, dtype=np.uint8)
+                img = libimage.decode_tile_image(data, tileinfo, ntilerow=2, swizzle=swizzle)
+                self.assertEqual(img.shape, (32, 128, 4))
+                data2 = libimage.encode_tile_image(img, tileinfo, ntiletotal=3, swizzle=swizzle)
+                self.assertTrue(np.array_equal(data, data2))
+
+    def test_bitorder(self):
+        rng = np.random.default_rng(0)
+        data = rng.integers(0, 256, (3, 33), dtype=np.uint8)
+        for bpp in [1, 2, 4]:
+            npixel = 33 * 8 // bpp
+            for msb in [False, True]:
+                values = np.zeros((3, npixel), dtype=np.uint8)
+                libimage.unpack_bits(data, bpp, msb, values)
+                data2 = np.zeros_like(data)
+                libimage.pack_bits(values, bpp, msb, data2)
+                self.assertTrue(np.array_equal(data, data2))
+                if bpp == 1: 
+                    bits = np.unpackbits(data, axis=1, bitorder="big" if msb else "little")
+                    self.assertTrue(np.array_equal(values, bits))
+            tileinfo = libutil.tile_t(8, 8, bpp, 8*8*bpp//8)
+            tiledata = data[:, :tileinfo.size].ravel()
+            img = libimage.decode_tile_image(tiledata, tileinfo, ntilerow=3, bitorder="msb")
+            data2 = libimage.encode_tile_image(img, tileinfo, bitorder="msb")
+            self.assertTrue(np.array_equal(tiledata, data2))
+
+    def test_tiles(self): # the api wrappers of tile map
+        rng = np.random.default_rng(0)
+        palette = rng.integers(0, 256, (16, 4), dtype=np.uint8)
+        for bpp, size, p in [(4, 32, palette), (8, 64, np.zeros((1, 4), dtype=np.uint8)), (32, 256, palette[:1])]:
+            tileinfo = libutil.tile_t(8, 8, bpp, size)
+            tiledata = rng.integers(0, 256, size * 6, dtype=np.uint8)
+            img = libimage.decode_tile_image(tiledata, tileinfo, ntilerow=3, palette=p)
+            img2 = np.zeros_like(img)
+            libimage.decode_tiles(tiledata, size, 8, 8, bpp, p, img2)
+            self.assertTrue(np.array_equal(img, img2))
+            tiledata2 = np.zeros_like(tiledata)
+            libimage.encode_tiles(tiledata2, size, 8, 8, bpp, p, img)
+            self.assertTrue(np.array_equal(libimage.encode_tile_image(img, tileinfo, palette=p), tiledata2))
+
+    def test_partial_row(self): # the image height is not the multiple of tile height
+        tileinfo = libutil.tile_t(8, 8, 8, 64)
+        img = np.random.default_rng(0).integers(0, 256, (12, 16, 4), dtype=np.uint8)
+        tiledata = libimage.encode_tile_image(img, tileinfo)
+        self.assertEqual(len(tiledata), 3 * 64)
+        img2 = libimage.decode_tile_image(tiledata, tileinfo, ntilerow=2)
+        self.assertTrue(np.array_equal(img2[:8, :, 3], img[:8, :, 3]))
+        self.assertTrue(np.array_equal(img2[8:12, :8, 3], img[8:, :8, 3])) # the 3rd tile
+        self.assertFalse(img2[12:].any()) # zero padded
+        bufio = BytesIO()
+        with libimage.pngwriter_t(bufio, 16, 12) as writer: writer.write(img)
+        bufio2 = BytesIO()
+        libimage.encode_tile_stream(BytesIO(bufio.getvalue()), tileinfo, bufio2)
+        self.assertEqual(bufio2.getvalue(), tiledata.tobytes())
+
+    def test_stream(self):
+        rng = np.random.default_rng(0)
+        tileinfo = libutil.tile_t(16, 8, 4, 64)
+        data = rng.integers(0, 256, 64*37, dtype=np.uint8) # the last tile row not full
+        palette = rng.integers(0, 256, (16, 4), dtype=np.uint8)
+        img = libimage.decode_tile_image(data, tileinfo, ntilerow=5, palette=palette, swizzle="morton")
+        bufio = BytesIO()
+        shape = libimage.decode_tile_stream(data, tileinfo, bufio, ntilerow=5, 
+                    palette=palette, swizzle="morton", nstrip=2)
+        self.assertEqual(shape, img.shape)
+        self.assertTrue(np.array_equal(libutil.readimage(BytesIO(bufio.getvalue())), img))
+        with libimage.pngreader_t(BytesIO(bufio.getvalue())) as reader:
+            img2 = np.concatenate([reader.read(7) for i in range(math.ceil(img.shape[0] / 7))])
+            self.assertEqual(len(reader.buf), 0) # only the rows read are decompressed
+        self.assertTrue(np.array_equal(img2, img))
+        bufio2 = BytesIO()
+        size = libimage.encode_tile_stream(BytesIO(bufio.getvalue()), tileinfo, bufio2, 
+                    palette=palette, ntiletotal=37, swizzle="morton", nstrip=3)
+        self.assertEqual(size, len(data))
+        self.assertTrue(np.array_equal(np.frombuffer(bufio2.getvalue(), dtype=np.uint8), data))
+
+        # failed in writing, not leave the png
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outpath = os.path.join(tmpdir, "a.png")
+            with self.assertRaises(ValueError):
+                with libimage.pngwriter_t(outpath, 8, 8) as writer:
+                    writer.write(np.zeros((4, 8, 4), dtype=np.uint8))
+                    raise ValueError("decode failed")
+            self.assertEqual(os.listdir(tmpdir), [])
+            libutil.writebytes(outpath, bufio.getvalue())
+            with self.assertRaises(ValueError):
+                with libimage.pngwriter_t(outpath, 8, 8) as writer: raise ValueError("decode failed")
+            self.assertEqual(os.listdir(tmpdir), ["a.png"])
+            self.assertEqual(libutil.readbytes(outpath), bufio.getvalue())
+
 class TestPalatteImage(unittest.TestCase):
     def test_example_index4(self):
         palatte = libimage.make_linear_palette(4)
@@ -71,6 +181,48 @@ class TestPalatteImage(unittest.TestCase):
         self.assertEqual(img1.shape,  img3.shape)
         self.assertTrue(np.array_equal(img1[..., 3], img3[..., 3]))
 
+    def test_quantize(self):
+        rng = np.random.default_rng(0)
+        y, x = np.mgrid[0:128, 0:128] * 2
+        img = np.stack([x, y, 255 - x, np.full_like(x, 255)], -1) + rng.integers(-8, 8, (128, 128, 4))
+        img = np.clip(img, 0, 255).astype(np.uint8)
+        for bpp, mse in [(4, 400), (8, 50)]:
+            palette = libimage.quantize_palette(img, bpp, nsample=0x1000)
+            self.assertEqual(palette.shape, (2**bpp, 4))
+            self.assertTrue(np.array_equal(palette, libimage.quantize_palette(img, bpp, nsample=0x1000)))
+            idx = libimage.encode_alpha_palette(img, palette)[..., 3]
+            self.assertLess(np.mean((palette[idx].astype(np.float32) - img) ** 2), mse)
+        palette = libimage.quantize_palette(img, 4, niter=0) # median cut only
+        self.assertEqual(palette.shape, (16, 4))
+        self.assertRaises(ValueError, libimage.quantize_palette, img, 4, method="octree")
+
+    def test_palette_lut(self):
+        rng = np.random.default_rng(0)
+        for n in [4, 64, 256]:
+            palette = rng.integers(0, 256, (n, 4), dtype=np.uint8)
+            palette[1] = palette[0] # the first one for same color
+            img = rng.integers(0, 256, (24, 24, 4), dtype=np.uint8)
+            img[::3, ::2] = palette[rng.integers(0, n, (8, 12))]
+            img2 = libimage.encode_alpha_palette(img, palette)
+            for y in range(img.shape[0]):
+                for x in range(img.shape[1]):
+                    idx = libimage.find_palette(palette, img[y, x])
+                    self.assertEqual(img2[y, x, 3], idx)
+                    dists = np.abs(palette.astype(np.int32) - img[y, x]).sum(axis=1)
+                    self.assertEqual(idx, np.argmin(dists))
+
+        # the lut made once for all chunks
+        tileinfo = libutil.tile_t(8, 8, 8, 64)
+        img = rng.integers(0, 256, (136, 0x2000, 4), dtype=np.uint8) # 2 chunks of 0x100000 pixels
+        lut = libimage.make_palette_lut(palette, 3)
+        self.assertTrue(np.array_equal(libimage.encode_alpha_palette_lut(img, palette, lut), 
+            libimage.encode_alpha_palette(img, palette)))
+        with mock.patch.object(libimage, "make_palette_lut", wraps=libimage.make_palette_lut) as f:
+            tiledata = libimage.encode_tile_image(img, tileinfo, palette=palette)
+            self.assertEqual(f.call_count, 1)
+        self.assertTrue(np.array_equal(tiledata, libimage.encode_tiles_map(img, tileinfo, 
+            libimage.make_tile_map(8, 8, 8, len(tiledata) // 64, img.shape[1] // 8), palette)))
+
     def test_403_saveload(self):
         tmpfp = tempfile.NamedTemporaryFile("wb+")
         
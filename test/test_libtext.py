@@ -1,4 +1,8 @@
+import os
+import gzip
 import logging
+import zipfile
+import tempfile
 import unittest
 from copy import deepcopy
 
@@ -19,6 +23,27 @@ class TestConvert(unittest.TestCase):
         text2 = libtext.decode_tbl(data, tbl)
         self.assertEqual(text.replace("你", "#"), text2)
 
+    def test_example_tbl(self):
+        tbl = [libtext.tbl_t(b'a', 'a'), libtext.tbl_t(b'\x81\x40', 'b'), 
+            libtext.tbl_t(b'\x81\x41\x42', 'c')]
+        data = b'a\x81\x40\x81\x41\x42'
+        self.assertEqual(libtext.decode_tbl(data, tbl), "abc")
+        self.assertEqual(libtext.decode_tbl(data + b'\x81', tbl, "?"), "abc?")
+        self.assertEqual(libtext.detect_text_tbl(data + b'\xff' + data, tbl), ([0, 7], [6, 6]))
+        self.assertEqual(libtext.find_tbl(b'\x81\x41\x42', tbl), 2)
+        self.assertEqual(libtext.find_tbl('b', tbl), 1)
+        self.assertIs(libtext.compile_tbl(tbl), libtext.compile_tbl(tbl))
+        tbl[1] = libtext.tbl_t(b'\x81\x40', 'd') # changed inplace
+        libtext.compile_tbl(tbl, invalidate=True)
+        self.assertEqual(libtext.decode_tbl(data, tbl), "adc")
+        tbl.append(libtext.tbl_t(b'\x82', 'e'))
+        self.assertEqual(libtext.decode_tbl(data + b'\x82', tbl), "adce")
+        tblmap = libtext.load_tbl(tbl)
+        self.assertIsInstance(tblmap, libtext.tblmap_t)
+        self.assertIs(libtext.load_tbl(tblmap), tblmap)
+        tblmap[0] = libtext.tbl_t(b'a', 'f')
+        self.assertEqual(libtext.decode_tbl(data, tblmap), "fdc")
+
 class TestExtract(unittest.TestCase):
     def test_file_com001(self):
         # test extract_ftexts by sjis and tbl
@@ -49,7 +74,61 @@ class TestExtract(unittest.TestCase):
         self.assertEqual(len(ftexts_gbk), len(dummys))
         for t in ftexts_gbk: self.assertEqual(t.text, text)
 
+    def test_batch(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            refpath = os.path.join(tmpdir, "ref.txt")
+            libtext.extract_ftexts(paths_bin["COM001"], refpath, encoding="sjis")
+            with open(refpath, 'rb') as fp: data = fp.read()
+            for jobs in [1, 2]:
+                names = [f"out{jobs}.zip>x/1.txt", f"out{jobs}.zip>x/2.txt", f"out{jobs}.txt"]
+                tasks = [("", [paths_bin["COM001"]], dict(outpath=os.path.join(tmpdir, name), 
+                    encoding="sjis")) for name in names]
+                self.assertTrue(libtext.run_batch("extract_ftexts", tasks, jobs))
+                self.assertEqual([t[2]["outpath"] for t in tasks], [os.path.join(tmpdir, x) for x in names])
+                with zipfile.ZipFile(os.path.join(tmpdir, f"out{jobs}.zip")) as fp:
+                    for name in ["x/1.txt", "x/2.txt"]: self.assertEqual(fp.read(name), data)
+                with open(os.path.join(tmpdir, f"out{jobs}.txt"), 'rb') as fp: self.assertEqual(fp.read(), data)
+            for name in ["out.txt", "out.zip>1.txt"]: # only zip entry returned to write by the caller
+                outpath = os.path.join(tmpdir, name)
+                status, _, _, size, data2 = libtext._batch_worker("extract_ftexts", 
+                    [paths_bin["COM001"]], dict(outpath=outpath, encoding="sjis"))
+                self.assertEqual((status, size), ("ok", len(data)))
+                self.assertEqual(data2, None if ".zip>" not in name else data)
+            self.assertFalse(os.path.exists(os.path.join(tmpdir, "out.zip")))
+
+    def test_example_backend(self):
+        text = "湧き出る温泉と豊かな自然に包まれた風光明媚な地で"
+        data = b'\xff\x81'.join(text.encode(enc) + b'\x00\xe3\x81' for enc in ['utf8', 'sjis', 'gbk'])
+        with open(paths_bin["COM001"], 'rb') as fp: data += fp.read()
+        tbl = libtext.load_tbl(paths_tbl["COM001"])
+        for min_len in [1, 2, 3]:
+            self.assertEqual(libtext.detect_text_sjis(data, min_len),
+                libtext.detect_text_sjis(data, min_len, backend="numba"))
+            self.assertEqual(libtext.detect_text_utf8(data, min_len),
+                libtext.detect_text_utf8(data, min_len, backend="numba"))
+            self.assertEqual(libtext.detect_text_multichar(data, "gbk", min_len),
+                libtext.detect_text_multichar(data, "gbk", min_len, backend="numba"))
+            self.assertEqual(libtext.detect_text_tbl(data, tbl, min_len),
+                libtext.detect_text_tbl(data, tbl, min_len, backend="numba"))
+
+    def test_example_parallel(self):
+        text = "湧き出る温泉と豊かな自然に包まれた風光明媚な地で"
+        data = b''.join(text[:i].encode(enc) + bytes(range(i, i*3, 7)) 
+            for i in range(len(text)) for enc in ['utf8', 'sjis', 'gbk'])
+        tbl = libtext.load_tbl(paths_tbl["COM001"])
+        for method, kw in [("sjis", {}), ("utf8", {}), ("multichar", {"encoding": "gbk"}), ("tbl", {"tbl": tbl})]:
+            f = getattr(libtext, f"detect_text_{method}")
+            self.assertEqual(f(data, min_len=2, **kw), 
+                libtext.detect_text_parallel(data, method, 2, jobs=2, chunk_size=64, **kw))
+
 class TestInsert(unittest.TestCase):
+    def test_example_refer(self):
+        data = b'ab abcde ab abcde ab'
+        for targets in [None, [b'ab', b'abcde']]:
+            f = libtext.make_addr_finder(data, targets)
+            self.assertEqual([f(b'ab'), f(b'abcde'), f(b'ab'), f(b'abcde')], [0, 3, 9, 12])
+            self.assertEqual([f(b'abcde'), f(b'ab'), f(b'ab')], [-1, 18, -1])
+
     def test_com001(self):
         with open(paths_bin["COM001"], 'rb') as fp: srcdata = fp.read()
         ftexts = libtext.load_ftext(paths_ftext["COM001"])[1]
@@ -60,6 +139,9 @@ class TestInsert(unittest.TestCase):
         data_tbl = libtext.insert_ftexts(paths_bin["COM001"], 
                         paths_ftext["COM001"], tblobj=paths_tbl["COM001"])
         self.assertEqual(data_sjis, data_tbl)
+        data_table = libtext.insert_ftexts(srcdata, libtext.load_ftext(
+            paths_ftext["COM001"], as_table=True), tblobj=paths_tbl["COM001"])
+        self.assertEqual(data_table, data_tbl)
 
         # test enc_longer, enc_align
         text_added = "text_added試験"
@@ -93,6 +175,70 @@ class TestInsert(unittest.TestCase):
         start, end = ftexts[-2].addr, ftexts[-2].addr + ftexts[-2].size 
         self.assertEqual(srcdata[start: end] , data_shorter[start + n: end + n])
 
+    def test_stream(self):
+        kw = dict(tblobj=paths_tbl["COM001"], bytes_fallback=b'\x81\x5a', insert_longer=True)
+        data = libtext.insert_ftexts(paths_bin["COM001"], paths_ftext["COM001"], **kw)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ["a.bin", "a.bin.gz", "a.zip>b/a.bin"]:
+                outpath = os.path.join(tmpdir, name)
+                self.assertIsNone(libtext.insert_ftexts(paths_bin["COM001"], 
+                    paths_ftext["COM001"], outpath, return_data=False, **kw))
+            with open(os.path.join(tmpdir, "a.bin"), 'rb') as fp: self.assertEqual(fp.read(), data)
+            with gzip.open(os.path.join(tmpdir, "a.bin.gz"), 'rb') as fp: self.assertEqual(fp.read(), data)
+            with zipfile.ZipFile(os.path.join(tmpdir, "a.zip")) as fp: self.assertEqual(fp.read("b/a.bin"), data)
+
+    def test_inplace(self):
+        kw = dict(tblobj=paths_tbl["COM001"], bytes_fallback=b'\x81\x5a')
+        data = libtext.insert_ftexts(paths_bin["COM001"], paths_ftext["COM001"], **kw)
+        ftexts = libtext.load_ftext(paths_ftext["COM001"])[1]
+        ftexts[1].text += "text_added"
+        data_longer = libtext.insert_ftexts(paths_bin["COM001"], (None, ftexts), insert_longer=True, **kw)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            outpath = os.path.join(tmpdir, "a.bin")
+            with open(paths_bin["COM001"], 'rb') as fp: srcdata = fp.read()
+            with open(outpath, 'wb') as fp: fp.write(srcdata)
+            self.assertIsNone(libtext.insert_ftexts(outpath, paths_ftext["COM001"],
+                outpath, insert_inplace=True, return_data=False, **kw))
+            with open(outpath, 'rb') as fp: self.assertEqual(fp.read(), data)
+
+            # fallback to rebuild if not fit
+            with open(outpath, 'wb') as fp: fp.write(srcdata)
+            libtext.insert_ftexts(outpath, (None, ftexts), outpath,
+                insert_inplace=True, insert_longer=True, **kw)
+            with open(outpath, 'rb') as fp: self.assertEqual(fp.read(), data_longer)
+
+            # not patch the outpath different from binobj
+            with open(outpath, 'wb') as fp: fp.write(data_longer[:len(srcdata)])
+            with self.assertRaises(ValueError):
+                libtext.insert_ftexts(paths_bin["COM001"], paths_ftext["COM001"], 
+                    outpath, insert_inplace=True, **kw)
+            with open(outpath, 'rb') as fp: self.assertEqual(fp.read(), data_longer[:len(srcdata)])
+
+            # batch patches the outpath itself
+            with open(outpath, 'wb') as fp: fp.write(srcdata)
+            tasks = [("", [outpath, paths_ftext["COM001"]], 
+                dict(outpath=outpath, insert_inplace=True, return_data=False, **kw))]
+            with self.assertLogs(level=logging.INFO) as cm:
+                self.assertTrue(libtext.run_batch("insert_ftexts", tasks))
+            self.assertIn(f"insert inplace [outpath={outpath}]", "\n".join(cm.output))
+            with open(outpath, 'rb') as fp: self.assertEqual(fp.read(), data)
+
+    def test_example_jumptable(self):
+        srcdata = b'\x00'.join(f"text{i}".encode() for i in range(10))
+        ftexts = [libtext.ftext_t(srcdata.find(f"text{i}".encode()), 5, "t"*i) for i in range(10)]
+        jump_table = [libtext.jtable_t(addr, 0, toaddr, 0) for addr, toaddr in zip(
+            range(len(srcdata)), range(len(srcdata) - 1, -1, -1))]
+        shiftmap = libtext.shiftmap_t()
+        dstdata = libtext.insert_ftexts(srcdata, (None, ftexts), insert_longer=True, 
+            insert_shorter=True, jump_table=jump_table, out_shiftmap=shiftmap)
+        for t in ftexts: # the text end is relocated to the encoded text end
+            end = shiftmap(t.addr + t.size)
+            self.assertEqual(dstdata[end - len(t.text): end], t.text.encode())
+        for t in jump_table:
+            shift = sum(len(t2.text) - t2.size for t2 in ftexts if t2.addr <= t.addr)
+            toshift = sum(len(t2.text) - t2.size for t2 in ftexts if t2.addr <= t.toaddr)
+            self.assertEqual((t.addr_new, t.toaddr_new), (t.addr + shift, t.toaddr + toshift))
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.WARNING, format="%(levelname)s:%(funcName)s: %(message)s")
     unittest.main()
\ No newline at end of file
@@ -1,10 +1,27 @@
+import os
 import codecs
 import logging
+import shutil
+import zipfile
+import tempfile
 import unittest
 
 from common import *
 import libutil
 
+class TestVersion(unittest.TestCase):
+    def test_fallback(self): # the fallback import must match the built libutil_vx_y_z.py
+        srcdir = os.path.dirname(libutil.__file__)
+        name = "libutil_v" + libutil.__version__.replace(".", "_")
+        with open("project/pysrc_all/History.md", 'r', encoding="utf-8") as fp: 
+            self.assertIn(f"v{libutil.__version__},", fp.read())
+        for fname in os.listdir(srcdir):
+            if not fname.endswith(".py") or fname == "libutil.py": continue
+            with open(os.path.join(srcdir, fname), 'r', encoding="utf-8") as fp:
+                for line in fp:
+                    if "libutil_v" not in line: continue
+                    self.assertIn(name, line, f"{fname}: {line.strip()}")
+
 class TestTbl(unittest.TestCase):
     def test_file_com001(self):
         with codecs.open(paths_tbl["COM001"], 'r', 'utf-8') as fp: 
@@ -13,6 +30,69 @@ class TestTbl(unittest.TestCase):
         lines2 = libutil.save_tbl(tbl)
         assert_lines(self, lines1, lines2)
 
+    def test_tblmap(self):
+        tbl = libutil.load_tbl(paths_tbl["COM001"])
+        self.assertIsInstance(tbl, libutil.tblmap_t)
+        tbl.compile()
+        digest = tbl.digest
+        idx, n = tbl.match(tbl[-1].tcode, 0, len(tbl[-1].tcode))
+        self.assertEqual(tbl.tchars[idx], tbl[-1].tchar)
+        self.assertEqual(n, len(tbl[-1].tcode))
+        
+        tbl.append(libutil.tbl_t(b'\xff\xff\xff', 'x'))
+        self.assertFalse(tbl.compiled)
+        self.assertNotEqual(tbl.compile().digest, digest)
+        self.assertEqual(tbl.match(b'\xff\xff\xff', 0, 3), (len(tbl) - 1, 3))
+        tbl.pop()
+        self.assertEqual(tbl.compile().digest, digest)
+
+class TestRead(unittest.TestCase):
+    def test_mmap(self):
+        with open(paths_bin["COM001"], 'rb') as fp: data = fp.read()
+        
+        @libutil.filter_loadfiles([(0, "mmap"), ("refer", "mmap")])
+        def f(binobj, outpath=None, refer=None):
+            self.assertEqual(binobj[:], data)
+            return binobj, refer
+        
+        binobj, refer = f(paths_bin["COM001"], refer=paths_bin["COM001"])
+        self.assertTrue(binobj.closed) # closed after function
+        self.assertTrue(refer.closed)
+        binobj, _ = f(paths_bin["COM001"], paths_bin["COM001"]) # conflict with outpath
+        self.assertEqual(type(binobj), bytes)
+        binobj, _ = f(paths_bin["COM001"], os.path.abspath(paths_bin["COM001"])) # the same file
+        self.assertEqual(type(binobj), bytes)
+
+    def test_writestream(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "a.bin")
+            libutil.writebytes(path, b"12345678")
+            with self.assertRaises(ValueError): # keep the old file if failed
+                with libutil.writestream(path) as fp: 
+                    fp.write(b"1234")
+                    raise ValueError("failed")
+            self.assertEqual(libutil.readbytes(path), b"12345678")
+            self.assertEqual(os.listdir(tmpdir), ["a.bin"])
+            with open(path, 'rb') as fp1, libutil.writestream(path) as fp2: # replace the file in reading
+                fp2.write(fp1.read()[::-1])
+            self.assertEqual(libutil.readbytes(path), b"87654321")
+
+    def test_zippool(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "a.zip")
+            libutil.writebytes(path + ">a.bin", b"a")
+            with libutil.zippool_t() as pool:
+                self.assertEqual(libutil.readbytes(path + ">a.bin"), b"a")
+                for i in range(16): libutil.writebytes(path + f">b/{i}.bin", bytes([i]))
+                with libutil.zippool_t(): # nested pool uses the outer
+                    self.assertEqual(libutil.readbytes(path + ">b/3.bin"), b"\x03")
+                self.assertEqual(len(pool.archives), 1)
+            self.assertIsNone(libutil.zippool_t.current)
+            self.assertEqual(len(pool.archives), 0)
+            with zipfile.ZipFile(path) as fp:
+                self.assertIsNone(fp.testzip())
+                self.assertEqual(len(fp.namelist()), 17)
+
 class TestFtext(unittest.TestCase):
     def test_file_com001(self):
         with codecs.open(paths_ftext["COM001"], 'r', 'utf-8') as fp: 
@@ -22,6 +102,52 @@ class TestFtext(unittest.TestCase):
         lines2 = libutil.save_ftext(ftexs1, ftexs2)
         assert_lines(self, lines1, lines2)
 
+    def test_table(self):
+        ftexts1, ftexts2 = libutil.load_ftext(paths_ftext["COM001"])
+        table1, table2 = libutil.load_ftext(paths_ftext["COM001"], as_table=True)
+        self.assertEqual(table1, ftexts1)
+        self.assertEqual(table2.tolist(), ftexts2)
+        self.assertEqual(table2[-1], ftexts2[-1])
+        assert_lines(self, libutil.save_ftext(table1, table2), libutil.save_ftext(ftexts1, ftexts2))
+        
+        table1[0].addr = 0x7fffffff # write back by view
+        self.assertEqual(table1.addrs[0], 0x7fffffff)
+        table1.sort("addr", reverse=True)
+        ftexts1[0].addr = 0x7fffffff
+        ftexts1.sort(key=lambda x: x.addr, reverse=True)
+        self.assertEqual(table1, ftexts1)
+        self.assertEqual(table1[1:3], ftexts1[1:3])
+
+    def test_iter(self):
+        ftexts1, ftexts2 = libutil.load_ftext(paths_ftext["COM001"])
+        pairs = list(libutil.load_ftext_iter(paths_ftext["COM001"]))
+        self.assertEqual(pairs, list(zip(ftexts1, ftexts2)))
+        with tempfile.TemporaryDirectory() as tmpdir:
+            for name in ["a.txt", "a.txt.gz", "a.zip>b/a.txt"]:
+                outpath = os.path.join(tmpdir, name)
+                self.assertEqual(libutil.save_ftext_iter(iter(pairs), outpath), len(pairs))
+                with libutil.readstream(outpath) as fp: # io input
+                    self.assertEqual(list(libutil.load_ftext_iter(fp)), pairs)
+            data = libutil.readbytes(os.path.join(tmpdir, "a.txt"))
+            lines = libutil.save_ftext(ftexts1, ftexts2)
+            self.assertEqual(data, libutil.writelines(lines))
+        pairs = list(libutil.load_ftext_iter(["○0|1|2○ a", "○1|3|4○ b", "●0|1|2● c"]))
+        self.assertEqual(pairs, [(libutil.ftext_t(1, 2, "a"), libutil.ftext_t(1, 2, "c")), 
+            (libutil.ftext_t(3, 4, "b"), None)])
+
+    def test_cache(self):
+        ftexts = libutil.load_ftext(paths_ftext["COM001"])
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, "a.txt")
+            shutil.copyfile(paths_ftext["COM001"], path)
+            self.assertIsNone(libutil.load_ftext_cache(path))
+            self.assertEqual(libutil.load_ftext(path, cache=True), ftexts)
+            self.assertEqual(libutil.load_ftext_cache(path), ftexts)
+            self.assertIsNone(libutil.load_ftext_cache(path, encoding="sjis"))
+            with open(path, 'ab') as fp: fp.write("○99999|000000|000○ \n".encode())
+            self.assertIsNone(libutil.load_ftext_cache(path)) # stale by size
+            self.assertEqual(libutil.load_ftext(path, cache=True)[0][-1].text, "")
+
 if __name__ == '__main__':
     logging.basicConfig(level=logging.WARNING, format="%(levelname)s:%(funcName)s: %(message)s")
     unittest.main()
\ No newline at end of file